@@ -0,0 +1,12 @@
+from fastapi import APIRouter
+from fastapi.concurrency import run_in_threadpool
+
+from app.models import StorageUsageResponse
+from app.services import storage_manager
+
+router = APIRouter()
+
+
+@router.get("/storage", response_model=StorageUsageResponse)
+async def get_storage_usage():
+    return await run_in_threadpool(storage_manager.usage)
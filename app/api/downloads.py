@@ -1,20 +1,94 @@
-from fastapi import APIRouter, HTTPException, status
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, Request, status
+from app.core.config import settings
 from app.models import DownloadRequest, TaskResponse, TaskStatus
 from app.services.tasks import process_download_task
+from app.services.singleflight import flight_key, acquire, release_async
+from app.services import admission
+from app.services.task_status import record_created
+from app.utils.urls import normalize_url
 from datetime import datetime
 import uuid
 
 router = APIRouter()
 
-@router.post("/download", response_model=TaskResponse, status_code=status.HTTP_202_ACCEPTED)
-async def create_download_task(request: DownloadRequest):
+@router.post(
+    "/download",
+    response_model=TaskResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    responses={429: {"description": "Сервис перегружен, повторите запрос через Retry-After секунд"}},
+)
+async def create_download_task(
+    request: DownloadRequest,
+    http_request: Request,
+    x_api_key: Optional[str] = Header(None),
+    x_forwarded_for: Optional[str] = Header(None),
+):
     try:
         task_id = str(uuid.uuid4())
         created_at = datetime.now().isoformat()
-        celery_task = process_download_task.apply_async(
-            args=[task_id, request.url, request.quality.value, request.max_workers, request.model_name.value if request.model_name else "whisper-small"],
-            task_id=task_id
+        model_name = request.model_name.value if request.model_name else "whisper-small"
+        output_formats = [f.value for f in request.output_formats]
+        compare_models = list(dict.fromkeys(m.value for m in request.compare_models)) if request.compare_models else None
+        if compare_models:
+            model_name = compare_models[0]
+
+        # Допуск проверяется до single-flight: иначе дубликат мог бы присоединиться к задаче,
+        # которую затем отклонят и никогда не поставят в очередь
+        client_id = admission.client_identity(
+            x_api_key, x_forwarded_for, http_request.client.host if http_request.client else None
         )
+        work = admission.estimate_work(request.url, compare_models or [model_name])
+        try:
+            await admission.admit(task_id, client_id, work)
+        except admission.AdmissionRejected as e:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=e.reason,
+                headers={"Retry-After": str(e.retry_after)},
+            )
+
+        # Одинаковые запросы, пришедшие, пока первый ещё выполняется, присоединяются к нему
+        key = flight_key(normalize_url(request.url), {
+            # Битрейт влияет только на сохраняемый MP3
+            "quality": request.quality.value if request.keep_audio else None,
+            "keep_audio": request.keep_audio,
+            "model_name": model_name,
+            "output_formats": sorted(output_formats),
+            "compare_models": compare_models,
+        })
+        existing_task_id = await acquire(key, task_id)
+        if existing_task_id:
+            # Работу выполнит уже идущая задача — учёт этого запроса снимаем
+            await admission.release_async(task_id)
+            return {
+                "task_id": existing_task_id,
+                "status": TaskStatus.PROCESSING,
+                "coalesced": True,
+                "created_at": created_at,
+                "updated_at": created_at
+            }
+
+        await record_created(task_id, created_at)
+        priority = admission.priority_for(work)
+        max_workers = min(request.max_workers, settings.max_download_workers)
+        try:
+            celery_task = process_download_task.apply_async(
+                args=[task_id, request.url, request.quality.value, max_workers, model_name],
+                kwargs={
+                    "output_formats": output_formats,
+                    "flight_key": key,
+                    "compare_models": compare_models,
+                    "priority": priority,
+                    "keep_audio": request.keep_audio,
+                },
+                task_id=task_id,
+                priority=priority,
+            )
+        except Exception:
+            await release_async(key, task_id)
+            await admission.release_async(task_id)
+            raise
 
         return {
             "task_id": task_id,
@@ -22,5 +96,7 @@ async def create_download_task(request: DownloadRequest):
             "created_at": created_at,
             "updated_at": created_at
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create task: {str(e)}")
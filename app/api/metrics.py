@@ -0,0 +1,21 @@
+from fastapi import APIRouter, Response
+from fastapi.concurrency import run_in_threadpool
+
+from app.celery_app import celery
+from app.core.metrics import refresh_queue_depth, render_latest
+from app.models import ModelName
+from app.services.model_routing import model_queue
+
+router = APIRouter()
+
+
+def _queue_names() -> list[str]:
+    queues = [queue.name for queue in celery.conf.task_queues]
+    return queues + [model_queue(model.value) for model in ModelName if model_queue(model.value) not in queues]
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    await run_in_threadpool(refresh_queue_depth, _queue_names())
+    body, content_type = render_latest()
+    return Response(content=body, media_type=content_type)
@@ -1,7 +1,15 @@
 from fastapi import APIRouter
 from app.api.downloads import router as downloads_router
 from app.api.tasks import router as tasks_router
+from app.api.metrics import router as metrics_router
+from app.api.admin import router as admin_router
+from app.api.health import router as health_router
+from app.api.search import router as search_router
 
 api_router = APIRouter()
 api_router.include_router(downloads_router, prefix="", tags=["download"])
 api_router.include_router(tasks_router, prefix="/tasks", tags=["tasks"])
+api_router.include_router(metrics_router, prefix="", tags=["metrics"])
+api_router.include_router(admin_router, prefix="/admin", tags=["admin"])
+api_router.include_router(health_router, prefix="", tags=["health"])
+api_router.include_router(search_router, prefix="", tags=["search"])
@@ -0,0 +1,27 @@
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+
+from app.models import SearchResponse
+from app.services import search_index
+
+router = APIRouter()
+
+
+@router.get("/search", response_model=SearchResponse)
+async def search_transcripts(
+    q: str = Query(..., min_length=1, max_length=200, description="Слова для поиска"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    task_id: Optional[str] = None,
+    video_id: Optional[str] = None,
+    model_name: Optional[str] = None,
+):
+    try:
+        hits = await run_in_threadpool(
+            search_index.search, q, limit, offset, task_id=task_id, video_id=video_id, model_name=model_name
+        )
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Search index unavailable: {str(e)}")
+    return {"query": q, "hits": hits}
@@ -1,92 +1,178 @@
 #app\api\tasks.py
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import FileResponse
-from app.models import TaskResponse, TaskStatus
-from celery.result import AsyncResult
-from datetime import datetime
-from app.storage import get_task_dir
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from app.models import TaskResponse, TaskStatus, BulkStatusRequest, BulkStatusResponse
+from app.storage import get_task_dir, read_manifest, touch_task, MANIFEST_NAME
+from app.utils.http_files import parse_range, etag_matches, iter_file_range, iter_zip
+from app.core.config import settings
+from app.services.task_status import get_task_status, get_task_statuses
+from app.services.progress import subscribe
+import json
 import os
-from app.celery_app import celery  # <--- импортируем celery
+import time
 
 router = APIRouter()
 
+
+@router.post("/status", response_model=BulkStatusResponse)
+async def get_bulk_task_status(request: BulkStatusRequest):
+    try:
+        return {"tasks": await get_task_statuses(request.task_ids)}
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Result backend unavailable: {str(e)}")
+
+
 @router.get("/{task_id}", response_model=TaskResponse)
-async def get_task_status(task_id: str):
+async def get_task_status_endpoint(task_id: str):
     try:
-        result = AsyncResult(task_id, app=celery)
-
-        date_submitted = getattr(result, 'date_submitted', None)
-        created_at = date_submitted.isoformat() if date_submitted else datetime.now().isoformat()
-
-        if not result.ready():
-            return {
-                "task_id": task_id,
-                "status": TaskStatus.PROCESSING,
-                "created_at": created_at,
-                "updated_at": datetime.now().isoformat()
-            }
-
-        if result.successful():
-            result_data = result.result
-            return {
-                "task_id": task_id,
-                "status": TaskStatus.COMPLETED,
-                "download_type": result_data.get('download_type'),
-                "files": result_data.get('files'),
-                "created_at": created_at,
-                "updated_at": result_data.get('updated_at', datetime.now().isoformat())
-            }
-        else:
-            return {
-                "task_id": task_id,
-                "status": TaskStatus.FAILED,
-                "error": str(result.result) if hasattr(result, 'result') else "Unknown error",
-                "created_at": created_at,
-                "updated_at": datetime.now().isoformat()
-            }
+        return await get_task_status(task_id)
     except Exception as e:
         raise HTTPException(status_code=404, detail=f"Task not found or error: {str(e)}")
 
 
-@router.get("/{task_id}/files")
-async def list_task_files(task_id: str):
-    result = AsyncResult(task_id, app=celery)
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+def _has_activity(snapshot: dict) -> bool:
+    # Воркер взял задачу или уже отправил транскрипции
+    return snapshot["status"] != TaskStatus.PENDING or bool(snapshot.get("subtasks"))
+
+
+@router.get("/{task_id}/events")
+async def stream_task_events(task_id: str, request: Request):
+    """
+    Server-Sent Events: стадии обработки и сегменты транскрипта по мере распознавания.
+    Если задача так и остаётся PENDING без событий и подзадач дольше progress_idle_timeout_s
+    (например, task_id неизвестен), поток закрывается событием "closed".
+    """
+    async def event_stream():
+        events = subscribe(task_id, settings.progress_heartbeat_s)
+        try:
+            await anext(events)  # подписка активна до чтения снимка — события не потеряются
+            snapshot = await get_task_status(task_id)
+            yield _sse("status", snapshot)
+            if snapshot["status"] in (TaskStatus.COMPLETED, TaskStatus.FAILED):
+                return
+
+            started = time.monotonic()
+            active = _has_activity(snapshot)
+            async for event in events:
+                if await request.is_disconnected():
+                    break
+                if event is None:
+                    if not active and time.monotonic() - started > settings.progress_idle_timeout_s:
+                        snapshot = await get_task_status(task_id)
+                        active = _has_activity(snapshot)
+                        if not active:
+                            yield _sse("closed", {"task_id": task_id, "reason": "no activity"})
+                            break
+                    yield ": keep-alive\n\n"
+                    continue
+                active = True
+                yield _sse(event["event"], event)
+                if event["event"] == "done":
+                    break
+        finally:
+            await events.aclose()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-    if not result.ready() or not result.successful():
-        raise HTTPException(status_code=400, detail="Task not completed yet")
 
-    result_data = result.result
-    if 'files' not in result_data:
-        raise HTTPException(status_code=404, detail="No files found")
+async def _task_manifest(task_id: str) -> dict:
+    """
+    Манифест завершённой задачи. Если манифеста нет, статус уточняется в result backend.
+    """
+    manifest = await run_in_threadpool(read_manifest, task_id)
+    if manifest is not None:
+        await run_in_threadpool(touch_task, task_id)
+        return manifest
 
-    task_dir = get_task_dir(task_id)
-    files = []
+    task = await get_task_status(task_id)
+    if task["status"] != TaskStatus.COMPLETED:
+        raise HTTPException(status_code=400, detail="Task not completed yet")
+    raise HTTPException(status_code=404, detail="No files found")
 
-    for file_name in result_data['files']:
-        file_path = os.path.join(task_dir, file_name)
-        if os.path.exists(file_path):
-            files.append({
-                "name": file_name,
-                "size": os.path.getsize(file_path),
-                "download_url": f"/download/{task_id}/files/{file_name}"
-            })
+
+@router.get("/{task_id}/files")
+async def list_task_files(task_id: str):
+    manifest = await _task_manifest(task_id)
+
+    files = [
+        {
+            "name": entry["name"],
+            "size": entry["size"],
+            "sha256": entry["sha256"],
+            "mime_type": entry["mime_type"],
+            "download_url": f"/tasks/download/{task_id}/files/{entry['name']}"
+        }
+        for entry in manifest.get("files", [])
+    ]
 
     return {"files": files}
 
-@router.get("/download/{task_id}/files/{filename}")
-async def download_file(task_id: str, filename: str):
-    result = AsyncResult(task_id, app=celery)
 
-    if not result.ready() or not result.successful():
-        raise HTTPException(status_code=400, detail="Task not completed yet")
+@router.get("/{task_id}/archive")
+async def download_archive(task_id: str):
+    manifest = await _task_manifest(task_id)
+    names = [entry["name"] for entry in manifest.get("files", [])] + [MANIFEST_NAME]
+
+    return StreamingResponse(
+        iter_zip(get_task_dir(task_id), names),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{task_id}.zip"'},
+    )
 
-    file_path = os.path.join(get_task_dir(task_id), filename)
 
-    if not os.path.exists(file_path):
+@router.get("/download/{task_id}/files/{filename:path}")
+async def download_file(task_id: str, filename: str, request: Request):
+    manifest = await _task_manifest(task_id)
+    entry = next((e for e in manifest.get("files", []) if e["name"] == filename), None)
+    if entry is None:
         raise HTTPException(status_code=404, detail="File not found")
 
+    file_path = os.path.join(get_task_dir(task_id), filename)
+    size = entry["size"]
+    etag = f'"{entry["sha256"]}"'
+    headers = {"ETag": etag, "Accept-Ranges": "bytes", "Cache-Control": "private, max-age=3600"}
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range and if_range != etag:
+        range_header = None
+
+    try:
+        byte_range = parse_range(range_header, size)
+    except ValueError:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+    if byte_range:
+        start, end = byte_range
+        return StreamingResponse(
+            iter_file_range(file_path, start, end),
+            status_code=206,
+            media_type=entry["mime_type"],
+            headers={**headers, "Content-Range": f"bytes {start}-{end}/{size}", "Content-Length": str(end - start + 1)},
+        )
+
+    if settings.files_accel_redirect_prefix:
+        # Отдачу файла берёт на себя nginx (sendfile), воркер API не занят
+        return Response(
+            media_type=entry["mime_type"],
+            headers={**headers, "X-Accel-Redirect": f"{settings.files_accel_redirect_prefix}/{task_id}/{filename}"},
+        )
+
     return FileResponse(
         file_path,
-        media_type="audio/mpeg",
-        filename=filename
+        media_type=entry["mime_type"],
+        filename=os.path.basename(filename),
+        headers=headers,
     )
@@ -1,5 +1,9 @@
 from celery import Celery
+from celery.signals import task_postrun, task_prerun, worker_init, worker_process_init, worker_process_shutdown
+from kombu import Queue
 from app.core.config import settings
+from app.core.logging_config import bind_log_context, clear_log_context, flush_logs
+from app.core.metrics import start_worker_metrics_server, mark_worker_process_dead, PRIORITY_STEPS, PRIORITY_SEP
 
 celery = Celery(
     'youtube_downloader',
@@ -8,6 +12,21 @@ celery = Celery(
     include=['app.services.tasks']
 )
 
+# Загрузка и сборка результатов ждут сеть и Redis — их обслуживает воркер с пулом потоков;
+# транскрипция нагружает CPU — её обслуживает prefork-воркер по процессу на ядро
+IO_TASKS = [
+    'process_download_task',
+    'collect_transcriptions',
+    'storage_janitor',
+]
+CPU_TASKS = [
+    'app.services.tasks.transcribe_audio',
+    'app.services.tasks.transcribe_audio_batch',
+    'app.services.tasks.transcribe_audio_compare',
+    'app.services.tasks.transcribe_audio_chunk',
+    'app.services.tasks.finish_chunked_transcription',
+]
+
 celery.conf.update(
     task_serializer='json',
     accept_content=['json'],
@@ -16,4 +35,90 @@ celery.conf.update(
     enable_utc=True,
     task_track_started=True,
     task_time_limit=3600,
+    task_queues=[
+        Queue('celery'),
+        Queue(settings.io_queue),
+        Queue(settings.cpu_queue),
+        *(Queue(f"model.{name}") for name in settings.model_queues),
+    ],
+    task_routes={
+        **{name: {'queue': settings.io_queue} for name in IO_TASKS},
+        **{name: {'queue': settings.cpu_queue} for name in CPU_TASKS},
+    },
+    task_annotations={
+        # Под --pool=threads Celery не применяет time_limit (поток нельзя прервать): загрузка
+        # ограничивает себя сама (deadline_s в downloader_engine, таймауты соединения и чтения),
+        # collect_transcriptions — через collect_timeout_s; лимит действует под prefork/solo
+        **{name: {'time_limit': settings.io_task_time_limit_s} for name in IO_TASKS},
+        # acks_late: сообщение подтверждается только после выполнения задачи
+        **{name: {'time_limit': settings.cpu_task_time_limit_s, 'acks_late': True} for name in CPU_TASKS},
+        # Только transcribe_audio ведёт контрольную точку: при падении процесса она вернётся в очередь
+        # (reject_on_worker_lost) и продолжит с точки, а число таких потерь ограничено счётчиком в точке.
+        # Мягкий лимит тоже обрабатывает только она; батч, сравнение и фрагменты при падении воркера
+        # завершаются ошибкой, а не возвращаются в очередь бесконечно
+        'app.services.tasks.transcribe_audio': {
+            'time_limit': settings.cpu_task_time_limit_s,
+            'soft_time_limit': settings.cpu_task_soft_time_limit_s,
+            'acks_late': True,
+            'reject_on_worker_lost': True,
+        },
+    },
+    beat_schedule={
+        'storage-janitor': {
+            'task': 'storage_janitor',
+            'schedule': settings.storage_janitor_interval_s,
+        },
+    },
+    # Приоритеты в Redis: 0 — самый высокий; короткие задачи обгоняют большие плейлисты
+    broker_transport_options={
+        'priority_steps': PRIORITY_STEPS,
+        'sep': PRIORITY_SEP,
+        'queue_order_strategy': 'priority',
+        # Неподтверждённое сообщение Redis отдаёт повторно по истечении таймаута — он должен
+        # быть больше самой долгой задачи, иначе acks_late запустит её второй раз параллельно
+        'visibility_timeout': max(settings.io_task_time_limit_s, settings.cpu_task_time_limit_s) + 600,
+    },
+    task_default_priority=5,
+    # Длинные задачи не копятся у одного процесса; IO-воркер поднимает значение через --prefetch-multiplier
+    worker_prefetch_multiplier=1,
 )
+
+
+@worker_init.connect
+def _on_worker_init(sender=None, **kwargs):
+    from app.startup import on_worker_init
+
+    start_worker_metrics_server(sender)
+    on_worker_init(sender)
+
+
+@worker_process_init.connect
+def _on_worker_process_init(**kwargs):
+    from app.startup import on_worker_process_init
+
+    on_worker_process_init()
+
+
+@worker_process_shutdown.connect
+def _on_worker_process_shutdown(**kwargs):
+    # Дочерние процессы prefork завершаются без atexit — очередь лога дописываем явно
+    mark_worker_process_dead()
+    flush_logs()
+
+
+# Задачи, у которых id задачи загрузки — первый аргумент
+_TASK_ID_FIRST_ARG = {'process_download_task', 'collect_transcriptions'}
+
+
+@task_prerun.connect
+def _on_task_prerun(task_id=None, task=None, args=None, kwargs=None, **_):
+    # Все записи лога внутри задачи помечаются id задачи загрузки, к которой она относится
+    parent_task_id = (kwargs or {}).get('parent_task_id')
+    if not parent_task_id and task is not None and task.name in _TASK_ID_FIRST_ARG and args:
+        parent_task_id = args[0]
+    bind_log_context(task_id=parent_task_id or task_id, model=(kwargs or {}).get('model_name'))
+
+
+@task_postrun.connect
+def _on_task_postrun(**_):
+    clear_log_context()
@@ -1,5 +1,5 @@
 # app/core/config.py
-from typing import List
+from typing import Dict, List
 from pydantic_settings import BaseSettings
 
 
@@ -9,9 +9,156 @@ class Settings(BaseSettings):
     tasks_dir: str = "tasks"
     downloads_dir: str = "downloads"
 
+    # Логирование: запись в файл и консоль идёт из фонового потока каждого процесса
+    log_level: str = "INFO"
+    log_format: str = "json"  # "json" или "text"
+    log_dir: str = "logs"  # пусто — только консоль
+    log_file_per_process: bool = True  # app-<хост>-<программа>-<слот процесса>.log вместо общего app.log
+    log_max_bytes: int = 50 * 1024 * 1024
+    log_backup_count: int = 5
+    log_queue_size: int = 10000  # при переполнении записи отбрасываются, а не блокируют вызывающий код
+    log_sample_rate: float = 0.1  # доля записей с extra={"sample": True}, которые попадают в лог
+
+    # Префикс internal-location nginx для отдачи файлов через X-Accel-Redirect (sendfile);
+    # пусто — файлы отдаёт само приложение
+    files_accel_redirect_prefix: str = ""
+
+    # Форматы транскрипта по умолчанию: pdf, txt, srt, vtt, json
+    output_formats: List[str] = ["pdf"]
+    # TrueType-шрифт, встраиваемый в PDF: должен содержать кириллицу (в образе — пакет fonts-dejavu-core)
+    pdf_font_path: str = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+
     # Новые параметры:
+    # Предзагрузка моделей выполняется только в воркерах транскрипции, процесс API моделей не грузит
     models_preload: bool = True
     preload_models: List[str] = ["whisper-small", "vosk"]
+    # "process" — в каждом дочернем процессе prefork (worker_process_init),
+    # "parent" — в главном процессе до fork, страницы моделей делятся copy-on-write
+    models_preload_stage: str = "process"
+    models_heartbeat_s: float = 30.0
+
+    # Реестр моделей Vosk
+    vosk_models_dir: str = "vosk_models"
+    vosk_models_base_url: str = "https://alphacephei.com/vosk/models"
+    # Зеркало: URL с теми же архивами или локальный каталог с <модель>.zip / распакованными моделями
+    vosk_models_mirror: str = ""
+    vosk_model_checksums: Dict[str, str] = {}  # имя модели -> sha256 архива
+    vosk_download_chunk_bytes: int = 1024 * 1024
+
+    # Пул резидентных моделей
+    models_memory_budget_mb: int = 6000
+    model_affinity_routing: bool = True
+    model_affinity_refresh_s: float = 30.0
+
+    # Очереди Celery: загрузка (IO) и транскрипция (CPU) обслуживаются разными воркерами
+    io_queue: str = "io"
+    cpu_queue: str = "cpu"
+    # Модели с выделенными очередями model.<имя> — их задачи всегда уходят туда
+    model_queues: List[str] = []
+    io_task_time_limit_s: int = 3 * 3600
+    cpu_task_time_limit_s: int = 2 * 3600
+    # Мягкий лимит (только transcribe_audio): транскрипция успевает сохранить контрольную точку
+    # и перезапуститься с неё
+    cpu_task_soft_time_limit_s: int = 2 * 3600 - 300
+
+    # Контрольные точки и повторы транскрипции
+    checkpoint_interval_s: float = 60.0
+    transcribe_max_retries: int = 5
+    # Сколько раз файл может уронить воркер (OOM, segfault), прежде чем транскрипция будет провалена
+    transcribe_max_redeliveries: int = 2
+    transcribe_retry_backoff_s: float = 30.0
+    transcribe_retry_backoff_max_s: float = 600.0
+
+    # Размер блока PCM (байт), читаемого из ffmpeg; 64000 байт = 2 с аудио 16 кГц
+    audio_chunk_bytes: int = 64000
+
+    # Предварительный VAD: в модель уходят только участки с речью, таймкоды пересчитываются в исходные
+    vad_enabled: bool = True
+    vad_method: str = "silero"  # "silero" (faster-whisper) или "energy"
+    vad_threshold: float = 0.5
+    vad_min_silence_ms: int = 1000
+    vad_speech_pad_ms: int = 400
+    vad_energy_threshold: float = 0.005  # абсолютный минимум RMS речи (около -46 dBFS) для детектора по энергии
+    vad_energy_ratio: float = 3.0  # во сколько раз речь громче уровня шума
+    vad_min_skip_s: float = 5.0  # если отбросить можно меньше, аудио не склеивается
+    vad_window_s: float = 30.0  # окно потокового VAD для vosk: файл не декодируется целиком
+
+    # Батчевый инференс Whisper: файлы одной загрузки уходят одной задачей transcribe_audio_batch;
+    # под --pool=threads одновременные задачи воркера дополнительно склеиваются в общие батчи
+    whisper_batching: bool = False
+    whisper_batch_size: int = 8
+    whisper_batch_max_files: int = 4
+    whisper_batch_max_wait_s: float = 2.0
+
+    # Параллельная транскрипция длинных файлов по фрагментам
+    chunking_enabled: bool = False
+    # "celery" — группа задач на CPU-воркерах (модели берутся из пула воркера),
+    # "process" — пул процессов внутри задачи (только вне prefork-воркера)
+    chunking_executor: str = "celery"
+    chunking_workers: int = 0  # 0 — по числу ядер, но не больше, чем позволяет models_memory_budget_mb
+    chunking_min_duration_s: float = 1200.0
+    chunk_target_s: float = 300.0
+    chunk_search_s: float = 20.0
+    chunk_overlap_s: float = 2.0
+
+    # Сравнение моделей: модели читают общий буфер PCM параллельно (потоки) или по очереди
+    compare_parallel: bool = False
+
+    # События прогресса (Redis pub/sub) для потоковой выдачи клиентам
+    progress_events_enabled: bool = True
+    progress_heartbeat_s: float = 15.0
+    # Поток событий задачи, о которой за это время не пришло ни события, ни подзадачи, закрывается
+    # (неизвестный task_id иначе висел бы PENDING бесконечно)
+    progress_idle_timeout_s: float = 300.0
+
+    # Сборка результатов транскрипции в manifest.json
+    collect_poll_interval_s: float = 5.0
+    collect_timeout_s: float = 6 * 3600.0
+
+    # Объединение одинаковых одновременных запросов (single-flight)
+    singleflight_ttl_s: float = 6 * 3600.0
+
+    # Контроль допуска: работа = ожидаемые секунды аудио × стоимость модели (whisper-small = 1)
+    admission_enabled: bool = True
+    admission_capacity: float = 20 * 900.0  # суммарная работа выполняющихся задач
+    admission_client_share: float = 0.5  # доля capacity, доступная одному клиенту
+    admission_max_queued: int = 200  # задач в очередях io, cpu и model.<имя>
+    admission_video_estimate_s: float = 900.0
+    admission_playlist_estimate_items: int = 20
+    admission_drain_rate: float = 10.0  # единиц работы в секунду, которые успевает кластер
+    admission_max_retry_after_s: int = 600
+    admission_entry_ttl_s: float = 6 * 3600.0
+    admission_trust_forwarded: bool = False  # брать IP клиента из X-Forwarded-For
+    max_download_workers: int = 4  # потолок max_workers на одну задачу
+
+    # Загрузчик: повторы временных ошибок с экспоненциальной задержкой и джиттером
+    download_chunk_bytes: int = 1024 * 1024
+    download_connect_timeout_s: float = 10.0
+    download_read_timeout_s: float = 60.0
+    download_retry_backoff_s: float = 1.0
+    download_retry_backoff_max_s: float = 30.0
+
+    # Кэш готовых транскриптов
+    transcript_cache_enabled: bool = True
+    transcript_cache_dir: str = "cache/transcripts"
+    transcript_cache_max_bytes: int = 512 * 1024 * 1024
+
+    # Полнотекстовый индекс сегментов (SQLite FTS5)
+    search_index_enabled: bool = True
+    search_index_path: str = "cache/search.db"
+
+    # Жизненный цикл файлов в tasks_dir и downloads_dir
+    storage_ttl_s: float = 7 * 24 * 3600.0  # 0 — без ограничения по времени
+    storage_quota_bytes: int = 20 * 1024 ** 3  # общий лимит на оба каталога, 0 — без лимита
+    storage_min_idle_s: float = 3600.0  # файлы, к которым обращались недавно, не трогаем
+    storage_janitor_interval_s: float = 3600.0
+
+    # Prometheus: порт HTTP-сервера метрик воркера Celery по префиксу имени узла (-n io@%h -> "io"),
+    # чтобы воркеры на одном хосте не делили порт; остальные воркеры — worker_metrics_port (0 — отключить).
+    # Метрики дочерних процессов prefork собираются только при PROMETHEUS_MULTIPROC_DIR —
+    # отдельном каталоге для каждого воркера, заданном до запуска (см. команды в app/main.py)
+    worker_metrics_ports: Dict[str, int] = {"io": 9101, "cpu": 9102}
+    worker_metrics_port: int = 9103
 
     class Config:
         env_file = ".env"
@@ -1,23 +1,217 @@
 # logger.py
+import os
+import sys
+import json
+import queue
+import atexit
+import random
+import socket
 import logging
+import multiprocessing
+import threading
+import traceback
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Dict, Iterator, Optional
 
-def setup_logger(name: str) -> logging.Logger:
-    logger = logging.getLogger(name)
-    if not logger.handlers:  # Чтобы избежать дублирующих логов
-        logger.setLevel(logging.INFO)
-        formatter = logging.Formatter(
-            fmt='[%(asctime)s] %(levelname)s - %(name)s - %(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S'
-        )
-
-        # Консольный вывод
-        console_handler = logging.StreamHandler()
+from app.core.config import settings
+
+# Контекст записи: проставляется автоматически (задача Celery, track_stage) и попадает в каждую строку
+_CONTEXT_FIELDS = ("task_id", "stage", "model")
+_context: Dict[str, ContextVar] = {name: ContextVar(f"log_{name}", default=None) for name in _CONTEXT_FIELDS}
+
+# Стандартные атрибуты LogRecord — всё остальное в записи считается полями extra
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "sample"}
+
+_lock = threading.Lock()
+_state: Optional[Dict[str, Any]] = None
+
+
+def bind_log_context(**values: Optional[str]) -> None:
+    for name, value in values.items():
+        _context[name].set(value)
+
+
+def clear_log_context() -> None:
+    for var in _context.values():
+        var.set(None)
+
+
+@contextmanager
+def log_context(**values: Optional[str]) -> Iterator[None]:
+    """
+    Временно добавляет поля контекста (task_id, stage, model) ко всем записям внутри блока.
+    """
+    tokens = [(_context[name], _context[name].set(value)) for name, value in values.items()]
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+class _ContextFilter(logging.Filter):
+    """
+    Копирует контекст в запись и прореживает шумные записи: logger.info(..., extra={"sample": True})
+    проходит с вероятностью log_sample_rate (предупреждения и ошибки — всегда).
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        sample = getattr(record, "sample", None)
+        if sample and record.levelno < logging.WARNING:
+            rate = settings.log_sample_rate if sample is True else float(sample)
+            if random.random() >= rate:
+                return False
+        for name, var in _context.items():
+            if not hasattr(record, name):
+                setattr(record, name, var.get())
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "pid": record.process,
+            "thread": record.threadName,
+        }
+        entry.update({k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS and v is not None})
+        if record.exc_text or record.exc_info:
+            entry["exc"] = record.exc_text or "".join(traceback.format_exception(*record.exc_info)).rstrip()
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        context = " ".join(f"{name}={getattr(record, name)}" for name in _CONTEXT_FIELDS if getattr(record, name, None))
+        return f"{line} [{context}]" if context else line
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """
+    Кладёт запись в очередь процесса и сразу возвращается; если писатель не успевает,
+    запись отбрасывается, а не тормозит транскрипцию.
+    """
+
+    def __init__(self):
+        super().__init__(None)
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        state = _process_state()
+        try:
+            state["queue"].put_nowait(record)
+        except queue.Full:
+            state["dropped"] += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Форматирование выполняется в фоновом потоке; здесь только фиксируем аргументы и исключение
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = "".join(traceback.format_exception(*record.exc_info)).rstrip()
+            record.exc_info = None
+        return record
+
+
+def _formatter() -> logging.Formatter:
+    if settings.log_format == "json":
+        return JsonFormatter()
+    return _TextFormatter(fmt='[%(asctime)s] %(levelname)s - %(name)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+
+
+def _process_slot() -> str:
+    """
+    Стабильное имя процесса для файла лога: номер процесса в пуле prefork (сменивший упавший
+    или отработавший max_tasks_per_child процесс получает тот же номер), иначе имя процесса
+    multiprocessing ("main" для главного). В отличие от pid, число таких имён ограничено,
+    и файлы не копятся с каждым перезапуском.
+    """
+    try:
+        from billiard.process import current_process
+        index = getattr(current_process(), "index", None)
+    except ImportError:
+        index = None
+    if index is not None:
+        return f"worker{index}"
+    name = multiprocessing.current_process().name
+    return "main" if name == "MainProcess" else name.lower()
+
+
+def _program() -> str:
+    # celery, uvicorn и т.п.: API и воркер на одном хосте не делят файл главного процесса
+    path = os.path.abspath(sys.argv[0]) if sys.argv and sys.argv[0] else "python"
+    name = os.path.splitext(os.path.basename(path))[0].lstrip("-")
+    return os.path.basename(os.path.dirname(path)) if name == "__main__" else name or "python"
+
+
+def _log_path() -> str:
+    # Отдельный файл на процесс: воркеры prefork не пишут в один файл и не мешают друг другу при ротации.
+    # Хост в имени — на случай общего каталога логов у нескольких контейнеров
+    if not settings.log_file_per_process:
+        return os.path.join(settings.log_dir, "app.log")
+    return os.path.join(settings.log_dir, f"app-{socket.gethostname()}-{_program()}-{_process_slot()}.log")
+
+
+def _process_state() -> Dict[str, Any]:
+    """
+    Очередь и фоновый писатель текущего процесса. После fork дочерний процесс заводит свои:
+    поток писателя родителя в нём не существует.
+    """
+    global _state
+    state = _state
+    if state is not None and state["pid"] == os.getpid():
+        return state
+    with _lock:
+        if _state is not None and _state["pid"] == os.getpid():
+            return _state
+
+        formatter = _formatter()
+        handlers = []
+        console_handler = logging.StreamHandler(sys.stderr)
         console_handler.setFormatter(formatter)
-        logger.addHandler(console_handler)
+        handlers.append(console_handler)
+        if settings.log_dir:
+            os.makedirs(settings.log_dir, exist_ok=True)
+            file_handler = RotatingFileHandler(
+                _log_path(), maxBytes=settings.log_max_bytes, backupCount=settings.log_backup_count, encoding="utf-8"
+            )
+            file_handler.setFormatter(formatter)
+            handlers.append(file_handler)
+
+        log_queue: queue.Queue = queue.Queue(maxsize=settings.log_queue_size)
+        listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        listener.start()
+        _state = {"pid": os.getpid(), "queue": log_queue, "listener": listener, "dropped": 0}
+        return _state
+
 
-        # (Опционально) Вывод в файл
-        file_handler = logging.FileHandler('app.log')
-        file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+@atexit.register
+def flush_logs() -> None:
+    """
+    Дописывает очередь и останавливает писатель процесса (при выходе и завершении процесса prefork).
+    """
+    state = _state
+    if state is not None and state["pid"] == os.getpid():
+        state["listener"].stop()
+        if state["dropped"]:
+            sys.stderr.write(f"Логгер: отброшено записей при переполнении очереди: {state['dropped']}\n")
 
+
+_handler = _NonBlockingQueueHandler()
+_handler.addFilter(_ContextFilter())
+
+
+def setup_logger(name: str) -> logging.Logger:
+    logger = logging.getLogger(name)
+    if _handler not in logger.handlers:  # Чтобы избежать дублирующих логов
+        logger.setLevel(settings.log_level)
+        logger.addHandler(_handler)
+        # Записи не дублируются в корневой логгер (его настраивает Celery)
+        logger.propagate = False
     return logger
@@ -0,0 +1,176 @@
+# app/core/metrics.py
+
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+import redis
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+    generate_latest, multiprocess, start_http_server,
+)
+
+from app.core.config import settings
+from app.core.logging_config import setup_logger, log_context
+
+logger = setup_logger(__name__)
+
+STAGE_SECONDS = Histogram(
+    "pipeline_stage_seconds",
+    "Длительность стадий обработки",
+    ["stage", "model", "download_type"],
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600, 7200),
+)
+REAL_TIME_FACTOR = Histogram(
+    "transcription_real_time_factor",
+    "Секунд инференса на секунду аудио",
+    ["model"],
+    buckets=(0.02, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2, 3, 5),
+)
+AUDIO_SECONDS = Counter(
+    "transcribed_audio_seconds_total",
+    "Объём распознанного аудио в секундах",
+    ["model"],
+)
+VAD_SKIPPED_SECONDS = Counter(
+    "vad_skipped_audio_seconds_total",
+    "Аудио без речи, отброшенное VAD до распознавания",
+    ["model"],
+)
+MODEL_POOL_REQUESTS = Counter(
+    "model_pool_requests_total",
+    "Обращения к пулу моделей",
+    ["model", "result"],
+)
+MODEL_POOL_EVICTIONS = Counter(
+    "model_pool_evictions_total",
+    "Вытеснения моделей из пула",
+    ["model"],
+)
+MODEL_LOAD_SECONDS = Histogram(
+    "model_load_seconds",
+    "Время загрузки модели",
+    ["model"],
+    buckets=(1, 2.5, 5, 10, 20, 40, 80, 160, 320),
+)
+TRANSCRIPT_CACHE_REQUESTS = Counter(
+    "transcript_cache_requests_total",
+    "Обращения к кэшу транскриптов",
+    ["result"],
+)
+QUEUE_DEPTH = Gauge(
+    "celery_queue_depth",
+    "Число задач в очереди брокера",
+    ["queue"],
+    multiprocess_mode="max",
+)
+
+_redis: Optional[redis.Redis] = None
+
+# Приоритеты задач в брокере Redis: каждая ступень — отдельный список <очередь>:<приоритет>
+PRIORITY_STEPS = list(range(10))
+PRIORITY_SEP = ":"
+
+
+def priority_queue_keys(queue: str) -> List[str]:
+    return [queue] + [f"{queue}{PRIORITY_SEP}{step}" for step in PRIORITY_STEPS[1:]]
+
+
+@contextmanager
+def track_stage(stage: str, model: str = "", download_type: str = "") -> Iterator[None]:
+    """
+    Замеряет длительность стадии (включая завершившиеся ошибкой).
+    Стадия и модель попадают в контекст всех записей лога внутри блока.
+    """
+    started = time.monotonic()
+    try:
+        with log_context(stage=stage, **({"model": model} if model else {})):
+            yield
+    finally:
+        # DownloadType — str-перечисление, в метку идёт его значение
+        download_type = getattr(download_type, "value", download_type) or ""
+        STAGE_SECONDS.labels(stage, model, download_type).observe(time.monotonic() - started)
+
+
+def observe_rtf(model: str, processing_s: float, audio_s: float) -> None:
+    if audio_s <= 0:
+        return
+    REAL_TIME_FACTOR.labels(model).observe(processing_s / audio_s)
+    AUDIO_SECONDS.labels(model).inc(audio_s)
+
+
+def refresh_queue_depth(queues: List[str]) -> None:
+    """
+    Обновляет глубину очередей по LLEN в брокере Redis.
+    """
+    global _redis
+    try:
+        if _redis is None:
+            _redis = redis.Redis.from_url(settings.redis_broker_url)
+        pipe = _redis.pipeline(transaction=False)
+        for queue in queues:
+            for key in priority_queue_keys(queue):
+                pipe.llen(key)
+        depths = iter(pipe.execute())
+        for queue in queues:
+            QUEUE_DEPTH.labels(queue).set(sum(next(depths) for _ in PRIORITY_STEPS))
+    except redis.RedisError as e:
+        logger.warning(f"Не удалось получить глубину очередей: {e}")
+
+
+def _registry() -> CollectorRegistry:
+    # В режиме prefork метрики процессов собираются через PROMETHEUS_MULTIPROC_DIR
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def render_latest() -> tuple[bytes, str]:
+    return generate_latest(_registry()), CONTENT_TYPE_LATEST
+
+
+def worker_metrics_port(hostname: str) -> int:
+    return settings.worker_metrics_ports.get(hostname.split("@")[0], settings.worker_metrics_port)
+
+
+def _reset_multiproc_dir(path: str) -> None:
+    # Файлы прошлого запуска воркера: иначе счётчики его мёртвых процессов суммировались бы с новыми
+    os.makedirs(path, exist_ok=True)
+    removed = 0
+    for name in os.listdir(path):
+        if name.endswith(".db"):
+            os.remove(os.path.join(path, name))
+            removed += 1
+    logger.info(f"Каталог метрик {path} очищен (файлов: {removed})")
+
+
+def start_worker_metrics_server(worker) -> None:
+    """
+    Поднимает HTTP-эндпоинт /metrics в главном процессе воркера Celery (worker_init, до запуска пула).
+    Prometheus-клиент выбирает хранение значений при импорте, поэтому PROMETHEUS_MULTIPROC_DIR
+    задаётся в окружении до старта воркера, а здесь каталог только очищается.
+    """
+    port = worker_metrics_port(worker.hostname)
+    if port <= 0:
+        return
+    multiproc_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if multiproc_dir:
+        _reset_multiproc_dir(multiproc_dir)
+    elif getattr(worker.pool_cls, "__module__", "").endswith("prefork"):
+        logger.warning("PROMETHEUS_MULTIPROC_DIR не задан: метрики дочерних процессов prefork не экспортируются")
+    try:
+        start_http_server(port, registry=_registry())
+        logger.info(f"Метрики воркера {worker.hostname} доступны на порту {port}")
+    except OSError as e:
+        logger.warning(f"Не удалось запустить сервер метрик на порту {port}: {e}")
+
+
+def mark_worker_process_dead() -> None:
+    """
+    Вызывается при завершении дочернего процесса prefork: его gauge-файлы (live*) больше не учитываются.
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(os.getpid())
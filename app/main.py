@@ -1,10 +1,8 @@
 from fastapi import FastAPI
 from app.api.router import api_router
 from app.core.logging_config import setup_logger
-from app.startup import preload_models
 
 setup_logger(__name__)
-preload_models()
 app = FastAPI(
     title="YouTube Audio Downloader API",
     description="API для асинхронной загрузки аудио с YouTube",
@@ -18,5 +16,15 @@ if __name__ == "__main__":
 
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
 
+# Воркер загрузок (очередь io): задачи ждут сеть, поэтому пул потоков и предвыборка побольше; метрики на :9101
+# celery -A app.celery_app.celery worker -Q io -n io@%h --pool=threads --concurrency=16 --prefetch-multiplier=4 --loglevel=info
+# Воркер транскрипции (очередь cpu): процесс на ядро, без предвыборки; метрики на :9102.
+# PROMETHEUS_MULTIPROC_DIR — свой каталог у каждого prefork-воркера (очищается при его старте)
+# PROMETHEUS_MULTIPROC_DIR=/tmp/metrics-cpu celery -A app.celery_app.celery worker -Q cpu -n cpu@%h --pool=prefork --concurrency=4 --prefetch-multiplier=1 --loglevel=info
+# Выделенный воркер модели (MODEL_QUEUES='["whisper-medium"]'), метрики на :9103 (worker_metrics_port):
+# PROMETHEUS_MULTIPROC_DIR=/tmp/metrics-medium celery -A app.celery_app.celery worker -Q model.whisper-medium -n medium@%h --pool=prefork --concurrency=2 --loglevel=info
+# Планировщик периодических задач (очистка хранилища):
+# celery -A app.celery_app.celery beat --loglevel=info
+# Для разработки — один воркер на все очереди:
 # celery -A app.celery_app.celery worker --loglevel=info --pool=solo
 # python -m app.main
@@ -13,17 +13,35 @@ class QualityLevel(int, Enum):
     HIGH = 192
     VERY_HIGH = 320
 
+class OutputFormat(str, Enum):
+    PDF = "pdf"
+    TXT = "txt"
+    SRT = "srt"
+    VTT = "vtt"
+    JSON = "json"
+
 class ModelName(str, Enum):
     whisper_small = "whisper-small"
     whisper_medium = "whisper-medium"
     whisper_large_2 = "whisper-large-2"
     vosk = "vosk"
+    vosk_en_us = "vosk-en-us"
+    vosk_small_ru = "vosk-small-ru"
+    vosk_ru = "vosk-ru"
+    vosk_small_de = "vosk-small-de"
 
 class DownloadRequest(BaseModel):
     url: str = Field(..., description="YouTube URL видео или плейлиста")
     quality: QualityLevel = Field(QualityLevel.MEDIUM, description="Качество аудио")
     max_workers: int = Field(4, ge=1, le=10, description="Количество потоков для плейлистов")
     model_name: Optional[ModelName] = Field(ModelName.whisper_small, description="Модель для транскрипции")
+    output_formats: List[OutputFormat] = Field([OutputFormat.PDF], min_length=1, description="Форматы транскрипта")
+    compare_models: Optional[List[ModelName]] = Field(
+        None, min_length=2, description="Сравнить несколько моделей на одной загрузке (model_name игнорируется)"
+    )
+    keep_audio: bool = Field(
+        False, description="Сохранить аудио в MP3 с битрейтом quality; без него транскрибируется исходный поток"
+    )
 
 
 class TaskStatus(str, Enum):
@@ -32,13 +50,80 @@ class TaskStatus(str, Enum):
     COMPLETED = "completed"
     FAILED = "failed"
 
+class SubtaskStatus(BaseModel):
+    audio_file: str
+    transcription_task_id: str
+    status: TaskStatus
+
+class TaskProgress(BaseModel):
+    total: int
+    completed: int
+    failed: int
+    processing: int
+    pending: int
+
 class TaskResponse(BaseModel):
     task_id: str
     status: TaskStatus
     download_type: Optional[DownloadType] = None
     files: Optional[List[str]] = None
     error: Optional[str] = None
+    progress: Optional[TaskProgress] = None
+    subtasks: Optional[List[SubtaskStatus]] = None
+    coalesced: bool = Field(False, description="Запрос присоединён к уже выполняющейся задаче")
     created_at: str
     updated_at: str
 
+class BulkStatusRequest(BaseModel):
+    task_ids: List[str] = Field(..., min_length=1, max_length=500, description="Идентификаторы задач")
+
+class BulkStatusResponse(BaseModel):
+    tasks: List[TaskResponse]
+
+
+
+class StorageEntry(BaseModel):
+    root: str
+    path: str
+    size: int
+    last_access: float
+    in_use: bool
+
+class StorageRootUsage(BaseModel):
+    path: str
+    entries: int
+    in_use: int
+    bytes: int
+    oldest_access: Optional[float] = None
+
+class StorageUsageResponse(BaseModel):
+    total_bytes: int
+    quota_bytes: int
+    ttl_s: float
+    roots: List[StorageRootUsage]
+    largest: List[StorageEntry]
+
+class WorkerModels(BaseModel):
+    worker: str
+    models: List[str]
+
+class ReadinessResponse(BaseModel):
+    ready: bool
+    broker: bool
+    workers: List[WorkerModels]
+    warm_models: List[str]
+
+class SearchHit(BaseModel):
+    task_id: str
+    audio_file: str
+    model_name: str
+    video_id: Optional[str] = None
+    start: float
+    end: float
+    snippet: str
+    score: float
+    url: Optional[str] = Field(None, description="Ссылка на момент видео на YouTube")
 
+class SearchResponse(BaseModel):
+    query: str
+    hits: List[SearchHit]
@@ -0,0 +1,184 @@
+# app/services/admission.py
+
+import math
+import time
+import hashlib
+from typing import List, Optional
+
+import redis
+from redis import asyncio as aioredis
+
+from app.core.config import settings
+from app.core.logging_config import setup_logger
+from app.core.metrics import priority_queue_keys
+from app.models import DownloadType, ModelName
+from app.services.model_routing import model_queue
+
+logger = setup_logger(__name__)
+
+INFLIGHT_KEY = "admission-inflight"
+
+# Относительная стоимость секунды аудио для модели (whisper-small = 1)
+MODEL_WORK_COST = {
+    "whisper-small": 1.0,
+    "whisper-medium": 2.5,
+    "whisper-large-2": 5.0,
+}
+VOSK_WORK_COST = 0.3
+
+# Проверка и учёт работы одной операцией: параллельные запросы не проскочат лимит вдвоём.
+# Записи хэша: task_id -> "клиент|работа|истекает"; просроченные удаляются по ходу.
+_ADMIT_SCRIPT = """
+local now = tonumber(ARGV[4])
+local work = tonumber(ARGV[3])
+local total, client_total = 0, 0
+local entries = redis.call('HGETALL', KEYS[1])
+for i = 1, #entries, 2 do
+    local client, w, expires = string.match(entries[i + 1], '^(.*)|([^|]*)|([^|]*)$')
+    if tonumber(expires) < now then
+        redis.call('HDEL', KEYS[1], entries[i])
+    else
+        total = total + tonumber(w)
+        if client == ARGV[2] then
+            client_total = client_total + tonumber(w)
+        end
+    end
+end
+if client_total > 0 and client_total + work > tonumber(ARGV[7]) then
+    return {1, tostring(client_total)}
+end
+if total > 0 and total + work > tonumber(ARGV[6]) then
+    return {2, tostring(total)}
+end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2] .. '|' .. ARGV[3] .. '|' .. tostring(now + tonumber(ARGV[5])))
+return {0, tostring(total)}
+"""
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+_async_client: Optional[aioredis.Redis] = None
+_sync_client: Optional[redis.Redis] = None
+
+
+def _get_async_client() -> aioredis.Redis:
+    global _async_client
+    if _async_client is None:
+        _async_client = aioredis.from_url(settings.redis_broker_url, decode_responses=True)
+    return _async_client
+
+
+def _get_sync_client() -> redis.Redis:
+    global _sync_client
+    if _sync_client is None:
+        _sync_client = redis.Redis.from_url(settings.redis_broker_url, decode_responses=True)
+    return _sync_client
+
+
+def _counted_queues() -> List[str]:
+    """
+    Очереди, в которых копится работа: IO, CPU и очереди моделей (выделенные и по привязке к воркерам).
+    """
+    models = dict.fromkeys([m.value for m in ModelName] + list(settings.model_queues))
+    return [settings.io_queue, settings.cpu_queue] + [model_queue(name) for name in models]
+
+
+def estimate_work(url: str, model_names: List[str]) -> float:
+    """
+    Оценка работы до загрузки: ожидаемая длительность аудио × суммарная стоимость моделей.
+    Длительность ещё неизвестна, поэтому берутся настроечные средние для видео и плейлиста.
+    """
+    download_type = DownloadType.PLAYLIST if ('list=' in url or 'playlist' in url) else DownloadType.VIDEO
+    duration = settings.admission_video_estimate_s
+    if download_type == DownloadType.PLAYLIST:
+        duration *= settings.admission_playlist_estimate_items
+    cost = sum(VOSK_WORK_COST if m.startswith("vosk") else MODEL_WORK_COST.get(m, 1.0) for m in model_names)
+    return duration * cost
+
+
+def priority_for(work: float) -> int:
+    """
+    Приоритет Celery (Redis: 0 — самый высокий). Короткие задачи обгоняют большие плейлисты.
+    """
+    ratio = work / (settings.admission_video_estimate_s * MODEL_WORK_COST["whisper-small"])
+    for priority, limit in ((0, 1.0), (3, 5.0), (6, 50.0)):
+        if ratio <= limit:
+            return priority
+    return 9
+
+
+def _retry_after(excess: float) -> int:
+    seconds = math.ceil(max(excess, 0.0) / settings.admission_drain_rate)
+    return max(1, min(seconds, settings.admission_max_retry_after_s))
+
+
+async def admit(task_id: str, client_id: str, work: float) -> None:
+    """
+    Учитывает работу задачи или выбрасывает AdmissionRejected с рекомендуемым Retry-After.
+    Если Redis недоступен, запрос пропускается (как и single-flight, контроль деградирует, а не блокирует).
+    """
+    if not settings.admission_enabled:
+        return
+
+    client = _get_async_client()
+    try:
+        pipe = client.pipeline(transaction=False)
+        for queue in _counted_queues():
+            for key in priority_queue_keys(queue):
+                pipe.llen(key)
+        queued = sum(await pipe.execute())
+        if queued >= settings.admission_max_queued:
+            raise AdmissionRejected(
+                f"Очереди переполнены ({queued} задач)",
+                _retry_after((queued - settings.admission_max_queued + 1) * settings.admission_video_estimate_s),
+            )
+
+        capacity = settings.admission_capacity
+        status, current = await client.eval(
+            _ADMIT_SCRIPT, 1, INFLIGHT_KEY,
+            task_id, client_id, work, time.time(), settings.admission_entry_ttl_s,
+            capacity, capacity * settings.admission_client_share,
+        )
+    except redis.RedisError as e:
+        logger.warning(f"Redis недоступен для контроля допуска, запрос пропущен: {e}")
+        return
+
+    current = float(current)
+    if status == 1:
+        raise AdmissionRejected(
+            f"Превышена доля клиента {client_id}",
+            _retry_after(current + work - capacity * settings.admission_client_share),
+        )
+    if status == 2:
+        raise AdmissionRejected("Сервис перегружен", _retry_after(current + work - capacity))
+
+
+async def release_async(task_id: str) -> None:
+    try:
+        await _get_async_client().hdel(INFLIGHT_KEY, task_id)
+    except redis.RedisError as e:
+        logger.warning(f"[{task_id}] Не удалось снять учёт работы: {e}")
+
+
+def release(task_id: str) -> None:
+    """
+    Снимает учёт работы задачи (вызывается из воркера по завершении).
+    """
+    try:
+        _get_sync_client().hdel(INFLIGHT_KEY, task_id)
+    except redis.RedisError as e:
+        logger.warning(f"[{task_id}] Не удалось снять учёт работы: {e}")
+
+
+def client_identity(api_key: Optional[str], forwarded_for: Optional[str], remote_host: Optional[str]) -> str:
+    if api_key:
+        # Сам ключ в Redis не храним
+        return f"key:{hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]}"
+    if settings.admission_trust_forwarded and forwarded_for:
+        return f"ip:{forwarded_for.split(',')[0].strip()}"
+    return f"ip:{remote_host or 'unknown'}"
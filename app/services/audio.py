@@ -0,0 +1,185 @@
+# app/services/audio.py
+
+import os
+import subprocess
+import threading
+from collections import deque
+from typing import Iterator, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.logging_config import setup_logger
+
+logger = setup_logger(__name__)
+
+SAMPLE_RATE = 16000
+STDERR_TAIL_LINES = 20
+
+
+class FFmpegError(RuntimeError):
+    pass
+
+
+def _drain_stderr(stream, tail: deque) -> None:
+    # Читаем stderr в отдельном потоке, чтобы ffmpeg не заблокировался на заполненном пайпе
+    for line in iter(stream.readline, b""):
+        tail.append(line.decode("utf-8", errors="replace").rstrip())
+    stream.close()
+
+
+def iter_pcm(
+    path: str,
+    sample_rate: int = SAMPLE_RATE,
+    chunk_bytes: Optional[int] = None,
+    start: Optional[float] = None,
+    duration: Optional[float] = None,
+) -> Iterator[bytes]:
+    """
+    Декодирует аудиофайл через ffmpeg и отдаёт PCM s16le mono блоками по chunk_bytes
+    прямо из stdout, без временных файлов. Если чтение прервано раньше конца,
+    процесс ffmpeg завершается.
+    start/duration (в секундах) ограничивают декодируемый фрагмент.
+    """
+    chunk_bytes = chunk_bytes or settings.audio_chunk_bytes
+    chunk_bytes -= chunk_bytes % 2  # блок должен содержать целое число сэмплов
+
+    cmd = ["ffmpeg", "-nostdin", "-loglevel", "error"]
+    if start:
+        cmd += ["-ss", f"{start:.3f}"]
+    cmd += ["-i", path]
+    if duration:
+        cmd += ["-t", f"{duration:.3f}"]
+    cmd += ["-ar", str(sample_rate), "-ac", "1", "-f", "s16le", "-"]
+    try:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=0)
+    except FileNotFoundError as e:
+        raise FFmpegError("ffmpeg не найден") from e
+
+    tail: deque = deque(maxlen=STDERR_TAIL_LINES)
+    stderr_thread = threading.Thread(target=_drain_stderr, args=(proc.stderr, tail), daemon=True)
+    stderr_thread.start()
+
+    finished = False
+    try:
+        while True:
+            data = proc.stdout.read(chunk_bytes)
+            if not data:
+                break
+            # read() у небуферизованного пайпа может вернуть меньше запрошенного
+            while len(data) < chunk_bytes:
+                more = proc.stdout.read(chunk_bytes - len(data))
+                if not more:
+                    break
+                data += more
+            yield data
+        finished = True
+    finally:
+        if not finished and proc.poll() is None:
+            proc.kill()
+        proc.stdout.close()
+        returncode = proc.wait()
+        stderr_thread.join(timeout=1)
+
+    if returncode != 0:
+        message = "\n".join(tail) or f"код возврата {returncode}"
+        raise FFmpegError(f"Ошибка декодирования {path}: {message}")
+
+
+def decode_pcm(
+    path: str,
+    sample_rate: int = SAMPLE_RATE,
+    start: Optional[float] = None,
+    duration: Optional[float] = None,
+) -> np.ndarray:
+    """
+    Декодирует файл (или его фрагмент) в float32-массив — формат, который принимает faster-whisper.
+    """
+    data = bytearray()
+    for chunk in iter_pcm(path, sample_rate, start=start, duration=duration):
+        data += chunk
+    return np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def decode_to_memmap(path: str, out_path: str, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """
+    Декодирует файл один раз в float32 PCM на диске и отображает его в память (только чтение).
+    Страницы буфера общие для всех потоков и процессов, которые открывают этот файл.
+    """
+    with open(out_path, "wb") as f:
+        for chunk in iter_pcm(path, sample_rate):
+            (np.frombuffer(chunk, dtype=np.int16).astype(np.float32) / 32768.0).tofile(f)
+    if os.path.getsize(out_path) == 0:
+        return np.empty(0, dtype=np.float32)
+    return np.memmap(out_path, dtype=np.float32, mode="r")
+
+
+def pcm_blocks(audio: np.ndarray, chunk_bytes: Optional[int] = None) -> Iterator[bytes]:
+    """
+    Обратное преобразование float32-буфера в блоки PCM s16le — формат, который принимает vosk.
+    """
+    step = (chunk_bytes or settings.audio_chunk_bytes) // 2
+    for i in range(0, len(audio), step):
+        yield (np.clip(audio[i:i + step], -1.0, 1.0) * 32767).astype(np.int16).tobytes()
+
+
+def encode_mp3(path: str, out_path: str, bitrate_kbps: int) -> None:
+    """
+    Перекодирует аудиопоток файла в MP3 с заданным битрейтом. Результат пишется во временный
+    файл и переименовывается, поэтому по out_path никогда не лежит недописанный mp3.
+    """
+    tmp_path = f"{out_path}.tmp"
+    cmd = [
+        "ffmpeg", "-nostdin", "-loglevel", "error", "-y",
+        "-i", path, "-vn", "-codec:a", "libmp3lame", "-b:a", f"{bitrate_kbps}k",
+        "-f", "mp3", tmp_path,
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True)
+    except FileNotFoundError as e:
+        raise FFmpegError("ffmpeg не найден") from e
+    if result.returncode != 0:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        tail = "\n".join(result.stderr.strip().splitlines()[-STDERR_TAIL_LINES:])
+        raise FFmpegError(f"Ошибка кодирования {path}: {tail or f'код возврата {result.returncode}'}")
+    os.replace(tmp_path, out_path)
+
+
+def probe_duration(path: str) -> float:
+    """
+    Длительность файла в секундах по данным ffprobe.
+    """
+    result = subprocess.run(
+        [
+            "ffprobe", "-v", "error",
+            "-show_entries", "format=duration",
+            "-of", "default=noprint_wrappers=1:nokey=1",
+            path,
+        ],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise FFmpegError(f"ffprobe не смог прочитать {path}: {result.stderr.strip()}")
+    try:
+        return float(result.stdout.strip())
+    except ValueError:
+        raise FFmpegError(f"ffprobe вернул некорректную длительность для {path}: {result.stdout!r}")
+
+
+def frame_energies(path: str, frame_ms: int = 20) -> np.ndarray:
+    """
+    Энергия (RMS) аудио по кадрам frame_ms. Файл читается потоково,
+    в памяти хранится только массив энергий.
+    """
+    frame = SAMPLE_RATE * frame_ms // 1000
+    energies = []
+    rest = np.empty(0, dtype=np.int16)
+    for chunk in iter_pcm(path):
+        samples = np.concatenate([rest, np.frombuffer(chunk, dtype=np.int16)])
+        usable = len(samples) - len(samples) % frame
+        frames = samples[:usable].astype(np.float32).reshape(-1, frame) / 32768.0
+        energies.append(np.sqrt(np.mean(frames ** 2, axis=1)))
+        rest = samples[usable:]
+    return np.concatenate(energies) if energies else np.empty(0, dtype=np.float32)
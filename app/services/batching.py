@@ -0,0 +1,141 @@
+# app/services/batching.py
+
+import time
+import queue
+import bisect
+import threading
+from concurrent.futures import Future
+from typing import List, Dict, Any, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.logging_config import setup_logger
+from app.core.metrics import track_stage, observe_rtf
+from app.services.audio import decode_pcm, SAMPLE_RATE
+from app.services.models_loader import get_whisper_model
+
+logger = setup_logger(__name__)
+
+CHUNK_LENGTH_S = 30
+
+
+def _speech_clips(audio: np.ndarray, offset: int) -> List[Dict[str, int]]:
+    """
+    Делит аудио одного файла на речевые фрагменты длиной не более CHUNK_LENGTH_S.
+    Границы возвращаются в сэмплах относительно общего (склеенного) буфера.
+    """
+    from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+    max_len = CHUNK_LENGTH_S * SAMPLE_RATE
+    speech = get_speech_timestamps(audio, VadOptions(max_speech_duration_s=CHUNK_LENGTH_S))
+
+    clips: List[Dict[str, int]] = []
+    for ts in speech:
+        if clips and ts["end"] - clips[-1]["start"] + offset <= max_len:
+            clips[-1]["end"] = ts["end"] + offset
+        else:
+            clips.append({"start": ts["start"] + offset, "end": ts["end"] + offset})
+    return clips
+
+
+def transcribe_whisper_batch(paths: List[str], model_size: str) -> List[List[Dict[str, Any]]]:
+    """
+    Транскрибирует несколько файлов одним батчевым проходом faster-whisper.
+    Речевые фрагменты всех файлов упаковываются в общие батчи по whisper_batch_size,
+    результат раскладывается обратно по файлам с таймкодами относительно каждого файла.
+    """
+    buffers = []
+    offsets = []
+    clips: List[Dict[str, int]] = []
+    total = 0
+    model_label = f"whisper-{model_size}"
+    with track_stage("decode", model_label):
+        for path in paths:
+            audio = decode_pcm(path)
+            offsets.append(total)
+            clips.extend(_speech_clips(audio, total))
+            buffers.append(audio)
+            total += len(audio)
+
+    results: List[List[Dict[str, Any]]] = [[] for _ in paths]
+    if not clips:
+        return results
+
+    from faster_whisper import BatchedInferencePipeline
+
+    pipeline = BatchedInferencePipeline(model=get_whisper_model(model_size))
+    started = time.monotonic()
+    starts = [o / SAMPLE_RATE for o in offsets]
+    with track_stage("inference", model_label):
+        segments, _ = pipeline.transcribe(
+            np.concatenate(buffers),
+            clip_timestamps=clips,
+            batch_size=settings.whisper_batch_size,
+        )
+        for segment in segments:
+            idx = bisect.bisect_right(starts, segment.start) - 1
+            results[idx].append({
+                "start": segment.start - starts[idx],
+                "end": segment.end - starts[idx],
+                "text": segment.text.strip(),
+            })
+    observe_rtf(model_label, time.monotonic() - started, total / SAMPLE_RATE)
+
+    logger.info(
+        f"Батч из {len(paths)} файлов ({len(clips)} фрагментов, {total / SAMPLE_RATE:.0f} с аудио) "
+        f"обработан за {time.monotonic() - started:.1f} с"
+    )
+    return results
+
+
+class WhisperBatcher:
+    """
+    Собирает запросы на транскрипцию из разных потоков в батчи.
+    Батч отправляется, когда набрано whisper_batch_max_files файлов
+    или истекло whisper_batch_max_wait_s с момента первого запроса.
+    """
+
+    def __init__(self, model_size: str):
+        self.model_size = model_size
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=f"whisper-batcher-{model_size}", daemon=True)
+        self._thread.start()
+
+    def submit(self, path: str) -> Future:
+        future: Future = Future()
+        self._queue.put((path, future))
+        return future
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + settings.whisper_batch_max_wait_s
+            while len(batch) < settings.whisper_batch_max_files:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            try:
+                results = transcribe_whisper_batch([path for path, _ in batch], self.model_size)
+                for (_, future), segments in zip(batch, results):
+                    future.set_result(segments)
+            except Exception as e:
+                logger.exception(f"Ошибка батчевой транскрипции ({len(batch)} файлов)")
+                for _, future in batch:
+                    future.set_exception(e)
+
+
+_batchers: Dict[str, WhisperBatcher] = {}
+_batchers_lock = threading.Lock()
+
+
+def get_batcher(model_size: str) -> WhisperBatcher:
+    with _batchers_lock:
+        if model_size not in _batchers:
+            _batchers[model_size] = WhisperBatcher(model_size)
+        return _batchers[model_size]
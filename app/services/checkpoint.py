@@ -0,0 +1,115 @@
+# app/services/checkpoint.py
+
+import os
+import json
+import time
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+
+from app.core.config import settings
+from app.core.logging_config import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class TranscriptionCheckpoint:
+    """
+    Контрольная точка транскрипции одного файла: готовые сегменты и позиция в аудио (с),
+    до которой они получены. Хранится рядом с mp3 в каталоге задачи и переживает
+    перезапуск воркера; повторная попытка продолжает распознавание с offset.
+
+    Точка также считает попытки, прерванные гибелью процесса (OOM, segfault): begin() ставит
+    отметку running, end() снимает её при любом штатном выходе. Если при следующем запуске
+    отметка осталась, предыдущая попытка была потеряна вместе с воркером.
+    """
+
+    def __init__(self, mp3_path: str, model_name: str, interval_s: Optional[float] = None):
+        self.path = f"{Path(mp3_path).with_suffix('')}.{model_name}.checkpoint.json"
+        self.model_name = model_name
+        self.interval_s = settings.checkpoint_interval_s if interval_s is None else interval_s
+        self.source_size = os.path.getsize(mp3_path)
+        self.segments: List[Dict[str, Any]] = []
+        self.offset = 0.0
+        self.lost_attempts = 0
+        self.running = False
+        self._saved_at = time.monotonic()
+        self._load()
+        self.resumed_from = self.offset
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Контрольная точка {self.path} повреждена и будет проигнорирована: {e}")
+            return
+
+        # Точка от другого файла или модели бесполезна
+        if state.get("model_name") != self.model_name or state.get("source_size") != self.source_size:
+            logger.warning(f"Контрольная точка {self.path} не соответствует файлу, начинаем сначала")
+            return
+        self.segments = state["segments"]
+        self.offset = state["offset"]
+        self.lost_attempts = state.get("lost_attempts", 0)
+        self.running = state.get("running", False)
+        if self.offset:
+            logger.info(f"Продолжение транскрипции с {self.offset:.1f} с ({len(self.segments)} сегментов): {self.path}")
+
+    def begin(self) -> int:
+        """
+        Отмечает начало попытки и возвращает число попыток, потерянных вместе с воркером.
+        """
+        if self.running:
+            self.lost_attempts += 1
+        self.running = True
+        self.save()
+        return self.lost_attempts
+
+    def end(self) -> None:
+        """
+        Снимает отметку running при штатном выходе из попытки (успех, ошибка, повтор).
+        """
+        if self.running and os.path.exists(self.path):
+            self.running = False
+            self.save()
+
+    def add(self, segment: Optional[Dict[str, Any]], offset: float) -> None:
+        """
+        Фиксирует сегмент (или только продвижение по аудио) и периодически сохраняет точку.
+        """
+        if segment:
+            self.segments.append(segment)
+        self.offset = offset
+        if time.monotonic() - self._saved_at >= self.interval_s:
+            self.save()
+
+    def save(self) -> None:
+        state = {
+            "model_name": self.model_name,
+            "source_size": self.source_size,
+            "offset": self.offset,
+            "segments": self.segments,
+            "lost_attempts": self.lost_attempts,
+            "running": self.running,
+        }
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(state, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self._saved_at = time.monotonic()
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить контрольную точку {self.path}: {e}")
+
+    @property
+    def progressed(self) -> bool:
+        return self.offset > self.resumed_from
+
+    def clear(self) -> None:
+        self.running = False
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,91 @@
+# app/services/chunking.py
+
+from typing import List, Dict, Any
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.logging_config import setup_logger
+from app.services.audio import frame_energies
+
+logger = setup_logger(__name__)
+
+FRAME_MS = 20
+MAX_OVERLAP_WORDS = 8
+
+
+def plan_chunks(path: str) -> List[Dict[str, float]]:
+    """
+    Делит длинный файл на фрагменты примерно по chunk_target_s секунд.
+    Границы ставятся в самом тихом месте в пределах ±chunk_search_s от целевой точки.
+    Каждый фрагмент декодируется с перекрытием chunk_overlap_s, но «владеет»
+    только интервалом [own_start, own_end) — по нему потом склеиваются сегменты.
+    """
+    energies = frame_energies(path, FRAME_MS)
+    frame_s = FRAME_MS / 1000
+    duration = len(energies) * frame_s
+    target = settings.chunk_target_s
+    search = int(settings.chunk_search_s / frame_s)
+
+    cuts = [0.0]
+    position = target
+    while position < duration - target / 2:
+        center = int(position / frame_s)
+        lo, hi = max(0, center - search), min(len(energies), center + search)
+        quietest = lo + int(np.argmin(energies[lo:hi]))
+        cuts.append(quietest * frame_s)
+        position = cuts[-1] + target
+    cuts.append(duration)
+
+    overlap = settings.chunk_overlap_s
+    windows = []
+    for own_start, own_end in zip(cuts, cuts[1:]):
+        windows.append({
+            "start": max(0.0, own_start - overlap),
+            "end": min(duration, own_end + overlap),
+            "own_start": own_start,
+            "own_end": own_end,
+        })
+
+    logger.info(f"Файл {path} ({duration:.0f} с) разбит на {len(windows)} фрагментов")
+    return windows
+
+
+def stitch_chunks(windows: List[Dict[str, float]], chunk_segments: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    Склеивает сегменты фрагментов в исходном порядке.
+    Таймкоды сегментов уже должны быть абсолютными. Из зоны перекрытия берётся
+    сегмент того фрагмента, которому принадлежит его середина, а повторённые
+    на стыке слова удаляются.
+    """
+    stitched: List[Dict[str, Any]] = []
+    for window, segments in zip(windows, chunk_segments):
+        first = True
+        for segment in segments:
+            middle = (segment["start"] + segment["end"]) / 2
+            if not window["own_start"] <= middle < window["own_end"]:
+                continue
+            if first and stitched:
+                segment = dict(segment, text=_strip_repeated_words(stitched[-1]["text"], segment["text"]))
+            first = False
+            if segment["text"]:
+                stitched.append(segment)
+    return stitched
+
+
+def _strip_repeated_words(previous: str, text: str) -> str:
+    """
+    Убирает из начала text слова, которыми заканчивается previous.
+    """
+    prev_words = [_normalize_word(w) for w in previous.split()]
+    words = text.split()
+    normalized = [_normalize_word(w) for w in words]
+
+    for size in range(min(MAX_OVERLAP_WORDS, len(prev_words), len(words)), 0, -1):
+        if prev_words[-size:] == normalized[:size]:
+            return " ".join(words[size:])
+    return text
+
+
+def _normalize_word(word: str) -> str:
+    return word.strip(".,!?;:…\"'«»").lower()
@@ -0,0 +1,170 @@
+# app/services/comparison.py
+
+import os
+import re
+import json
+import time
+import itertools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from difflib import SequenceMatcher
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+
+from app.core.config import settings
+from app.core.logging_config import setup_logger
+from app.core.metrics import track_stage
+from app.services.audio import decode_to_memmap, SAMPLE_RATE
+from app.services.progress import ProgressReporter
+from app.services.transcriber import cache_keys, cache_lookup, index_segments, store_transcript, transcribe_pcm
+from app.utils.transcript_writer import write_transcript
+
+logger = setup_logger(__name__)
+
+MAX_DIFF_EXAMPLES = 20
+_WORD_RE = re.compile(r"[\w']+", re.UNICODE)
+
+
+def _words(text: str) -> List[str]:
+    return [w.lower() for w in _WORD_RE.findall(text or "")]
+
+
+def word_diff(reference: str, hypothesis: str) -> Dict[str, Any]:
+    """
+    WER гипотезы относительно эталона и примеры расхождений по словам.
+    Выравнивание строится difflib.SequenceMatcher — на длинных транскриптах это быстрее
+    точного расстояния Левенштейна и даёт близкую оценку.
+    """
+    ref, hyp = _words(reference), _words(hypothesis)
+    matcher = SequenceMatcher(None, ref, hyp, autojunk=False)
+
+    substitutions = deletions = insertions = 0
+    examples = []
+    for op, i1, i2, j1, j2 in matcher.get_opcodes():
+        if op == "equal":
+            continue
+        if op == "replace":
+            common = min(i2 - i1, j2 - j1)
+            substitutions += common
+            deletions += (i2 - i1) - common
+            insertions += (j2 - j1) - common
+        elif op == "delete":
+            deletions += i2 - i1
+        elif op == "insert":
+            insertions += j2 - j1
+        if len(examples) < MAX_DIFF_EXAMPLES:
+            examples.append({"op": op, "reference": " ".join(ref[i1:i2]), "hypothesis": " ".join(hyp[j1:j2])})
+
+    errors = substitutions + deletions + insertions
+    return {
+        "wer": round(errors / len(ref), 4) if ref else (0.0 if not hyp else 1.0),
+        "reference_words": len(ref),
+        "hypothesis_words": len(hyp),
+        "substitutions": substitutions,
+        "deletions": deletions,
+        "insertions": insertions,
+        "examples": examples,
+    }
+
+
+def compare_transcripts(texts: Dict[str, str]) -> List[Dict[str, Any]]:
+    """
+    Попарное сравнение транскриптов: первая модель пары считается эталоном.
+    """
+    return [
+        {"reference": a, "hypothesis": b, **word_diff(texts[a], texts[b])}
+        for a, b in itertools.combinations(texts, 2)
+    ]
+
+
+def transcribe_compare(
+    mp3_path: str,
+    model_names: List[str],
+    source_id: Optional[str] = None,
+    reporter: Optional[ProgressReporter] = None,
+    formats: Optional[List[str]] = None,
+    task_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Транскрибирует один файл несколькими моделями.
+    Аудио декодируется один раз в memory-mapped буфер, который читают все модели
+    (параллельно при compare_parallel, иначе по очереди). Транскрипты каждой модели
+    пишутся в <имя>.<модель>.<формат>, сводка сравнения — в <имя>.compare.json.
+    """
+    base_path = Path(mp3_path).with_suffix("")
+    results: Dict[str, Dict[str, Any]] = {}
+    pending: Dict[str, List[str]] = {}
+    for model_name in model_names:
+        keys = cache_keys(mp3_path, model_name, source_id)
+        entry = cache_lookup(keys)
+        if entry:
+            results[model_name] = {"segments": entry["segments"], "text": entry["text"], "cached": True}
+        else:
+            pending[model_name] = keys
+
+    audio_s = None
+    if pending:
+        pcm_path = f"{base_path}.pcm"
+        with track_stage("decode", "compare"):
+            audio = decode_to_memmap(mp3_path, pcm_path)
+        audio_s = len(audio) / SAMPLE_RATE
+
+        def run(model_name: str) -> Dict[str, Any]:
+            if reporter:
+                reporter.stage("transcribing", model_name=model_name)
+            started = time.monotonic()
+            segments = transcribe_pcm(audio, model_name)
+            processing_s = time.monotonic() - started
+            return {
+                "segments": segments,
+                "text": store_transcript(mp3_path, model_name, segments, pending[model_name]),
+                "cached": False,
+                "processing_s": round(processing_s, 3),
+                "rtf": round(processing_s / audio_s, 4) if audio_s else None,
+            }
+
+        try:
+            if settings.compare_parallel:
+                with ThreadPoolExecutor(max_workers=len(pending)) as executor:
+                    futures = [executor.submit(contextvars.copy_context().run, run, name) for name in pending]
+                    results.update(zip(pending, (f.result() for f in futures)))
+            else:
+                for model_name in pending:
+                    results[model_name] = run(model_name)
+        finally:
+            del audio
+            os.remove(pcm_path)
+
+    if reporter:
+        reporter.stage("rendering")
+    outputs = []
+    for model_name in model_names:
+        outputs += write_transcript(
+            base_path.with_name(f"{base_path.name}.{model_name}"),
+            results[model_name]["segments"],
+            formats or settings.output_formats,
+            meta={"model_name": model_name},
+        )
+        index_segments(task_id, mp3_path, model_name, results[model_name]["segments"], source_id)
+
+    models = {
+        name: {k: v for k, v in result.items() if k not in ("segments", "text")}
+        for name, result in results.items()
+    }
+    comparison = compare_transcripts({name: results[name]["text"] for name in model_names})
+    report_path = base_path.with_name(f"{base_path.name}.compare.json")
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump({"audio_s": audio_s, "models": models, "comparison": comparison}, f, ensure_ascii=False, indent=2)
+    outputs.append(report_path)
+
+    os.remove(mp3_path)
+    for pair in comparison:
+        logger.info(f"[Compare] {base_path.name}: WER {pair['hypothesis']} относительно {pair['reference']} = {pair['wer']}")
+
+    return {
+        "audio_file": mp3_path,
+        "outputs": [str(p) for p in outputs],
+        "text": results[model_names[0]]["text"],
+        "models": models,
+        "comparison": comparison,
+    }
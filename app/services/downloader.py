@@ -1,4 +1,5 @@
 #app\services\downloader.py
+from app.core.config import settings
 from app.services.downloader_engine import YouTubeAudioDownloader  # твой импорт
 
 class DownloaderService:
@@ -6,5 +7,17 @@ class DownloaderService:
         self.task_dir = task_dir
         self.downloader = YouTubeAudioDownloader(task_dir)
 
-    def download_content(self, url: str, quality: int, max_workers: int, max_retries=3):
-        return self.downloader.download_content(url, quality, max_workers, max_retries)
+    def download_content(self, url: str, quality: int, max_workers: int, max_retries=3, on_item=None,
+                         keep_audio=False, skip_item=None):
+        """
+        max_workers — сколько элементов плейлиста качается одновременно,
+        max_retries — сколько раз повторяется элемент после временной ошибки.
+        on_item(file_path, item_id) вызывается для каждого файла сразу после его загрузки.
+        skip_item(entry) решает до загрузки, нужен ли элемент (entry: id, url, index).
+        keep_audio — дополнительно сохранить MP3 с битрейтом quality; транскрибируется
+        всегда исходный аудиопоток без перекодирования.
+        Загрузка укладывается в io_task_time_limit_s: под --pool=threads Celery этот лимит не применяет.
+        """
+        return self.downloader.download_content(url, quality, max_workers, max_retries, on_item=on_item,
+                                                keep_audio=keep_audio, deadline_s=settings.io_task_time_limit_s,
+                                                skip_item=skip_item)
@@ -0,0 +1,316 @@
+# app/services/downloader_engine.py
+
+import os
+import time
+import shutil
+import random
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.core.config import settings
+from app.core.logging_config import setup_logger
+from app.services.audio import encode_mp3, FFmpegError
+from app.utils.http_files import parse_content_range
+
+logger = setup_logger(__name__)
+
+# Ответы, после которых имеет смысл повторить запрос (403 — у ссылки на поток истёк срок)
+RETRYABLE_STATUSES = {403, 408, 429, 500, 502, 503, 504}
+
+
+class DownloadFailed(RuntimeError):
+    pass
+
+
+class TransientDownloadError(DownloadFailed):
+    """
+    Временная ошибка (сеть, 5xx, истёкшая ссылка): элемент можно скачать повторно.
+    """
+
+
+class YtDlpExtractor:
+    """
+    Извлекает элементы по ссылке и прямые ссылки на аудиопотоки через yt-dlp.
+
+    Движку подходит любой объект с теми же методами (например, заглушка для тестов):
+    entries(url) -> [{"id", "url", "index"}], resolve(entry) -> {"url", "ext", "http_headers", "upload_date"}.
+    """
+
+    def __init__(self):
+        # yt_dlp импортируется только в воркере загрузки
+        import yt_dlp
+
+        self._yt_dlp = yt_dlp
+
+    def _extract(self, url: str, **options: Any) -> Dict[str, Any]:
+        params = {"quiet": True, "no_warnings": True, "skip_download": True, **options}
+        try:
+            with self._yt_dlp.YoutubeDL(params) as ydl:
+                return ydl.extract_info(url, download=False)
+        except self._yt_dlp.utils.DownloadError as e:
+            cause = e.exc_info[1] if e.exc_info else None
+            # expected=True — видео удалено, закрыто и т.п.: повтор не поможет
+            if isinstance(cause, self._yt_dlp.utils.ExtractorError) and cause.expected:
+                raise DownloadFailed(str(e)) from e
+            raise TransientDownloadError(str(e)) from e
+
+    def entries(self, url: str) -> List[Dict[str, Any]]:
+        info = self._extract(url, extract_flat="in_playlist")
+        if info.get("_type") != "playlist":
+            return [{"id": info["id"], "url": info.get("webpage_url") or url, "index": 1}]
+        return [
+            {
+                "id": entry["id"],
+                "url": entry.get("url") or f"https://www.youtube.com/watch?v={entry['id']}",
+                "index": index,
+            }
+            for index, entry in enumerate((e for e in info.get("entries") or [] if e), start=1)
+        ]
+
+    def resolve(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        info = self._extract(entry["url"], format="bestaudio/best")
+        return {
+            "url": info["url"],
+            "ext": info.get("ext") or "webm",
+            "http_headers": info.get("http_headers") or {},
+            "upload_date": info.get("upload_date"),
+        }
+
+
+class YouTubeAudioDownloader:
+    """
+    Загружает аудио видео или плейлиста в task_dir.
+
+    Элементы плейлиста качаются параллельно (не больше max_workers и settings.max_download_workers
+    потоков) через общую requests.Session с пулом соединений. Поток пишется в <имя>.part
+    с докачкой через Range и сохраняется как есть (opus/m4a) — для транскрипции его хватает,
+    а ffmpeg всё равно декодирует его в PCM 16 кГц. В MP3 с битрейтом quality поток
+    кодируется, только если аудио нужно пользователю (keep_audio). Временные ошибки
+    повторяются до max_retries раз с экспоненциальной задержкой и джиттером; ссылка на поток
+    при каждом повторе запрашивается заново.
+
+    deadline_s ограничивает всю загрузку: time_limit Celery под --pool=threads не действует,
+    поэтому лимит проверяется здесь — между блоками потока, перед повтором и перед элементом.
+    """
+
+    def __init__(self, task_dir: str, extractor: Optional[Any] = None, session: Optional[requests.Session] = None):
+        self.task_dir = task_dir
+        self._extractor = extractor
+        self._session = session
+
+    @property
+    def extractor(self) -> Any:
+        if self._extractor is None:
+            self._extractor = YtDlpExtractor()
+        return self._extractor
+
+    def _make_session(self, workers: int) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def download_content(
+        self,
+        url: str,
+        quality: int,
+        max_workers: int,
+        max_retries: int = 3,
+        on_item: Optional[Callable[[str, str], None]] = None,
+        keep_audio: bool = False,
+        deadline_s: Optional[float] = None,
+        skip_item: Optional[Callable[[Dict[str, Any]], bool]] = None,
+    ) -> Union[str, List[str], None]:
+        """
+        Возвращает путь к аудио для видео или список путей (в порядке плейлиста) для плейлиста.
+        Пути указывают на исходный поток; при keep_audio рядом лежит <имя>.mp3.
+        Элементы, которые не удалось скачать, пропускаются; on_item(file_path, item_id) вызывается
+        из потока загрузки сразу после готовности каждого файла.
+        skip_item(entry) вызывается для каждого элемента до загрузки: True — элемент не скачивается
+        (например, его транскрипт уже есть в кэше).
+        """
+        is_playlist = "list=" in url or "playlist" in url
+        deadline = time.monotonic() + deadline_s if deadline_s else None
+        entries = self._retrying(lambda: self.extractor.entries(url), max_retries, url, deadline)
+        if not entries:
+            logger.warning(f"По ссылке {url} не найдено ни одного элемента")
+            return [] if is_playlist else None
+        if skip_item:
+            total = len(entries)
+            entries = [entry for entry in entries if not skip_item(entry)]
+            if len(entries) < total:
+                logger.info(f"Пропущено элементов без загрузки: {total - len(entries)} из {total}")
+            if not entries:
+                return [] if is_playlist else None
+
+        workers = max(1, min(max_workers, settings.max_download_workers, len(entries)))
+        logger.info(f"Загрузка {len(entries)} элементов в {workers} потоков: {url}")
+
+        session = self._session or self._make_session(workers)
+        results: Dict[int, str] = {}
+        try:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="download") as executor:
+                # Контекст лога (task_id) переносится в потоки загрузки
+                futures = {
+                    executor.submit(contextvars.copy_context().run, self._download_item, session, entry, quality,
+                                    max_retries, keep_audio, deadline): entry
+                    for entry in entries
+                }
+                for future in as_completed(futures):
+                    entry = futures[future]
+                    try:
+                        path = future.result()
+                    except Exception as e:
+                        logger.error(f"Не удалось скачать элемент {entry['index']} ({entry['id']}): {e}")
+                        continue
+                    results[entry["index"]] = path
+                    if on_item:
+                        on_item(path, entry["id"])
+        finally:
+            if self._session is None:
+                session.close()
+
+        files = [results[index] for index in sorted(results)]
+        logger.info(f"Скачано {len(files)} из {len(entries)} элементов: {url}")
+        if is_playlist:
+            return files
+        return files[0] if files else None
+
+    def _retrying(self, action: Callable[[], Any], max_retries: int, label: str,
+                  deadline: Optional[float] = None) -> Any:
+        attempt = 0
+        while True:
+            _check_deadline(deadline)
+            try:
+                return action()
+            except TransientDownloadError as e:
+                if attempt >= max_retries:
+                    raise
+                # «Полный» джиттер: параллельные загрузки не повторяют запросы синхронно
+                delay = random.uniform(0, min(settings.download_retry_backoff_max_s,
+                                              settings.download_retry_backoff_s * 2 ** attempt))
+                if deadline is not None and time.monotonic() + delay > deadline:
+                    raise DownloadFailed(f"Превышен лимит времени загрузки: {e}") from e
+                attempt += 1
+                logger.warning(f"{label}: {e}; повтор {attempt}/{max_retries} через {delay:.1f} с")
+                time.sleep(delay)
+
+    def _download_item(self, session: requests.Session, entry: Dict[str, Any], quality: int, max_retries: int,
+                       keep_audio: bool = False, deadline: Optional[float] = None) -> str:
+        def attempt() -> str:
+            stream = self.extractor.resolve(entry)
+            base = os.path.join(self.task_dir, _item_name(entry, stream))
+            native_mp3 = stream["ext"] == "mp3"
+            # Транскрипция удаляет свой входной файл: если поток уже MP3 и его нужно сохранить,
+            # вход транскрипции получает другое расширение (.mpga — тоже MP3), а <имя>.mp3 — жёсткую ссылку
+            audio_path = f"{base}.mpga" if native_mp3 and keep_audio else f"{base}.{stream['ext']}"
+            mp3_path = f"{base}.mp3"
+            # Файл уже готов (повторный запуск задачи в том же каталоге)
+            if os.path.exists(audio_path) and (not keep_audio or os.path.exists(mp3_path)):
+                return audio_path
+
+            part_path = f"{audio_path}.part"
+            _fetch(session, stream, part_path, deadline)
+            if keep_audio and native_mp3:
+                _link_or_copy(part_path, mp3_path)
+            elif keep_audio:
+                try:
+                    encode_mp3(part_path, mp3_path, int(quality))
+                except FFmpegError as e:
+                    # Скорее всего, файл повреждён — следующая попытка скачает его заново
+                    os.remove(part_path)
+                    raise TransientDownloadError(str(e)) from e
+            os.replace(part_path, audio_path)
+            return audio_path
+
+        return self._retrying(attempt, max_retries, f"Элемент {entry['index']} ({entry['id']})", deadline)
+
+
+def _link_or_copy(source: str, target: str) -> None:
+    if os.path.exists(target):
+        os.remove(target)
+    try:
+        os.link(source, target)
+    except OSError:
+        # Файловая система без жёстких ссылок
+        shutil.copyfile(source, target)
+
+
+def _item_name(entry: Dict[str, Any], stream: Dict[str, Any]) -> str:
+    """
+    Имя файла без расширения: <дата публикации>_pos<номер в плейлисте>.
+    Имя стабильно между попытками, поэтому .part от прерванной загрузки находится и докачивается.
+    """
+    date = stream.get("upload_date") or ""
+    if len(date) == 8 and date.isdigit():
+        date = f"{date[:4]}-{date[4:6]}-{date[6:]}"
+    else:
+        date = "unknown-date"
+    return f"{date}_pos{entry['index']}"
+
+
+def _check_deadline(deadline: Optional[float]) -> None:
+    if deadline is not None and time.monotonic() > deadline:
+        raise DownloadFailed("Превышен лимит времени загрузки")
+
+
+def _fetch(session: requests.Session, stream: Dict[str, Any], part_path: str, deadline: Optional[float] = None) -> None:
+    """
+    Скачивает поток в part_path, продолжая с уже скачанного размера.
+    Если ответ не стыкуется с .part (416 с другим размером потока, 206 не с того байта),
+    .part удаляется и поток скачивается заново.
+    """
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = dict(stream.get("http_headers") or {})
+    if offset:
+        headers["Range"] = f"bytes={offset}-"
+
+    timeout = (settings.download_connect_timeout_s, settings.download_read_timeout_s)
+    try:
+        with session.get(stream["url"], headers=headers, stream=True, timeout=timeout) as response:
+            content_range = parse_content_range(response.headers.get("Content-Range"))
+            if response.status_code == 416 and offset:
+                # .part уже содержит весь поток — если его размер совпадает с размером на сервере
+                if content_range and content_range[2] == offset:
+                    return
+                return _restart(session, stream, part_path, deadline, response,
+                                f"сервер не подтвердил размер {offset} байт ({content_range})")
+            if response.status_code in RETRYABLE_STATUSES:
+                raise TransientDownloadError(f"HTTP {response.status_code}")
+            response.raise_for_status()
+            if offset and response.status_code != 206:
+                logger.info(f"Сервер не поддерживает докачку, {os.path.basename(part_path)} загружается заново")
+                offset = 0
+            elif offset and (not content_range or content_range[0] != offset):
+                return _restart(session, stream, part_path, deadline, response,
+                                f"ответ 206 начинается не с {offset} байт ({content_range})")
+
+            length = response.headers.get("Content-Length")
+            expected = offset + int(length) if length else None
+            with open(part_path, "ab" if offset else "wb") as f:
+                for block in response.iter_content(chunk_size=settings.download_chunk_bytes):
+                    f.write(block)
+                    _check_deadline(deadline)
+    except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+        # Скачанная часть остаётся на диске, следующая попытка её докачает
+        raise TransientDownloadError(str(e)) from e
+    except requests.HTTPError as e:
+        raise DownloadFailed(str(e)) from e
+
+    size = os.path.getsize(part_path)
+    if expected is not None and size < expected:
+        raise TransientDownloadError(f"Поток оборвался: {size} из {expected} байт")
+
+
+def _restart(session: requests.Session, stream: Dict[str, Any], part_path: str, deadline: Optional[float],
+             response: requests.Response, reason: str) -> None:
+    # Без .part запрос уходит без Range, поэтому повторный перезапуск невозможен
+    response.close()
+    logger.warning(f"{os.path.basename(part_path)}: {reason}, .part удалён, поток скачивается заново")
+    os.remove(part_path)
+    _fetch(session, stream, part_path, deadline)
@@ -0,0 +1,157 @@
+# app/services/model_routing.py
+
+import os
+import time
+import threading
+from typing import Optional, Dict, Any, Set
+
+import redis
+from celery.signals import celeryd_after_setup, worker_process_init, worker_process_shutdown
+
+from app.celery_app import celery
+from app.core.config import settings
+from app.core.logging_config import setup_logger
+from app.services.models_loader import model_pool
+
+logger = setup_logger(__name__)
+
+MODEL_QUEUE_PREFIX = "model."
+# Множество pid процессов хоста, у которых модель в пуле: <префикс><хост>:<модель>
+HOLDERS_KEY_PREFIX = "model-holders:"
+
+_worker_hostname: Optional[str] = None
+_active_queues: Set[str] = set()
+_active_queues_at = 0.0
+_active_queues_lock = threading.Lock()
+_client: Optional[redis.Redis] = None
+
+
+def model_queue(model_name: str) -> str:
+    return f"{MODEL_QUEUE_PREFIX}{model_name}"
+
+
+def _get_client() -> redis.Redis:
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.redis_broker_url, decode_responses=True)
+    return _client
+
+
+def _holders_key(name: str) -> str:
+    return f"{HOLDERS_KEY_PREFIX}{_worker_hostname}:{name}"
+
+
+@celeryd_after_setup.connect
+def _remember_hostname(sender, instance, **kwargs):
+    global _worker_hostname
+    _worker_hostname = sender
+    if not settings.model_affinity_routing:
+        return
+    # Держатели от прошлого запуска воркера с тем же именем больше не существуют
+    try:
+        client = _get_client()
+        keys = list(client.scan_iter(match=f"{HOLDERS_KEY_PREFIX}{sender}:*"))
+        if keys:
+            client.delete(*keys)
+    except redis.RedisError as e:
+        logger.warning(f"Не удалось сбросить держателей моделей воркера {sender}: {e}")
+
+
+def _hold(name: str) -> None:
+    try:
+        _get_client().sadd(_holders_key(name), os.getpid())
+    except redis.RedisError as e:
+        logger.warning(f"Не удалось учесть модель '{name}' процесса {os.getpid()}: {e}")
+    queue = model_queue(name)
+    celery.control.add_consumer(queue, destination=[_worker_hostname], reply=False)
+    logger.info(f"Воркер {_worker_hostname} подписан на очередь {queue}")
+
+
+def _release(name: str) -> None:
+    """
+    Подписка общая для всего воркера, а пул моделей — свой у каждого дочернего процесса prefork:
+    от очереди отписываемся, только когда модель не осталась ни у одного процесса хоста.
+    """
+    try:
+        pipe = _get_client().pipeline()
+        pipe.srem(_holders_key(name), os.getpid())
+        pipe.scard(_holders_key(name))
+        _, holders = pipe.execute()
+    except redis.RedisError as e:
+        # Без счётчика безопаснее остаться подписанным: модель загрузится заново при первой задаче
+        logger.warning(f"Не удалось проверить держателей модели '{name}', подписка сохранена: {e}")
+        return
+    queue = model_queue(name)
+    if holders:
+        logger.debug(f"Модель '{name}' ещё у процессов воркера ({holders}), подписка на {queue} сохранена")
+        return
+    celery.control.cancel_consumer(queue, destination=[_worker_hostname], reply=False)
+    logger.info(f"Воркер {_worker_hostname} отписан от очереди {queue}")
+
+
+def _sync_model_queue(event: str, name: str, info: Dict[str, Any]) -> None:
+    """
+    Воркер подписывается на очередь модели, когда она загружена в пул,
+    и отписывается, когда модель вытеснена во всех его процессах.
+    """
+    if not settings.model_affinity_routing or not _worker_hostname:
+        return
+
+    if event == "load":
+        _hold(name)
+    elif event == "evict":
+        _release(name)
+
+
+model_pool.add_listener(_sync_model_queue)
+
+
+@worker_process_init.connect
+def _hold_inherited_models(**kwargs):
+    # Модели, предзагруженные в главном процессе (models_preload_stage=parent), достались потомку через fork
+    if not settings.model_affinity_routing or not _worker_hostname:
+        return
+    for name in model_pool.loaded():
+        try:
+            _get_client().sadd(_holders_key(name), os.getpid())
+        except redis.RedisError as e:
+            logger.warning(f"Не удалось учесть модель '{name}' процесса {os.getpid()}: {e}")
+
+
+@worker_process_shutdown.connect
+def _release_models(**kwargs):
+    # Завершающийся процесс (max_tasks_per_child, остановка) больше не держит свои модели
+    if not settings.model_affinity_routing or not _worker_hostname:
+        return
+    for name in model_pool.loaded():
+        try:
+            _release(name)
+        except Exception:
+            logger.exception(f"Ошибка при освобождении модели '{name}'")
+
+
+def queue_for_model(model_name: str) -> Optional[str]:
+    """
+    Возвращает выделенную очередь модели (model_queues), очередь воркеров,
+    у которых модель уже загружена, или None — тогда задача уходит в общую CPU-очередь.
+    """
+    global _active_queues, _active_queues_at
+
+    if model_name in settings.model_queues:
+        return model_queue(model_name)
+
+    if not settings.model_affinity_routing:
+        return None
+
+    with _active_queues_lock:
+        if time.monotonic() - _active_queues_at > settings.model_affinity_refresh_s:
+            try:
+                replies = celery.control.inspect(timeout=1.0).active_queues() or {}
+                _active_queues = {q["name"] for queues in replies.values() for q in queues}
+            except Exception as e:
+                logger.warning(f"Не удалось получить активные очереди воркеров: {e}")
+                _active_queues = set()
+            _active_queues_at = time.monotonic()
+
+        queue = model_queue(model_name)
+        return queue if queue in _active_queues else None
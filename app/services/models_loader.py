@@ -1,55 +1,147 @@
 # app/services/models_loader.py
 
-import os
-import io
-import zipfile
-import requests
-from functools import lru_cache
-from faster_whisper import WhisperModel
-from vosk import Model
+import time
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Callable, Dict, List
 
+from app.core.config import settings
 from app.core.logging_config import setup_logger
+from app.core.metrics import MODEL_POOL_REQUESTS, MODEL_POOL_EVICTIONS, MODEL_LOAD_SECONDS
+from app.services.vosk_registry import VOSK_MODELS, ensure_model
+
+# faster_whisper и vosk импортируются при загрузке модели: процессу API они не нужны
+if TYPE_CHECKING:
+    from faster_whisper import WhisperModel
+    from vosk import Model
 
 logger = setup_logger(__name__)
 
 logger.info("Модуль инициализирован")
-MODEL_URL = "https://alphacephei.com/vosk/models/vosk-model-small-en-us-0.15.zip"
-MODEL_DIR = "vosk_models"
+
+# Примерный объём памяти модели в МБ (CPU, int8) — используется для учёта бюджета пула
+MODEL_COST_MB = {
+    "whisper-tiny": 150,
+    "whisper-base": 250,
+    "whisper-small": 600,
+    "whisper-medium": 1600,
+    "whisper-large-2": 3200,
+    **{name: info["cost_mb"] for name, info in VOSK_MODELS.items()},
+}
+DEFAULT_MODEL_COST_MB = 1000
 
 
-@lru_cache(maxsize=1)
-def get_whisper_model(model_name: str = "small") -> WhisperModel:
+class ModelPool:
     """
-    Возвращает faster-whisper модель (CPU, int8).
+    Пул резидентных моделей с бюджетом памяти.
+    Держит в памяти несколько моделей, при превышении бюджета вытесняет
+    давно не использованные. Загрузка одной и той же модели из разных потоков
+    выполняется один раз.
     """
-    logger.info(f"Загрузка модели Whisper: '{model_name}' (device=cpu, compute_type=int8)")
-    return WhisperModel(
-        model_name,
-        device="cpu",
-        compute_type="int8"
-    )
 
+    def __init__(self, budget_mb: int):
+        self.budget_mb = budget_mb
+        self._models: "OrderedDict[str, tuple[Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._listeners: List[Callable[[str, str, Dict[str, Any]], None]] = []
+        self.hits = 0
+        self.misses = 0
+
+    def add_listener(self, listener: Callable[[str, str, Dict[str, Any]], None]) -> None:
+        """
+        Подписка на события пула: listener(event, name, info), event — "load" или "evict".
+        """
+        self._listeners.append(listener)
+
+    def get(self, name: str, loader: Callable[[], Any]) -> Any:
+        with self._lock:
+            if name in self._models:
+                self._models.move_to_end(name)
+                self.hits += 1
+                MODEL_POOL_REQUESTS.labels(name, "hit").inc()
+                return self._models[name][0]
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+
+        with load_lock:
+            # Модель могла быть загружена другим потоком, пока мы ждали
+            with self._lock:
+                if name in self._models:
+                    self._models.move_to_end(name)
+                    self.hits += 1
+                    MODEL_POOL_REQUESTS.labels(name, "hit").inc()
+                    return self._models[name][0]
+                self.misses += 1
+                MODEL_POOL_REQUESTS.labels(name, "miss").inc()
+
+            cost = MODEL_COST_MB.get(name, DEFAULT_MODEL_COST_MB)
+            self._evict_for(cost)
+
+            started = time.monotonic()
+            model = loader()
+            elapsed = time.monotonic() - started
+            MODEL_LOAD_SECONDS.labels(name).observe(elapsed)
+
+            with self._lock:
+                self._models[name] = (model, cost)
+
+        logger.info(f"Модель '{name}' загружена за {elapsed:.1f} с (~{cost} МБ, в пуле: {self.loaded()})")
+        self._emit("load", name, {"seconds": elapsed, "cost_mb": cost})
+        return model
+
+    def _evict_for(self, cost: int) -> None:
+        evicted = []
+        with self._lock:
+            while self._models and self.used_mb() + cost > self.budget_mb:
+                name, (_, freed) = self._models.popitem(last=False)
+                evicted.append((name, freed))
+
+        for name, freed in evicted:
+            MODEL_POOL_EVICTIONS.labels(name).inc()
+            logger.info(f"Модель '{name}' вытеснена из пула (освобождено ~{freed} МБ)")
+            self._emit("evict", name, {"cost_mb": freed})
 
-@lru_cache(maxsize=1)
-def get_vosk_model() -> Model:
+    def _emit(self, event: str, name: str, info: Dict[str, Any]) -> None:
+        for listener in self._listeners:
+            try:
+                listener(event, name, info)
+            except Exception:
+                logger.exception(f"Ошибка обработчика события пула '{event}' для '{name}'")
+
+    def used_mb(self) -> int:
+        return sum(cost for _, cost in self._models.values())
+
+    def loaded(self) -> List[str]:
+        return list(self._models.keys())
+
+
+model_pool = ModelPool(settings.models_memory_budget_mb)
+
+
+def get_whisper_model(model_name: str = "small") -> "WhisperModel":
     """
-    Скачивает и возвращает Vosk модель.
+    Возвращает faster-whisper модель (CPU, int8).
     """
-    os.makedirs(MODEL_DIR, exist_ok=True)
-    model_path = os.path.join(MODEL_DIR, "vosk-model-small-en-us-0.15")
+    def load() -> "WhisperModel":
+        from faster_whisper import WhisperModel
+
+        logger.info(f"Загрузка модели Whisper: '{model_name}' (device=cpu, compute_type=int8)")
+        return WhisperModel(
+            model_name,
+            device="cpu",
+            compute_type="int8"
+        )
+
+    return model_pool.get(f"whisper-{model_name}", load)
 
-    if not os.path.exists(model_path):
-        logger.info("Начато скачивание модели Vosk...")
-        try:
-            response = requests.get(MODEL_URL)
-            response.raise_for_status()
 
-            with zipfile.ZipFile(io.BytesIO(response.content)) as zip_ref:
-                zip_ref.extractall(MODEL_DIR)
+def get_vosk_model(model_name: str = "vosk") -> "Model":
+    """
+    Скачивает (при необходимости) и возвращает Vosk модель из реестра vosk_registry.
+    """
+    def load() -> "Model":
+        from vosk import Model
 
-            logger.info("Модель Vosk успешно загружена и распакована.")
-        except Exception as e:
-            logger.exception("Ошибка при загрузке модели Vosk")
-            raise RuntimeError(f"Ошибка загрузки модели: {str(e)}")
+        return Model(ensure_model(model_name))
 
-    return Model(model_path)
+    return model_pool.get(model_name, load)
@@ -0,0 +1,87 @@
+# app/services/progress.py
+
+import json
+import time
+from typing import Optional, Any, AsyncIterator, Dict
+
+import redis
+from redis import asyncio as aioredis
+
+from app.core.config import settings
+from app.core.logging_config import setup_logger
+
+logger = setup_logger(__name__)
+
+CHANNEL_PREFIX = "task-progress-"
+
+_client: Optional[redis.Redis] = None
+
+
+def channel_name(task_id: str) -> str:
+    return f"{CHANNEL_PREFIX}{task_id}"
+
+
+def _get_client() -> redis.Redis:
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.redis_broker_url)
+    return _client
+
+
+def publish(task_id: Optional[str], event: str, **data: Any) -> None:
+    """
+    Публикует событие прогресса задачи в Redis pub/sub.
+    Ошибки публикации не прерывают обработку — прогресс вторичен.
+    """
+    if not task_id or not settings.progress_events_enabled:
+        return
+    payload = json.dumps({"event": event, "task_id": task_id, "ts": time.time(), **data}, ensure_ascii=False)
+    try:
+        _get_client().publish(channel_name(task_id), payload)
+    except redis.RedisError as e:
+        logger.debug(f"[{task_id}] Не удалось опубликовать событие '{event}': {e}")
+
+
+class ProgressReporter:
+    """
+    Публикует стадии и сегменты транскрипции одного файла.
+    """
+
+    def __init__(self, task_id: Optional[str], audio_file: str):
+        self.task_id = task_id
+        self.audio_file = audio_file
+
+    def stage(self, stage: str, **data: Any) -> None:
+        publish(self.task_id, "stage", stage=stage, audio_file=self.audio_file, **data)
+
+    def segment(self, segment: Dict[str, Any]) -> None:
+        publish(self.task_id, "segment", audio_file=self.audio_file, **segment)
+
+    def partial(self, text: str) -> None:
+        publish(self.task_id, "partial", audio_file=self.audio_file, text=text)
+
+
+async def subscribe(task_id: str, heartbeat_s: float = 15.0) -> AsyncIterator[Optional[Dict[str, Any]]]:
+    """
+    Асинхронно читает события задачи. Первым отдаётся событие "subscribed" — после него
+    подписка уже активна и ни одно новое событие не потеряется. Раз в heartbeat_s
+    при отсутствии событий отдаёт None, чтобы вызывающий мог отправить keep-alive клиенту.
+    """
+    client = aioredis.from_url(settings.redis_broker_url)
+    pubsub = client.pubsub()
+    await pubsub.subscribe(channel_name(task_id))
+    try:
+        yield {"event": "subscribed", "task_id": task_id}
+        while True:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=heartbeat_s)
+            if message is None:
+                yield None
+                continue
+            try:
+                yield json.loads(message["data"])
+            except ValueError:
+                continue
+    finally:
+        await pubsub.unsubscribe(channel_name(task_id))
+        await pubsub.aclose()
+        await client.aclose()
@@ -0,0 +1,46 @@
+# app/services/readiness.py
+
+import json
+from typing import Dict, Any, Optional
+
+import redis
+from redis import asyncio as aioredis
+
+from app.core.config import settings
+from app.core.logging_config import setup_logger
+
+logger = setup_logger(__name__)
+
+WARM_MODELS_PREFIX = "worker-models-"
+
+_client: Optional[aioredis.Redis] = None
+
+
+def _get_client() -> aioredis.Redis:
+    global _client
+    if _client is None:
+        _client = aioredis.from_url(settings.redis_broker_url, decode_responses=True)
+    return _client
+
+
+async def check_readiness() -> Dict[str, Any]:
+    """
+    Доступность брокера и модели, прогретые в процессах воркеров (по heartbeat-ключам в Redis).
+    """
+    client = _get_client()
+    try:
+        await client.ping()
+        keys = [key async for key in client.scan_iter(match=f"{WARM_MODELS_PREFIX}*", count=100)]
+        values = await client.mget(keys) if keys else []
+    except redis.RedisError as e:
+        logger.warning(f"Проверка готовности: брокер недоступен: {e}")
+        return {"ready": False, "broker": False, "workers": [], "warm_models": []}
+
+    workers = []
+    for key, value in zip(keys, values):
+        if value is None:
+            continue
+        workers.append({"worker": key[len(WARM_MODELS_PREFIX):], "models": json.loads(value)})
+
+    warm_models = sorted({model for worker in workers for model in worker["models"]})
+    return {"ready": True, "broker": True, "workers": workers, "warm_models": warm_models}
@@ -0,0 +1,214 @@
+# app/services/search_index.py
+
+import os
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional
+
+from app.core.config import settings
+from app.core.logging_config import setup_logger
+
+logger = setup_logger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    task_id TEXT NOT NULL,
+    audio_file TEXT NOT NULL,
+    model_name TEXT NOT NULL,
+    video_id TEXT,
+    indexed_at REAL NOT NULL,
+    first_rowid INTEGER,
+    last_rowid INTEGER,
+    UNIQUE (task_id, audio_file, model_name)
+);
+CREATE INDEX IF NOT EXISTS documents_video_id ON documents (video_id);
+CREATE INDEX IF NOT EXISTS documents_task_id ON documents (task_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS segments USING fts5(
+    text,
+    doc_id UNINDEXED,
+    start UNINDEXED,
+    "end" UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+# Сегменты документа лежат в segments сплошным диапазоном rowid [first_rowid, last_rowid]:
+# удаление по диапазону rowid идёт по индексу FTS5, а фильтр по doc_id (UNINDEXED) читает всю таблицу
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+
+def _connect() -> sqlite3.Connection:
+    """
+    Соединение на поток: sqlite3 не разрешает делить соединение между потоками.
+    WAL позволяет читать индекс, пока воркеры дописывают в него новые транскрипты.
+    Неявный BEGIN модуля sqlite3 отключён: транзакции записи открывает _write.
+    """
+    global _schema_ready
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(settings.search_index_path) or ".", exist_ok=True)
+        conn = sqlite3.connect(settings.search_index_path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _local.conn = conn
+    if not _schema_ready:
+        with _schema_lock:
+            if not _schema_ready:
+                _migrate(conn)
+                conn.executescript(SCHEMA)
+                _schema_ready = True
+    return conn
+
+
+@contextmanager
+def _write(conn: sqlite3.Connection):
+    """
+    Транзакция записи: BEGIN IMMEDIATE сразу берёт блокировку записи (ожидая её до timeout соединения),
+    поэтому всё прочитанное внутри не изменится другими процессами до COMMIT.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+def _migrate(conn: sqlite3.Connection) -> None:
+    # Индекс, созданный до появления диапазонов rowid: у старых документов диапазон пуст
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(documents)")}
+    if columns and "first_rowid" not in columns:
+        with _write(conn):
+            # Другой процесс мог мигрировать индекс, пока ждали блокировку
+            if "first_rowid" in {row[1] for row in conn.execute("PRAGMA table_info(documents)")}:
+                return
+            conn.execute("ALTER TABLE documents ADD COLUMN first_rowid INTEGER")
+            conn.execute("ALTER TABLE documents ADD COLUMN last_rowid INTEGER")
+
+
+def _delete_documents(conn: sqlite3.Connection, rows: List[tuple]) -> None:
+    for doc_id, first_rowid, last_rowid in rows:
+        if first_rowid is not None:
+            conn.execute("DELETE FROM segments WHERE rowid BETWEEN ? AND ?", (first_rowid, last_rowid))
+        else:
+            conn.execute("DELETE FROM segments WHERE doc_id = ?", (doc_id,))
+        conn.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+
+
+def video_id_from_source(source_id: Optional[str]) -> Optional[str]:
+    if source_id and source_id.startswith("yt:"):
+        return source_id[len("yt:"):]
+    return None
+
+
+def index_transcript(
+    task_id: str,
+    audio_file: str,
+    model_name: str,
+    segments: List[Dict[str, Any]],
+    video_id: Optional[str] = None,
+) -> None:
+    """
+    Добавляет (или заменяет) сегменты одного транскрипта в индексе одной транзакцией.
+    """
+    rows = [s for s in segments if s["text"]]
+    conn = _connect()
+    with _write(conn):
+        _delete_documents(conn, conn.execute(
+            "SELECT id, first_rowid, last_rowid FROM documents WHERE task_id = ? AND audio_file = ? AND model_name = ?",
+            (task_id, audio_file, model_name),
+        ).fetchall())
+        # Блокировка записи взята до чтения максимума, поэтому диапазон rowid после него свободен
+        first_rowid = conn.execute("SELECT rowid FROM segments ORDER BY rowid DESC LIMIT 1").fetchone()
+        first_rowid = (first_rowid[0] if first_rowid else 0) + 1
+        doc_id = conn.execute(
+            "INSERT INTO documents (task_id, audio_file, model_name, video_id, indexed_at, first_rowid, last_rowid) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (task_id, audio_file, model_name, video_id, time.time(), first_rowid, first_rowid + len(rows) - 1),
+        ).lastrowid
+        conn.executemany(
+            'INSERT INTO segments (rowid, text, doc_id, start, "end") VALUES (?, ?, ?, ?, ?)',
+            ((first_rowid + i, s["text"], doc_id, s["start"], s["end"]) for i, s in enumerate(rows)),
+        )
+    logger.info(f"[{task_id}] Проиндексировано сегментов: {len(segments)} ({audio_file}, {model_name})")
+
+
+def delete_task(task_id: str) -> int:
+    """
+    Удаляет из индекса все транскрипты задачи (вызывается, когда janitor удаляет её каталог).
+    """
+    conn = _connect()
+    with _write(conn):
+        rows = conn.execute("SELECT id, first_rowid, last_rowid FROM documents WHERE task_id = ?", (task_id,)).fetchall()
+        _delete_documents(conn, rows)
+    if rows:
+        logger.info(f"[{task_id}] Из индекса удалено транскриптов: {len(rows)}")
+    return len(rows)
+
+
+def _match_query(query: str) -> str:
+    # Каждое слово — отдельная строка в кавычках: синтаксис FTS5 в запросе пользователя не интерпретируется
+    return " ".join('"' + term.replace('"', '""') + '"' for term in query.split())
+
+
+def deep_link(video_id: Optional[str], start: float) -> Optional[str]:
+    if not video_id:
+        return None
+    return f"https://www.youtube.com/watch?v={video_id}&t={int(start)}s"
+
+
+def search(
+    query: str,
+    limit: int = 20,
+    offset: int = 0,
+    task_id: Optional[str] = None,
+    video_id: Optional[str] = None,
+    model_name: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Сегменты, содержащие все слова запроса, по убыванию релевантности (bm25).
+    """
+    match = _match_query(query)
+    if not match:
+        return []
+
+    filters, params = [], [match]
+    for column, value in (("task_id", task_id), ("video_id", video_id), ("model_name", model_name)):
+        if value:
+            filters.append(f"d.{column} = ?")
+            params.append(value)
+    where = "".join(f" AND {f}" for f in filters)
+
+    rows = _connect().execute(
+        f"""
+        SELECT d.task_id, d.audio_file, d.model_name, d.video_id, s.start, s."end",
+               snippet(segments, 0, '[', ']', '…', 16), bm25(segments)
+        FROM segments s JOIN documents d ON d.id = s.doc_id
+        WHERE segments MATCH ?{where}
+        ORDER BY bm25(segments)
+        LIMIT ? OFFSET ?
+        """,
+        params + [limit, offset],
+    ).fetchall()
+
+    return [
+        {
+            "task_id": task_id_,
+            "audio_file": audio_file,
+            "model_name": model_name_,
+            "video_id": video_id_,
+            "start": start,
+            "end": end,
+            "snippet": snippet,
+            "score": round(-score, 4),
+            "url": deep_link(video_id_, start),
+        }
+        for task_id_, audio_file, model_name_, video_id_, start, end, snippet, score in rows
+    ]
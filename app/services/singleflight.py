@@ -0,0 +1,132 @@
+# app/services/singleflight.py
+
+import json
+import time
+import hashlib
+import threading
+from typing import Optional, Dict, Any, Tuple
+
+import redis
+from redis import asyncio as aioredis
+
+from app.core.config import settings
+from app.core.logging_config import setup_logger
+from app.services.task_status import fetch_task_metas
+
+logger = setup_logger(__name__)
+
+KEY_PREFIX = "singleflight-"
+FINISHED_STATES = {"SUCCESS", "FAILURE", "REVOKED"}
+
+# Удаляет ключ, только если он всё ещё принадлежит этой задаче
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def flight_key(normalized_url: str, params: Dict[str, Any]) -> str:
+    payload = json.dumps({"url": normalized_url, "params": params}, sort_keys=True)
+    return KEY_PREFIX + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _LocalFlights:
+    """
+    Заменитель Redis в пределах одного процесса API (если Redis недоступен).
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def set_nx(self, key: str, task_id: str, ttl: float) -> Optional[str]:
+        now = time.monotonic()
+        with self._lock:
+            current = self._flights.get(key)
+            if current and current[1] > now:
+                return current[0]
+            self._flights[key] = (task_id, now + ttl)
+            return None
+
+    def release(self, key: str, task_id: str) -> None:
+        with self._lock:
+            if self._flights.get(key, (None,))[0] == task_id:
+                del self._flights[key]
+
+
+_local = _LocalFlights()
+_async_client: Optional[aioredis.Redis] = None
+_sync_client: Optional[redis.Redis] = None
+
+
+def _get_async_client() -> aioredis.Redis:
+    global _async_client
+    if _async_client is None:
+        _async_client = aioredis.from_url(settings.redis_broker_url, decode_responses=True)
+    return _async_client
+
+
+def _get_sync_client() -> redis.Redis:
+    global _sync_client
+    if _sync_client is None:
+        _sync_client = redis.Redis.from_url(settings.redis_broker_url, decode_responses=True)
+    return _sync_client
+
+
+async def _is_finished(task_id: str) -> bool:
+    try:
+        meta = (await fetch_task_metas([task_id])).get(task_id)
+    except Exception:
+        return False
+    return bool(meta) and meta.get("status") in FINISHED_STATES
+
+
+async def acquire(key: str, task_id: str) -> Optional[str]:
+    """
+    Пытается занять ключ за задачей task_id.
+    Возвращает id уже выполняющейся задачи с тем же ключом или None, если ключ занят нами.
+    Ключ, оставшийся от завершённой задачи, считается свободным.
+    """
+    ttl = settings.singleflight_ttl_s
+    for _ in range(3):
+        try:
+            client = _get_async_client()
+            if await client.set(key, task_id, nx=True, ex=int(ttl)):
+                return None
+            existing = await client.get(key)
+            if existing is None:
+                continue  # ключ истёк между SET и GET
+        except redis.RedisError as e:
+            logger.warning(f"Redis недоступен для single-flight, используется локальный реестр: {e}")
+            existing = _local.set_nx(key, task_id, ttl)
+            if existing is None:
+                return None
+
+        if not await _is_finished(existing):
+            return existing
+
+        # Задача завершилась, но ключ не был освобождён — снимаем его и пробуем снова
+        await release_async(key, existing)
+    return None
+
+
+async def release_async(key: str, task_id: str) -> None:
+    _local.release(key, task_id)
+    try:
+        await _get_async_client().eval(_RELEASE_SCRIPT, 1, key, task_id)
+    except redis.RedisError as e:
+        logger.warning(f"Не удалось освободить ключ single-flight {key}: {e}")
+
+
+def release(key: Optional[str], task_id: str) -> None:
+    """
+    Освобождает ключ по завершении задачи (вызывается из воркера).
+    """
+    if not key:
+        return
+    try:
+        _get_sync_client().eval(_RELEASE_SCRIPT, 1, key, task_id)
+    except redis.RedisError as e:
+        logger.warning(f"[{task_id}] Не удалось освободить ключ single-flight: {e}")
@@ -0,0 +1,147 @@
+# app/services/storage_manager.py
+
+import os
+import time
+import shutil
+from typing import List, Dict, Any
+
+from app.core.config import settings
+from app.core.logging_config import setup_logger
+from app.storage import MANIFEST_NAME
+from app.services import search_index
+
+logger = setup_logger(__name__)
+
+
+def _scan_dir(path: str) -> tuple[int, float, bool]:
+    """
+    Размер каталога, время последнего обращения или изменения и наличие manifest.json.
+    """
+    size = 0
+    last_access = os.stat(path).st_mtime
+    has_manifest = False
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                st = os.stat(os.path.join(root, name))
+            except FileNotFoundError:
+                continue
+            size += st.st_size
+            last_access = max(last_access, st.st_mtime)
+            if name == MANIFEST_NAME and root == path:
+                has_manifest = True
+    return size, last_access, has_manifest
+
+
+def scan(now: float = None) -> List[Dict[str, Any]]:
+    """
+    Записи верхнего уровня в tasks_dir и downloads_dir.
+    Задача без manifest.json ещё обрабатывается, пока не истёк collect_timeout_s.
+    """
+    now = now or time.time()
+    entries = []
+    for root in (settings.tasks_dir, settings.downloads_dir):
+        try:
+            names = os.listdir(root)
+        except FileNotFoundError:
+            continue
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                if os.path.isdir(path):
+                    size, last_access, has_manifest = _scan_dir(path)
+                else:
+                    st = os.stat(path)
+                    size, last_access, has_manifest = st.st_size, st.st_mtime, True
+            except FileNotFoundError:
+                continue
+
+            idle = now - last_access
+            processing = root == settings.tasks_dir and not has_manifest and idle < settings.collect_timeout_s
+            entries.append({
+                "root": root,
+                "path": path,
+                "size": size,
+                "last_access": last_access,
+                "in_use": processing or idle < settings.storage_min_idle_s,
+            })
+    return entries
+
+
+def _remove(path: str) -> bool:
+    try:
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+        return True
+    except OSError as e:
+        logger.warning(f"Не удалось удалить {path}: {e}")
+        return False
+
+
+def _unindex(task_id: str) -> None:
+    # Найденные сегменты ссылались бы на задачу, которой больше нет
+    try:
+        search_index.delete_task(task_id)
+    except Exception as e:
+        logger.warning(f"Janitor: не удалось удалить задачу {task_id} из поискового индекса: {e}")
+
+
+def enforce() -> Dict[str, Any]:
+    """
+    Удаляет записи старше storage_ttl_s, затем самые давно использованные —
+    пока общий объём не уложится в storage_quota_bytes. Используемые записи не трогает.
+    """
+    now = time.time()
+    entries = sorted(scan(now), key=lambda e: e["last_access"])
+    total = sum(e["size"] for e in entries)
+    evicted = []
+
+    for entry in entries:
+        if entry["in_use"]:
+            continue
+        expired = settings.storage_ttl_s > 0 and now - entry["last_access"] > settings.storage_ttl_s
+        over_quota = settings.storage_quota_bytes > 0 and total > settings.storage_quota_bytes
+        if not (expired or over_quota):
+            continue
+        if _remove(entry["path"]):
+            if entry["root"] == settings.tasks_dir and settings.search_index_enabled:
+                _unindex(os.path.basename(entry["path"]))
+            total -= entry["size"]
+            evicted.append(entry)
+            reason = "TTL" if expired else "квота"
+            logger.info(f"Janitor: удалено {entry['path']} ({entry['size'] / 1024 ** 2:.1f} МБ, причина: {reason})")
+
+    if settings.storage_quota_bytes > 0 and total > settings.storage_quota_bytes:
+        logger.warning(
+            f"Janitor: квота превышена ({total / 1024 ** 3:.2f} ГБ), "
+            f"оставшиеся записи используются"
+        )
+
+    return {
+        "evicted": len(evicted),
+        "freed_bytes": sum(e["size"] for e in evicted),
+        "total_bytes": total,
+    }
+
+
+def usage() -> Dict[str, Any]:
+    entries = scan()
+    roots = []
+    for root in (settings.tasks_dir, settings.downloads_dir):
+        items = [e for e in entries if e["root"] == root]
+        roots.append({
+            "path": root,
+            "entries": len(items),
+            "in_use": sum(1 for e in items if e["in_use"]),
+            "bytes": sum(e["size"] for e in items),
+            "oldest_access": min((e["last_access"] for e in items), default=None),
+        })
+    return {
+        "total_bytes": sum(e["size"] for e in entries),
+        "quota_bytes": settings.storage_quota_bytes,
+        "ttl_s": settings.storage_ttl_s,
+        "roots": roots,
+        "largest": sorted(entries, key=lambda e: e["size"], reverse=True)[:10],
+    }
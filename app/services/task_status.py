@@ -0,0 +1,191 @@
+# app/services/task_status.py
+
+import json
+from datetime import datetime
+from typing import Dict, List, Optional, Any
+
+import redis
+from redis import asyncio as aioredis
+
+from app.core.config import settings
+from app.core.logging_config import setup_logger
+from app.models import TaskStatus
+
+logger = setup_logger(__name__)
+
+TASK_META_PREFIX = "celery-task-meta-"
+# Список подзадач (RPUSH по одной записи) и время создания задачи, записанное API
+SUBTASKS_PREFIX = "task-subtask-list-"
+CREATED_PREFIX = "task-created-"
+SUBTASKS_TTL_S = 24 * 3600
+
+_sync_client: Optional[redis.Redis] = None
+_async_client: Optional[aioredis.Redis] = None
+
+
+def _get_sync_client() -> redis.Redis:
+    global _sync_client
+    if _sync_client is None:
+        _sync_client = redis.Redis.from_url(settings.redis_backend_url)
+    return _sync_client
+
+
+def _get_async_client() -> aioredis.Redis:
+    global _async_client
+    if _async_client is None:
+        _async_client = aioredis.from_url(settings.redis_backend_url)
+    return _async_client
+
+
+def record_subtask(task_id: str, subtask: Dict[str, Any]) -> None:
+    """
+    Дописывает подзадачу транскрипции в список задачи (вызывается из воркера).
+    """
+    key = f"{SUBTASKS_PREFIX}{task_id}"
+    try:
+        pipe = _get_sync_client().pipeline(transaction=False)
+        pipe.rpush(key, json.dumps(subtask))
+        pipe.expire(key, SUBTASKS_TTL_S)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"[{task_id}] Не удалось сохранить подзадачу: {e}")
+
+
+async def record_created(task_id: str, created_at: str) -> None:
+    """
+    Запоминает время создания задачи: до старта воркера в result backend о ней ничего нет.
+    """
+    try:
+        await _get_async_client().set(f"{CREATED_PREFIX}{task_id}", created_at, ex=SUBTASKS_TTL_S)
+    except redis.RedisError as e:
+        logger.warning(f"[{task_id}] Не удалось сохранить время создания задачи: {e}")
+
+
+def _loads(raw: Optional[bytes]) -> Optional[Any]:
+    if raw is None:
+        return None
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return None
+
+
+def _map_status(meta: Optional[Dict[str, Any]]) -> TaskStatus:
+    if not meta:
+        return TaskStatus.PENDING
+    state = meta.get("status")
+    if state == "SUCCESS":
+        result = meta.get("result")
+        if isinstance(result, dict) and result.get("status") == TaskStatus.FAILED:
+            return TaskStatus.FAILED
+        return TaskStatus.COMPLETED
+    if state in ("FAILURE", "REVOKED"):
+        return TaskStatus.FAILED
+    if state == "PENDING":
+        return TaskStatus.PENDING
+    return TaskStatus.PROCESSING
+
+
+def _error_text(meta: Dict[str, Any]) -> str:
+    result = meta.get("result")
+    if isinstance(result, dict):
+        if "error" in result:
+            return str(result["error"])
+        if "exc_type" in result:
+            return f"{result['exc_type']}: {result.get('exc_message')}"
+    return str(result) if result is not None else "Unknown error"
+
+
+def build_task_response(
+    task_id: str,
+    meta: Optional[Dict[str, Any]],
+    subtasks: List[Dict[str, Any]],
+    created_at: Optional[str] = None,
+) -> Dict[str, Any]:
+    status = _map_status(meta)
+    result = (meta or {}).get("result")
+    result = result if isinstance(result, dict) else {}
+    # Текущее время — только если о задаче не сохранилось ни одной отметки
+    created_at = created_at or result.get("updated_at") or datetime.now().isoformat()
+
+    response = {
+        "task_id": task_id,
+        "status": status,
+        "download_type": result.get("download_type"),
+        "created_at": created_at,
+        "updated_at": result.get("updated_at", created_at),
+    }
+    if status == TaskStatus.COMPLETED:
+        response["files"] = result.get("files")
+    elif status == TaskStatus.FAILED:
+        response["error"] = _error_text(meta)
+
+    if subtasks:
+        counts = {s: 0 for s in TaskStatus}
+        for subtask in subtasks:
+            counts[subtask["status"]] += 1
+        response["subtasks"] = subtasks
+        response["progress"] = {
+            "total": len(subtasks),
+            "completed": counts[TaskStatus.COMPLETED],
+            "failed": counts[TaskStatus.FAILED],
+            "processing": counts[TaskStatus.PROCESSING],
+            "pending": counts[TaskStatus.PENDING],
+        }
+    return response
+
+
+async def fetch_task_metas(task_ids: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+    """
+    Читает метаданные задач из result backend одним запросом MGET.
+    """
+    if not task_ids:
+        return {}
+    raw = await _get_async_client().mget([f"{TASK_META_PREFIX}{task_id}" for task_id in task_ids])
+    return {task_id: _loads(value) for task_id, value in zip(task_ids, raw)}
+
+
+async def get_task_statuses(task_ids: List[str]) -> List[Dict[str, Any]]:
+    """
+    Статусы задач вместе с прогрессом подзадач транскрипции.
+    Все чтения из Redis выполняются двумя конвейерными запросами, без блокировки event loop.
+    """
+    task_ids = list(dict.fromkeys(task_ids))
+    if not task_ids:
+        return []
+
+    pipe = _get_async_client().pipeline(transaction=False)
+    pipe.mget([f"{TASK_META_PREFIX}{task_id}" for task_id in task_ids])
+    pipe.mget([f"{CREATED_PREFIX}{task_id}" for task_id in task_ids])
+    for task_id in task_ids:
+        pipe.lrange(f"{SUBTASKS_PREFIX}{task_id}", 0, -1)
+    raw_metas, raw_created, *raw_subtasks = await pipe.execute()
+
+    metas = {task_id: _loads(value) for task_id, value in zip(task_ids, raw_metas)}
+    created = {task_id: value.decode() if value else None for task_id, value in zip(task_ids, raw_created)}
+    subtask_lists = {
+        task_id: [s for s in map(_loads, values) if s] for task_id, values in zip(task_ids, raw_subtasks)
+    }
+
+    subtask_ids = list({s["transcription_task_id"] for subs in subtask_lists.values() for s in subs})
+    subtask_metas = await fetch_task_metas(subtask_ids)
+
+    responses = []
+    for task_id in task_ids:
+        subtasks = [
+            {**s, "status": _map_subtask_status(subtask_metas.get(s["transcription_task_id"]))}
+            for s in subtask_lists[task_id]
+        ]
+        responses.append(build_task_response(task_id, metas[task_id], subtasks, created[task_id]))
+    return responses
+
+
+def _map_subtask_status(meta: Optional[Dict[str, Any]]) -> TaskStatus:
+    # Транскрипция при ошибке возвращает None вместо исключения
+    if meta and meta.get("status") == "SUCCESS" and meta.get("result") is None:
+        return TaskStatus.FAILED
+    return _map_status(meta)
+
+
+async def get_task_status(task_id: str) -> Dict[str, Any]:
+    return (await get_task_statuses([task_id]))[0]
@@ -1,13 +1,36 @@
 #app\services\tasks.py
 import os
+import random
+import threading
+import time
 from datetime import datetime
 
+from celery import chord, group
+from celery.exceptions import Ignore, Retry, SoftTimeLimitExceeded
+from celery.result import AsyncResult
+
 from app.celery_app import celery
 from app.models import TaskStatus, DownloadType
 from app.services.downloader import DownloaderService
-from app.services.transcriber import transcribe_file
+from app.services.transcriber import (
+    transcribe_file, transcribe_files, transcribe_chunk, transcription_params, save_transcript,
+    store_transcript, should_chunk, cache_keys, cache_lookup, index_segments,
+)
+from app.services.checkpoint import TranscriptionCheckpoint
+from app.services.chunking import plan_chunks, stitch_chunks
+from app.services.comparison import transcribe_compare
+from app.services.model_routing import queue_for_model
+from app.services.task_status import record_subtask
+from app.services.progress import ProgressReporter, publish
+from app.services import singleflight
+from app.services import admission
+from app.services import storage_manager
+from app.services.transcript_cache import transcript_cache, make_cache_key, video_source_id
+from app.storage import describe_files, write_manifest, MANIFEST_NAME
+from app.utils.urls import extract_video_id
 from app.core.config import settings
 from app.core.logging_config import setup_logger
+from app.core.metrics import track_stage, STAGE_SECONDS
 logger = setup_logger(__name__)
 
 
@@ -15,8 +38,170 @@ def get_task_dir(task_id: str) -> str:
     return os.path.join(settings.tasks_dir, task_id)
 
 
+class _TranscriptionDispatcher:
+    """
+    Отправляет транскрипцию каждого файла сразу после его загрузки.
+    Вызывается из потоков загрузчика, поэтому защищён блокировкой.
+    В режиме батчинга копит файлы до whisper_batch_max_files.
+    """
+
+    def __init__(self, task_id: str, task_dir: str, model_name: str, source_id: str = None,
+                 output_formats: list = None, compare_models: list = None, priority: int = None):
+        self.task_id = task_id
+        self.task_dir = task_dir
+        self.model_name = model_name
+        self.source_id = source_id
+        self.output_formats = output_formats
+        self.compare_models = compare_models
+        self.batching = settings.whisper_batching and model_name.startswith("whisper") and not compare_models
+        queue = queue_for_model(model_name)
+        self.options = {'queue': queue} if queue else {}
+        if priority is not None:
+            self.options['priority'] = priority
+        self.transcriptions = []
+        self._seen = set()
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def submit(self, file_path: str, item_id: str = None) -> None:
+        abs_path = os.path.abspath(file_path)
+        # У элемента плейлиста свой источник: по нему ищется кэш и строятся ссылки поиска
+        source_id = video_source_id(item_id) if item_id else self.source_id
+        with self._lock:
+            if abs_path in self._seen:
+                return
+            self._seen.add(abs_path)
+            publish(self.task_id, "stage", stage="downloaded", audio_file=os.path.basename(abs_path))
+
+            if self.compare_models:
+                self._send_compare(abs_path, source_id)
+                return
+            if not self.batching:
+                self._send_single(abs_path, source_id)
+                return
+
+            self._pending.append((abs_path, source_id))
+            if len(self._pending) >= settings.whisper_batch_max_files:
+                self._send_batch()
+
+    def flush(self) -> list:
+        with self._lock:
+            if len(self._pending) == 1:
+                self._send_single(*self._pending.pop())
+            elif self._pending:
+                self._send_batch()
+            return list(self.transcriptions)
+
+    def _send_single(self, abs_path: str, source_id: str = None) -> None:
+        transcription_task = transcribe_audio.apply_async(
+            args=[abs_path],
+            kwargs={
+                'model_name': self.model_name,
+                'source_id': source_id,
+                'parent_task_id': self.task_id,
+                'output_formats': self.output_formats,
+            },
+            **self.options
+        )
+        logger.info(f"[{self.task_id}] Отправлена задача транскрипции: {transcription_task.id} для файла {abs_path}")
+        self._record(abs_path, transcription_task.id)
+
+    def _send_compare(self, abs_path: str, source_id: str = None) -> None:
+        transcription_task = transcribe_audio_compare.apply_async(
+            args=[abs_path, self.compare_models],
+            kwargs={
+                'source_id': source_id,
+                'parent_task_id': self.task_id,
+                'output_formats': self.output_formats,
+            },
+            priority=self.options.get('priority'),
+        )
+        logger.info(f"[{self.task_id}] Отправлена задача сравнения моделей {self.compare_models}: "
+                    f"{transcription_task.id} для файла {abs_path}")
+        self._record(abs_path, transcription_task.id)
+
+    def _send_batch(self) -> None:
+        pending, self._pending = self._pending, []
+        batch = [abs_path for abs_path, _ in pending]
+        transcription_task = transcribe_audio_batch.apply_async(
+            args=[batch],
+            kwargs={
+                'model_name': self.model_name,
+                'source_ids': [source_id for _, source_id in pending],
+                'parent_task_id': self.task_id,
+                'output_formats': self.output_formats,
+            },
+            **self.options
+        )
+        logger.info(f"[{self.task_id}] Отправлена батчевая задача транскрипции: {transcription_task.id} ({len(batch)} файлов)")
+        for abs_path in batch:
+            self._record(abs_path, transcription_task.id)
+
+    def _record(self, abs_path: str, transcription_task_id: str) -> None:
+        subtask = {
+            "audio_file": os.path.relpath(abs_path, self.task_dir),
+            "transcription_task_id": transcription_task_id
+        }
+        self.transcriptions.append(subtask)
+        record_subtask(self.task_id, subtask)
+
+
+class _CachedPlaylistItems:
+    """
+    Проверка кэша для каждого элемента плейлиста до загрузки (skip_item загрузчика).
+    Транскрипт из кэша сразу записывается в каталог задачи, элемент не скачивается;
+    записанные элементы попадают в манифест через collect_transcriptions.
+    """
+
+    def __init__(self, task_id: str, task_dir: str, model_name: str, output_formats: list = None):
+        self.task_id = task_id
+        self.task_dir = task_dir
+        self.model_name = model_name
+        self.output_formats = output_formats
+        self.params = transcription_params(model_name)
+        self.items = []
+
+    def __call__(self, entry: dict) -> bool:
+        source_id = video_source_id(entry["id"])
+        cached = transcript_cache.get(make_cache_key(source_id, self.model_name, self.params))
+        if not cached:
+            return False
+        # Имя как у загруженного элемента: <дата публикации>_pos<номер> (дата — из имени в кэше)
+        cached_name = cached.get("name") or ""
+        date = cached_name.split("_pos")[0] if "_pos" in cached_name else entry["id"]
+        audio_file = f"{date}_pos{entry['index']}.mp3"
+        try:
+            outputs = save_transcript(os.path.join(self.task_dir, audio_file), cached["segments"],
+                                      self.output_formats, meta={"model_name": self.model_name})
+        except Exception as e:
+            logger.warning(f"[{self.task_id}] Не удалось записать транскрипт {entry['id']} из кэша, "
+                           f"элемент будет скачан: {e}")
+            return False
+        index_segments(self.task_id, audio_file, self.model_name, cached["segments"], source_id)
+        publish(self.task_id, "stage", stage="transcribed", audio_file=audio_file, cached=True)
+        self.items.append({
+            "audio_file": audio_file,
+            "cached": True,
+            "text": cached["text"],
+            "outputs": [os.path.relpath(p, self.task_dir) for p in outputs],
+        })
+        return True
+
+
+def _transcription_result(mp3_path: str, text: str, output_formats: list = None) -> dict:
+    base_path = os.path.splitext(mp3_path)[0]
+    candidates = [f"{base_path}.{fmt}" for fmt in output_formats or settings.output_formats]
+    return {
+        "audio_file": mp3_path,
+        "outputs": [p for p in candidates if os.path.exists(p)],
+        "text": text,
+    }
+
+
 @celery.task(bind=True, name='process_download_task')
-def process_download_task(self, task_id: str, url: str, quality: int, max_workers: int, model_name: str = "whisper-small"):
+def process_download_task(self, task_id: str, url: str, quality: int, max_workers: int, model_name: str = "whisper-small",
+                          output_formats: list = None, flight_key: str = None, compare_models: list = None,
+                          priority: int = None, keep_audio: bool = False):
     logger.info(f"[{task_id}] Старт задачи загрузки. URL: {url}")
     try:
         task_dir = get_task_dir(task_id)
@@ -34,38 +219,88 @@ def process_download_task(self, task_id: str, url: str, quality: int, max_worker
             }
         )
         logger.info(f"[{task_id}] Состояние обновлено: PROCESSING")
+        publish(task_id, "stage", stage="downloading", download_type=download_type)
+
+        video_id = extract_video_id(url) if download_type == DownloadType.VIDEO else None
+        source_id = video_source_id(video_id) if video_id else None
+
+        # Готовый транскрипт не заменяет загрузку, если пользователю нужно само аудио
+        if source_id and not compare_models and not keep_audio:
+            cached = transcript_cache.get(
+                make_cache_key(source_id, model_name, transcription_params(model_name))
+            )
+            if cached:
+                outputs = save_transcript(
+                    os.path.join(task_dir, f"{cached.get('name', video_id)}.mp3"),
+                    cached["segments"],
+                    output_formats,
+                    meta={"model_name": model_name},
+                )
+                index_segments(task_id, f"{cached.get('name', video_id)}.mp3", model_name, cached["segments"], source_id)
+                output_names = [os.path.relpath(p, task_dir) for p in outputs]
+                completed_at = datetime.now().isoformat()
+                write_manifest(task_id, {
+                    'task_id': task_id,
+                    'download_type': download_type,
+                    'model_name': model_name,
+                    'completed_at': completed_at,
+                    'items': [{"audio_file": None, "cached": True, "status": TaskStatus.COMPLETED,
+                               "text": cached["text"], "outputs": output_names}],
+                    'files': describe_files(task_dir, output_names),
+                })
+                logger.info(f"[{task_id}] Транскрипт взят из кэша, загрузка пропущена")
+                publish(task_id, "done", status=TaskStatus.COMPLETED, cached=True)
+                singleflight.release(flight_key, task_id)
+                admission.release(task_id)
+                return {
+                    'status': TaskStatus.COMPLETED,
+                    'download_type': download_type,
+                    'files': output_names + [MANIFEST_NAME],
+                    'transcriptions': [{"audio_file": None, "cached": True}],
+                    'updated_at': completed_at
+                }
+
+        dispatcher = _TranscriptionDispatcher(task_id, task_dir, model_name, source_id, output_formats, compare_models,
+                                              priority)
+        # Элементы плейлиста проверяются в кэше по отдельности, до загрузки
+        cached_items = None
+        if download_type == DownloadType.PLAYLIST and not compare_models and not keep_audio:
+            cached_items = _CachedPlaylistItems(task_id, task_dir, model_name, output_formats)
 
         downloader = DownloaderService(task_dir)
-        result = downloader.download_content(url, quality, max_workers, max_retries=3)
+        with track_stage("download", model_name, download_type):
+            result = downloader.download_content(url, quality, max_workers, max_retries=3, on_item=dispatcher.submit,
+                                                 keep_audio=keep_audio, skip_item=cached_items)
+        cached = cached_items.items if cached_items else []
 
-        if not result:
+        if not result and not cached:
             raise Exception("Не удалось скачать контент")
 
-        downloaded_files = result if isinstance(result, list) else [result]
+        downloaded_files = result if isinstance(result, list) else [result] if result else []
+        if cached:
+            logger.info(f"[{task_id}] Транскриптов взято из кэша: {len(cached)}")
 
         logger.info(f"[{task_id}] Загружено файлов: {len(downloaded_files)}")
 
-        transcribed_files = []
+        # Файлы, о которых загрузчик не сообщил по ходу работы, отправляем сейчас
         for file_path in downloaded_files:
-            abs_path = os.path.abspath(file_path)
-            transcription_task = transcribe_audio.delay(abs_path, model_name=model_name)
-            logger.info(f"[{task_id}] Отправлена задача транскрипции: {transcription_task.id} для файла {abs_path}")
-            transcribed_files.append({
-                "audio_file": os.path.relpath(abs_path, task_dir),
-                "transcription_task_id": transcription_task.id
-            })
-
-        logger.info(f"[{task_id}] Задача завершена успешно.")
-        return {
-            'status': TaskStatus.COMPLETED,
-            'download_type': download_type,
-            'files': [os.path.relpath(f, task_dir) for f in downloaded_files],
-            'transcriptions': transcribed_files,
-            'updated_at': datetime.now().isoformat()
-        }
+            dispatcher.submit(file_path)
+        transcribed_files = dispatcher.flush()
 
+        logger.info(f"[{task_id}] Загрузка завершена, ожидаю транскрипции ({len(transcribed_files)} файлов)")
+        # Итоговый результат под id этой задачи запишет задача сборки манифеста
+        return self.replace(collect_transcriptions.s(
+            task_id, download_type, model_name, transcribed_files, datetime.now().timestamp(), flight_key,
+            compare_models, keep_audio, cached,
+        ))
+
+    except Ignore:
+        raise
     except Exception as e:
         logger.error(f"[{task_id}] Ошибка при обработке задачи: {e}")
+        publish(task_id, "done", status=TaskStatus.FAILED, error=str(e))
+        singleflight.release(flight_key, task_id)
+        admission.release(task_id)
         return {
             'status': TaskStatus.FAILED,
             'error': str(e),
@@ -74,19 +309,249 @@ def process_download_task(self, task_id: str, url: str, quality: int, max_worker
 
 
 
-@celery.task
-def transcribe_audio(mp3_path: str, model_name: str = "whisper-small"):
+# Ошибки, которые повтор не исправит
+NON_RETRYABLE_ERRORS = (ValueError, FileNotFoundError)
+
+
+def _retry_backoff(retries: int) -> float:
+    """
+    Экспоненциальная задержка перед повтором с джиттером, чтобы упавшие вместе задачи не вернулись разом.
+    """
+    delay = min(settings.transcribe_retry_backoff_s * 2 ** retries, settings.transcribe_retry_backoff_max_s)
+    return delay * random.uniform(0.5, 1.0)
+
+
+def _resume(task, resumes: int) -> Retry:
+    """
+    Перезапускает задачу с тем же id, сохранив request.retries: Task.retry всегда увеличивает счётчик
+    повторов, а продолжение с контрольной точки — не ошибка. Продолжения считаются в kwargs['resumes'].
+    """
+    request = task.request
+    signature = task.signature_from_request(request, request.args, dict(request.kwargs or {}, resumes=resumes),
+                                            countdown=0, retries=request.retries)
+    signature.apply_async()
+    return Retry(f"продолжение с контрольной точки #{resumes}", when=0, sig=signature)
+
+
+@celery.task(bind=True, max_retries=settings.transcribe_max_retries)
+def transcribe_audio(self, mp3_path: str, model_name: str = "whisper-small", source_id: str = None,
+                     parent_task_id: str = None, output_formats: list = None, resumes: int = 0):
+    reporter = ProgressReporter(parent_task_id, os.path.basename(mp3_path))
+
+    if settings.chunking_executor == "celery" and should_chunk(mp3_path):
+        keys = cache_keys(mp3_path, model_name, source_id)
+        if not cache_lookup(keys):
+            windows = plan_chunks(mp3_path)
+            logger.info(f"[Transcribe] Файл {mp3_path} разбит на {len(windows)} фрагментов, отправляю группу задач")
+            reporter.stage("transcribing", model_name=model_name, chunks=len(windows))
+            queue = queue_for_model(model_name)
+            options = {'queue': queue} if queue else {}
+            # Результат стыковки фрагментов будет записан под id этой задачи
+            return self.replace(chord(
+                group(transcribe_audio_chunk.s(mp3_path, window, model_name).set(**options) for window in windows),
+                finish_chunked_transcription.s(mp3_path, model_name, windows, keys, parent_task_id, output_formats,
+                                               source_id),
+            ))
+
+    checkpoint = None
     try:
         logger.info(f"[Transcribe] Начало транскрипции файла: {mp3_path} (модель: {model_name})")
-        text = transcribe_file(mp3_path, model_name)
-        txt_path = mp3_path.replace(".mp3", ".txt")
+        checkpoint = TranscriptionCheckpoint(mp3_path, model_name)
+        # Сообщение возвращается в очередь при гибели воркера (reject_on_worker_lost) — если файл
+        # раз за разом роняет процесс (OOM, segfault), после лимита он считается проваленным
+        lost = checkpoint.begin()
+        if lost > settings.transcribe_max_redeliveries:
+            error = f"воркер падал при обработке файла {lost} раз подряд"
+            logger.error(f"[Transcribe] Транскрипция {mp3_path} прекращена: {error}")
+            reporter.stage("failed", error=error)
+            return None
+        text = transcribe_file(mp3_path, model_name, source_id=source_id, reporter=reporter, formats=output_formats,
+                               task_id=parent_task_id, checkpoint=checkpoint)
 
-        with open(txt_path, "w", encoding="utf-8") as f:
-            f.write(text)
+        logger.info(f"[Transcribe] Транскрипция завершена: {mp3_path}")
+        reporter.stage("transcribed")
+        return _transcription_result(mp3_path, text, output_formats)
 
-        logger.info(f"[Transcribe] Транскрипция завершена: {txt_path}")
-        return txt_path
+    except SoftTimeLimitExceeded as e:
+        if checkpoint and checkpoint.progressed:
+            # Продолжение с контрольной точки не расходует попытки: файл просто длиннее лимита
+            logger.warning(f"[Transcribe] Лимит времени для {mp3_path}, продолжение #{resumes + 1} "
+                           f"с {checkpoint.offset:.1f} с")
+            reporter.stage("resuming", offset=checkpoint.offset, resumes=resumes + 1)
+            raise _resume(self, resumes + 1)
+        error = e
 
-    except Exception as e:
+    except NON_RETRYABLE_ERRORS as e:
         logger.error(f"[Transcribe] Ошибка транскрипции {mp3_path}: {e}")
+        reporter.stage("failed", error=str(e))
         return None
+
+    except Exception as e:
+        error = e
+
+    finally:
+        if checkpoint:
+            checkpoint.end()
+
+    if self.request.retries < self.max_retries:
+        countdown = _retry_backoff(self.request.retries)
+        logger.warning(f"[Transcribe] Ошибка транскрипции {mp3_path}: {error!r}, повтор через {countdown:.0f} с")
+        reporter.stage("retrying", error=str(error), attempt=self.request.retries + 1)
+        raise self.retry(exc=error, countdown=countdown)
+
+    logger.error(f"[Transcribe] Ошибка транскрипции {mp3_path} после {self.request.retries} повторов: {error!r}")
+    reporter.stage("failed", error=str(error))
+    return None
+
+
+@celery.task
+def transcribe_audio_batch(mp3_paths: list, model_name: str = "whisper-small", parent_task_id: str = None,
+                           output_formats: list = None, source_ids: list = None):
+    reporters = [ProgressReporter(parent_task_id, os.path.basename(p)) for p in mp3_paths]
+    try:
+        logger.info(f"[Transcribe] Начало батчевой транскрипции {len(mp3_paths)} файлов (модель: {model_name})")
+        for reporter in reporters:
+            reporter.stage("transcribing", model_name=model_name, batched=True)
+        texts = transcribe_files(mp3_paths, model_name, source_ids=source_ids, formats=output_formats,
+                                 task_id=parent_task_id)
+        logger.info(f"[Transcribe] Батчевая транскрипция завершена: {len(mp3_paths)} файлов")
+        for reporter in reporters:
+            reporter.stage("transcribed")
+        return [_transcription_result(p, text, output_formats) for p, text in zip(mp3_paths, texts)]
+
+    except Exception as e:
+        logger.error(f"[Transcribe] Ошибка батчевой транскрипции {mp3_paths}: {e}")
+        for reporter in reporters:
+            reporter.stage("failed", error=str(e))
+        return None
+
+
+@celery.task
+def transcribe_audio_compare(mp3_path: str, model_names: list, source_id: str = None, parent_task_id: str = None,
+                             output_formats: list = None):
+    reporter = ProgressReporter(parent_task_id, os.path.basename(mp3_path))
+    try:
+        logger.info(f"[Transcribe] Сравнение моделей {model_names} на файле {mp3_path}")
+        result = transcribe_compare(mp3_path, model_names, source_id, reporter, output_formats, parent_task_id)
+        reporter.stage("transcribed")
+        return result
+
+    except Exception as e:
+        logger.error(f"[Transcribe] Ошибка сравнения моделей на {mp3_path}: {e}")
+        reporter.stage("failed", error=str(e))
+        return None
+
+
+@celery.task
+def transcribe_audio_chunk(mp3_path: str, window: dict, model_name: str = "whisper-small"):
+    logger.info(f"[Transcribe] Фрагмент {window['start']:.0f}–{window['end']:.0f} с файла {mp3_path}",
+                extra={"sample": True})
+    return transcribe_chunk(mp3_path, window, model_name)
+
+
+@celery.task
+def finish_chunked_transcription(chunk_segments: list, mp3_path: str, model_name: str, windows: list, keys: list,
+                                 parent_task_id: str = None, output_formats: list = None, source_id: str = None):
+    reporter = ProgressReporter(parent_task_id, os.path.basename(mp3_path))
+    try:
+        segments = stitch_chunks(windows, chunk_segments)
+        text = store_transcript(mp3_path, model_name, segments, keys)
+        save_transcript(mp3_path, segments, output_formats, meta={"model_name": model_name})
+        index_segments(parent_task_id, mp3_path, model_name, segments, source_id)
+
+        logger.info(f"[Transcribe] Транскрипция по фрагментам завершена: {mp3_path}")
+        reporter.stage("transcribed")
+        return _transcription_result(mp3_path, text, output_formats)
+
+    except Exception as e:
+        logger.error(f"[Transcribe] Ошибка стыковки фрагментов {mp3_path}: {e}")
+        reporter.stage("failed", error=str(e))
+        return None
+
+
+@celery.task(bind=True, name='collect_transcriptions', max_retries=None)
+def collect_transcriptions(self, task_id: str, download_type: str, model_name: str, transcriptions: list, started_at: float,
+                           flight_key: str = None, compare_models: list = None, keep_audio: bool = False,
+                           cached: list = None):
+    """
+    Ждёт завершения всех транскрипций задачи и пишет общий manifest.json.
+    Пока транскрипции идут, задача перезапускает себя через collect_poll_interval_s.
+    При keep_audio в манифест попадает и MP3 каждого элемента.
+    cached — элементы плейлиста, транскрипт которых взят из кэша без загрузки.
+    """
+    results = {t["transcription_task_id"]: AsyncResult(t["transcription_task_id"], app=celery) for t in transcriptions}
+    pending = [r for r in results.values() if not r.ready()]
+    timed_out = time.time() - started_at > settings.collect_timeout_s
+
+    if pending and not timed_out:
+        logger.info(f"[{task_id}] Ожидание транскрипций: {len(pending)} из {len(results)}", extra={"sample": True})
+        raise self.retry(countdown=settings.collect_poll_interval_s)
+
+    task_dir = get_task_dir(task_id)
+    items = [dict(item, status=TaskStatus.COMPLETED) for item in cached or []]
+    for t in transcriptions:
+        result = results[t["transcription_task_id"]]
+        abs_audio = os.path.abspath(os.path.join(task_dir, t["audio_file"]))
+        item = dict(t, status=TaskStatus.FAILED, text=None, outputs=[])
+
+        if result.ready() and result.successful():
+            payload = result.result
+            candidates = payload if isinstance(payload, list) else [payload]
+            for candidate in candidates:
+                if candidate and os.path.abspath(candidate["audio_file"]) == abs_audio:
+                    item.update(
+                        status=TaskStatus.COMPLETED,
+                        text=candidate["text"],
+                        outputs=[os.path.relpath(p, task_dir) for p in candidate["outputs"]],
+                    )
+                    # Задачи сравнения моделей добавляют RTF по моделям и попарный WER
+                    item.update({k: candidate[k] for k in ("models", "comparison") if k in candidate})
+        elif not result.ready():
+            item["error"] = "Превышено время ожидания транскрипции"
+
+        if keep_audio:
+            audio_output = f"{os.path.splitext(t['audio_file'])[0]}.mp3"
+            if os.path.exists(os.path.join(task_dir, audio_output)):
+                item["audio_output"] = audio_output
+        items.append(item)
+
+    completed_at = datetime.now().isoformat()
+    output_names = [output for item in items for output in item["outputs"]]
+    output_names += [item["audio_output"] for item in items if "audio_output" in item]
+    write_manifest(task_id, {
+        'task_id': task_id,
+        'download_type': download_type,
+        'model_name': model_name,
+        'compare_models': compare_models,
+        'completed_at': completed_at,
+        'items': items,
+        'files': describe_files(task_dir, output_names),
+    })
+
+    failed = sum(1 for item in items if item["status"] == TaskStatus.FAILED)
+    status = TaskStatus.COMPLETED if failed < len(items) else TaskStatus.FAILED
+    logger.info(f"[{task_id}] Задача завершена: {len(items) - failed} файлов транскрибировано, ошибок: {failed}")
+    publish(task_id, "done", status=status, failed=failed, total=len(items))
+    singleflight.release(flight_key, task_id)
+    admission.release(task_id)
+    STAGE_SECONDS.labels("total", model_name, download_type).observe(time.time() - started_at)
+    return {
+        'status': status,
+        'download_type': download_type,
+        'files': output_names + [MANIFEST_NAME],
+        'transcriptions': [{k: v for k, v in item.items() if k != "text"} for item in items],
+        'updated_at': completed_at
+    }
+
+
+@celery.task(name='storage_janitor')
+def storage_janitor():
+    """
+    Периодическая очистка tasks_dir и downloads_dir по TTL и квоте (запускается celery beat).
+    """
+    result = storage_manager.enforce()
+    logger.info(
+        f"Janitor: удалено записей {result['evicted']}, освобождено {result['freed_bytes'] / 1024 ** 2:.1f} МБ, "
+        f"занято {result['total_bytes'] / 1024 ** 3:.2f} ГБ"
+    )
+    return result
@@ -1,128 +1,491 @@
 import os
-import subprocess
-import tempfile
-import wave
 import json
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-import uuid
-from vosk import KaldiRecognizer
-from app.services.models_loader import get_whisper_model, get_vosk_model
-from app.utils.pdf_generator import generate_pdf_from_textfile
+from typing import Callable, Iterable, List, Dict, Any, Optional, Tuple
+
+import numpy as np
+from app.services.models_loader import get_whisper_model, get_vosk_model, MODEL_COST_MB, DEFAULT_MODEL_COST_MB
+from app.services.audio import iter_pcm, decode_pcm, pcm_blocks, probe_duration, SAMPLE_RATE
+from app.services.chunking import plan_chunks, stitch_chunks
+from app.services.progress import ProgressReporter
+from app.services.checkpoint import TranscriptionCheckpoint
+from app.services.batching import get_batcher, transcribe_whisper_batch
+from app.core.config import settings
+from app.core.metrics import track_stage, observe_rtf, VAD_SKIPPED_SECONDS
+from app.services.transcript_cache import transcript_cache, make_cache_key, file_source_id
+from app.services import search_index
+from app.services.vad import apply_vad, stream_vad, SpeechMap
+from app.utils.transcript_writer import write_transcript
 from app.core.logging_config import setup_logger
 
+# vosk импортируется при первой транскрипции: процессу API он не нужен
+KaldiRecognizer = None
+
 logger = setup_logger(__name__)
 
 logger.info("Модуль инициализирован")
 
 
 
-def transcribe_file(mp3_path: str, model_name: str = "whisper-small") -> str:
+def transcription_params(model_name: str) -> Dict[str, Any]:
+    """
+    Параметры, влияющие на результат транскрипции (входят в ключ кэша).
+    """
+    if model_name.startswith("whisper"):
+        params = {"device": "cpu", "compute_type": "int8"}
+    else:
+        params = {"sample_rate": 16000}
+    if settings.vad_enabled:
+        params["vad"] = settings.vad_method
+    return params
+
+
+def segments_to_text(segments: List[Dict[str, Any]]) -> str:
+    return " ".join(s["text"] for s in segments if s["text"])
+
+
+def transcribe_segments(
+    mp3_path: str,
+    model_name: str = "whisper-small",
+    reporter: Optional[ProgressReporter] = None,
+    checkpoint: Optional[TranscriptionCheckpoint] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Транскрибирует файл выбранной моделью и возвращает сегменты с таймкодами.
+    Если передан reporter, сегменты публикуются по мере распознавания.
+    С checkpoint распознавание продолжается с сохранённой позиции, а прогресс
+    периодически (и при любом прерывании) записывается на диск.
+    """
+    if should_chunk(mp3_path) and settings.chunking_executor == "process":
+        return transcribe_chunked(mp3_path, model_name)
+
+    # Склейка вызовов в батч работает, только если задачи идут параллельными потоками одного
+    # процесса (--pool=threads). В prefork/solo задача в процессе одна, и «батч» всегда из одного
+    # файла — там батчи собирает диспетчер загрузки (transcribe_audio_batch)
+    if (model_name.startswith("whisper") and settings.whisper_batching
+            and threading.current_thread() is not threading.main_thread()):
+        return get_batcher(model_name.replace("whisper-", "")).submit(mp3_path).result()
+
+    done = list(checkpoint.segments) if checkpoint else []
+    start = checkpoint.offset if checkpoint and checkpoint.offset else None
+    try:
+        if model_name.startswith("whisper"):
+            segments = transcribe_with_whisper(
+                mp3_path, model_name.replace("whisper-", ""), start, reporter=reporter, checkpoint=checkpoint,
+            )
+        elif model_name.startswith("vosk"):
+            segments = transcribe_with_vosk(
+                mp3_path, start, reporter=reporter, model_name=model_name, checkpoint=checkpoint,
+            )
+        else:
+            raise ValueError(f"Неизвестная модель: {model_name}")
+    except BaseException:
+        if checkpoint and checkpoint.progressed:
+            checkpoint.save()
+        raise
+    return done + segments
+
+
+def transcribe_pcm(
+    audio: np.ndarray,
+    model_name: str,
+    reporter: Optional[ProgressReporter] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Транскрибирует уже декодированный буфер PCM 16 кГц (float32), без повторного запуска ffmpeg.
+    """
+    if model_name.startswith("whisper"):
+        return _recognize_whisper(audio, model_name.replace("whisper-", ""), reporter=reporter)
+    elif model_name.startswith("vosk"):
+        speech, speech_map = _speech_only(audio, model_name, reporter)
+        return _recognize_vosk(pcm_blocks(speech), model_name, reporter=reporter, speech_map=speech_map)
+    else:
+        raise ValueError(f"Неизвестная модель: {model_name}")
+
+
+def transcribe_file(
+    mp3_path: str,
+    model_name: str = "whisper-small",
+    source_id: Optional[str] = None,
+    reporter: Optional[ProgressReporter] = None,
+    formats: Optional[List[str]] = None,
+    task_id: Optional[str] = None,
+    checkpoint: Optional[TranscriptionCheckpoint] = None,
+) -> str:
     """
     Транскрибирует MP3 файл выбранной моделью.
-    Также сохраняет результат в .txt и .pdf.
-    После успешного создания PDF удаляет исходный mp3 и txt файл.
+    Сначала ищет готовый транскрипт в кэше (по source_id и по хэшу содержимого).
+    Результат записывается в запрошенные форматы (по умолчанию settings.output_formats),
+    после чего исходный mp3 удаляется; сегменты задачи task_id попадают в поисковый индекс.
+    Контрольная точка checkpoint удаляется, как только транскрипт попал в кэш.
     """
+    keys = cache_keys(mp3_path, model_name, source_id)
+    entry = cache_lookup(keys)
+
+    if entry:
+        logger.info(f"Транскрипт взят из кэша: {mp3_path}")
+        text, segments = entry["text"], entry["segments"]
+    else:
+        if reporter:
+            reporter.stage("transcribing", model_name=model_name)
+        segments = transcribe_segments(mp3_path, model_name, reporter=reporter, checkpoint=checkpoint)
+        text = store_transcript(mp3_path, model_name, segments, keys)
+    if checkpoint:
+        checkpoint.clear()
+
+    if reporter:
+        reporter.stage("rendering")
+    save_transcript(mp3_path, segments, formats, meta={"model_name": model_name})
+    index_segments(task_id, mp3_path, model_name, segments, source_id)
+    return text
+
+
+def store_transcript(mp3_path: str, model_name: str, segments: List[Dict[str, Any]], keys: List[str]) -> str:
+    """
+    Кладёт готовые сегменты в кэш и возвращает текст транскрипта.
+    """
+    text = segments_to_text(segments)
+    transcript_cache.put(keys, text, segments, model_name=model_name, name=Path(mp3_path).stem)
+    return text
+
+
+def transcribe_files(
+    mp3_paths: List[str],
+    model_name: str,
+    source_ids: Optional[List[Optional[str]]] = None,
+    formats: Optional[List[str]] = None,
+    task_id: Optional[str] = None,
+) -> List[str]:
+    """
+    Батчевая транскрипция нескольких файлов одной Whisper-моделью.
+    Файлы, найденные в кэше, в батч не попадают.
+    """
+    source_ids = source_ids or [None] * len(mp3_paths)
+    model_size = model_name.replace("whisper-", "")
+
+    texts: List[Optional[str]] = [None] * len(mp3_paths)
+    all_segments: List[List[Dict[str, Any]]] = [[] for _ in mp3_paths]
+    pending = []
+    for i, (path, source_id) in enumerate(zip(mp3_paths, source_ids)):
+        keys = cache_keys(path, model_name, source_id)
+        entry = cache_lookup(keys)
+        if entry:
+            logger.info(f"Транскрипт взят из кэша: {path}")
+            texts[i], all_segments[i] = entry["text"], entry["segments"]
+        else:
+            pending.append((i, keys))
+
+    for start in range(0, len(pending), settings.whisper_batch_max_files):
+        group = pending[start:start + settings.whisper_batch_max_files]
+        results = transcribe_whisper_batch([mp3_paths[i] for i, _ in group], model_size)
+        for (i, keys), segments in zip(group, results):
+            texts[i] = store_transcript(mp3_paths[i], model_name, segments, keys)
+            all_segments[i] = segments
+
+    for path, segments, source_id in zip(mp3_paths, all_segments, source_ids):
+        save_transcript(path, segments, formats, meta={"model_name": model_name})
+        index_segments(task_id, path, model_name, segments, source_id)
+    return texts
+
+
+def index_segments(
+    task_id: Optional[str],
+    mp3_path: str,
+    model_name: str,
+    segments: List[Dict[str, Any]],
+    source_id: Optional[str] = None,
+) -> None:
+    """
+    Добавляет транскрипт в поисковый индекс. Ошибка индексации не прерывает транскрипцию.
+    """
+    if not task_id or not settings.search_index_enabled:
+        return
+    try:
+        with track_stage("index", model_name):
+            search_index.index_transcript(
+                task_id,
+                os.path.basename(mp3_path),
+                model_name,
+                segments,
+                search_index.video_id_from_source(source_id),
+            )
+    except Exception:
+        logger.exception(f"[{task_id}] Не удалось проиндексировать транскрипт {mp3_path}")
+
+
+def should_chunk(mp3_path: str) -> bool:
+    """
+    Нужно ли делить файл на фрагменты для параллельной транскрипции.
+    """
+    if not settings.chunking_enabled:
+        return False
+    try:
+        return probe_duration(mp3_path) >= settings.chunking_min_duration_s
+    except Exception as e:
+        logger.warning(f"Не удалось определить длительность {mp3_path}, фрагментация пропущена: {e}")
+        return False
+
+
+def transcribe_chunk(mp3_path: str, window: Dict[str, float], model_name: str) -> List[Dict[str, Any]]:
+    """
+    Транскрибирует один фрагмент файла; таймкоды сегментов абсолютные.
+    """
+    start, duration = window["start"], window["end"] - window["start"]
     if model_name.startswith("whisper"):
-        text = transcribe_with_whisper(mp3_path, model_name.replace("whisper-", ""))
-    elif model_name == "vosk":
-        text = transcribe_with_vosk(mp3_path)
+        return transcribe_with_whisper(mp3_path, model_name.replace("whisper-", ""), start, duration)
+    elif model_name.startswith("vosk"):
+        return transcribe_with_vosk(mp3_path, start, duration, model_name=model_name)
     else:
         raise ValueError(f"Неизвестная модель: {model_name}")
 
+
+def transcribe_chunked(mp3_path: str, model_name: str) -> List[Dict[str, Any]]:
+    """
+    Делит длинный файл по паузам и транскрибирует фрагменты параллельно в пуле процессов.
+    Каждый процесс загружает свою копию модели, поэтому число процессов ограничено
+    бюджетом памяти пула моделей. Внутри демонического процесса (prefork-воркер Celery)
+    дочерние процессы запрещены — фрагменты транскрибируются по очереди в этом процессе.
+    """
+    windows = plan_chunks(mp3_path)
+    if multiprocessing.current_process().daemon:
+        logger.warning(f"Пул процессов недоступен в демоническом процессе, фрагменты {mp3_path} обрабатываются "
+                       f"последовательно (используйте chunking_executor='celery')")
+        return stitch_chunks(windows, [transcribe_chunk(mp3_path, window, model_name) for window in windows])
+
+    cost_mb = MODEL_COST_MB.get(model_name, DEFAULT_MODEL_COST_MB)
+    by_memory = max(1, settings.models_memory_budget_mb // cost_mb)
+    workers = min(len(windows), settings.chunking_workers or os.cpu_count() or 1, by_memory)
+    logger.info(f"Параллельная транскрипция {mp3_path}: {len(windows)} фрагментов, {workers} процессов")
+
+    # spawn — чтобы не наследовать потоки и загруженные модели родительского процесса
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        chunk_segments = list(executor.map(
+            transcribe_chunk,
+            [mp3_path] * len(windows),
+            windows,
+            [model_name] * len(windows),
+        ))
+
+    return stitch_chunks(windows, chunk_segments)
+
+
+def cache_keys(mp3_path: str, model_name: str, source_id: Optional[str] = None) -> List[str]:
+    params = transcription_params(model_name)
+    keys = [make_cache_key(file_source_id(mp3_path), model_name, params)]
+    if source_id:
+        keys.insert(0, make_cache_key(source_id, model_name, params))
+    return keys
+
+
+def cache_lookup(keys: List[str]) -> Optional[Dict[str, Any]]:
+    for key in keys:
+        entry = transcript_cache.get(key)
+        if entry:
+            return entry
+    return None
+
+
+def save_transcript(
+    mp3_path: str | Path,
+    segments: List[Dict[str, Any]],
+    formats: Optional[List[str]] = None,
+    meta: Optional[Dict[str, Any]] = None,
+) -> List[Path]:
+    """
+    Записывает транскрипт рядом с аудиофайлом во все запрошенные форматы за один проход.
+    После успешной записи удаляет исходный mp3 файл; ошибка записи пробрасывается вызывающей задаче.
+    """
     base_path = Path(mp3_path).with_suffix("")
-    txt_path = base_path.with_suffix(".txt")
-    pdf_path = base_path.with_suffix(".pdf")
-
-    # Сохраняем транскрипт в .txt
-    with open(txt_path, "w", encoding="utf-8") as f:
-        f.write(text)
-    logger.info(f"Транскрипт сохранён в: {txt_path}")
-
-    # Создаем PDF из .txt
-    pdf_created = generate_pdf_from_textfile(txt_path, pdf_path)
-    if pdf_created and pdf_path.exists():
-        logger.info(f"PDF успешно создан: {pdf_path}")
-
-        # Удаляем исходный mp3 файл
-        if Path(mp3_path).exists():
-            try:
-                os.remove(mp3_path)
-                logger.info(f"Удалён исходный MP3 файл: {mp3_path}")
-            except Exception as e:
-                logger.warning(f"Не удалось удалить MP3 файл {mp3_path}: {e}")
-        else:
-            logger.debug(f"MP3 файл уже отсутствует: {mp3_path}")
-
-        # Удаляем txt файл
-        if txt_path.exists():
-            try:
-                os.remove(txt_path)
-                logger.info(f"Удалён временный TXT файл: {txt_path}")
-            except Exception as e:
-                logger.warning(f"Не удалось удалить TXT файл {txt_path}: {e}")
-        else:
-            logger.debug(f"TXT файл уже отсутствует: {txt_path}")
+    formats = formats or settings.output_formats
+
+    try:
+        with track_stage("render", (meta or {}).get("model_name", "")):
+            paths = write_transcript(base_path, segments, formats, meta)
+    except Exception:
+        logger.exception(f"Транскрипт не записан, файлы не удаляются: {base_path}")
+        raise
 
+    # Удаляем исходный mp3 файл
+    if Path(mp3_path).exists():
+        try:
+            os.remove(mp3_path)
+            logger.info(f"Удалён исходный MP3 файл: {mp3_path}")
+        except Exception as e:
+            logger.warning(f"Не удалось удалить MP3 файл {mp3_path}: {e}")
     else:
-        logger.warning(f"PDF не создан, файлы не удаляются: {pdf_path}")
+        logger.debug(f"MP3 файл уже отсутствует: {mp3_path}")
 
-    return text
+    return paths
+
+
+def _speech_only(
+    audio: np.ndarray,
+    model_label: str,
+    reporter: Optional[ProgressReporter] = None,
+) -> Tuple[np.ndarray, Optional[SpeechMap]]:
+    """
+    VAD-предпроход: оставляет в буфере только речь и сообщает, сколько аудио отброшено.
+    """
+    if not settings.vad_enabled or not len(audio):
+        return audio, None
+    with track_stage("vad", model_label):
+        speech, speech_map = apply_vad(audio)
+    if speech_map is None:
+        return audio, None
+    _report_vad(len(audio), speech_map, model_label, reporter)
+    return speech, speech_map
+
+
+def _report_vad(
+    audio_samples: int,
+    speech_map: SpeechMap,
+    model_label: str,
+    reporter: Optional[ProgressReporter] = None,
+) -> None:
+    audio_s, skipped_s = audio_samples / SAMPLE_RATE, (audio_samples - speech_map.speech_samples) / SAMPLE_RATE
+    VAD_SKIPPED_SECONDS.labels(model_label).inc(skipped_s)
+    logger.info(f"VAD: без речи {skipped_s:.1f} из {audio_s:.1f} с, в модель ушло {len(speech_map.regions)} участков")
+    if reporter:
+        reporter.stage("vad", audio_s=round(audio_s, 1), skipped_s=round(skipped_s, 1))
+
+
+def _timeline(offset: float, speech_map: Optional[SpeechMap]) -> Callable[[float], float]:
+    """
+    Переводит время в распознаваемом буфере в абсолютное время исходного файла.
+    """
+    if speech_map is None:
+        return lambda t: t + offset
+    return lambda t: speech_map.to_original(t) + offset
 
 
-def transcribe_with_whisper(mp3_path: str, model_size: str) -> str:
+def transcribe_with_whisper(
+    mp3_path: str,
+    model_size: str,
+    start: Optional[float] = None,
+    duration: Optional[float] = None,
+    reporter: Optional[ProgressReporter] = None,
+    checkpoint: Optional[TranscriptionCheckpoint] = None,
+) -> List[Dict[str, Any]]:
     """
     Транскрипция через faster-whisper (CPU).
+    Аудио декодируется тем же ffmpeg-декодером, что и для vosk.
     """
+    with track_stage("decode", f"whisper-{model_size}"):
+        audio = decode_pcm(mp3_path, start=start, duration=duration)
+    return _recognize_whisper(audio, model_size, start or 0.0, reporter, checkpoint)
+
+
+def _recognize_whisper(
+    audio: np.ndarray,
+    model_size: str,
+    offset: float = 0.0,
+    reporter: Optional[ProgressReporter] = None,
+    checkpoint: Optional[TranscriptionCheckpoint] = None,
+) -> List[Dict[str, Any]]:
+    model_label = f"whisper-{model_size}"
     model = get_whisper_model(model_size)
-    segments, _ = model.transcribe(mp3_path)
+    audio_s = len(audio) / SAMPLE_RATE
+    audio, speech_map = _speech_only(audio, model_label, reporter)
+    at = _timeline(offset, speech_map)
 
+    started = time.monotonic()
     result = []
-    for segment in segments:
-        result.append(segment.text.strip())
-    return " ".join(result)
+    with track_stage("inference", model_label):
+        # transcribe() возвращает генератор — сегменты появляются по мере распознавания
+        segments, _ = model.transcribe(audio) if len(audio) else ([], None)
+        for segment in segments:
+            item = {"start": at(segment.start), "end": at(segment.end), "text": segment.text.strip()}
+            result.append(item)
+            if reporter:
+                reporter.segment(item)
+            if checkpoint:
+                # Повторная попытка продолжит с конца последнего готового сегмента
+                checkpoint.add(item, item["end"])
+    # RTF считается на исходную длительность: так виден выигрыш от VAD
+    observe_rtf(model_label, time.monotonic() - started, audio_s)
+    return result
 
 
-def transcribe_with_vosk(mp3_path: str) -> str:
+def transcribe_with_vosk(
+    mp3_path: str,
+    start: Optional[float] = None,
+    duration: Optional[float] = None,
+    reporter: Optional[ProgressReporter] = None,
+    model_name: str = "vosk",
+    checkpoint: Optional[TranscriptionCheckpoint] = None,
+) -> List[Dict[str, Any]]:
     """
-    Транскрипция через vosk (после конвертации mp3 → wav).
+    Транскрипция через vosk.
+    PCM 16 кГц читается из stdout ffmpeg блоками по audio_chunk_bytes, без временного WAV.
+    С VAD блоки проходят через потоковый детектор окнами по vad_window_s, и в распознаватель
+    уходят только участки речи; в памяти при этом одно окно, а не весь файл.
     """
-    # Просто создаём путь к .wav без открытия файла
-    wav_filename = f"{uuid.uuid4().hex}.wav"
-    wav_path = os.path.join(tempfile.gettempdir(), wav_filename)
+    # Декодирование и VAD идут потоково вместе с распознаванием, поэтому стадия одна
+    blocks = iter_pcm(mp3_path, start=start, duration=duration)
+    if not settings.vad_enabled:
+        return _recognize_vosk(blocks, model_name, start or 0.0, reporter, checkpoint)
 
-    try:
-        # Конвертация через ffmpeg
-        subprocess.run(
-            [
-                "ffmpeg", "-i", mp3_path,
-                "-ar", "16000", "-ac", "1", "-f", "wav", wav_path,
-                "-y"
-            ],
-            check=True,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL
-        )
-
-        # Теперь читаем .wav файл (файл точно доступен)
-        with wave.open(wav_path, "rb") as wf:
-            vosk_model = get_vosk_model()
-            rec = KaldiRecognizer(vosk_model, wf.getframerate())
-
-            results = []
-            while True:
-                data = wf.readframes(4000)
-                if len(data) == 0:
-                    break
-                if rec.AcceptWaveform(data):
-                    results.append(json.loads(rec.Result())["text"])
-            results.append(json.loads(rec.FinalResult())["text"])
-
-        return " ".join(results)
-
-    finally:
-        if os.path.exists(wav_path):
-            try:
-                os.remove(wav_path)
-                logger.debug(f"Временный WAV файл удалён: {wav_path}")
-            except Exception as e:
-                logger.warning(f"Не удалось удалить WAV файл: {wav_path}: {e}")
+    speech_map = SpeechMap()
+    segments = _recognize_vosk(stream_vad(blocks, speech_map), model_name, start or 0.0, reporter, checkpoint,
+                               speech_map)
+    _report_vad(speech_map.total_samples, speech_map, model_name, reporter)
+    return segments
+
+
+def _recognize_vosk(
+    blocks: Iterable[bytes],
+    model_name: str = "vosk",
+    offset: float = 0.0,
+    reporter: Optional[ProgressReporter] = None,
+    checkpoint: Optional[TranscriptionCheckpoint] = None,
+    speech_map: Optional[SpeechMap] = None,
+) -> List[Dict[str, Any]]:
+    global KaldiRecognizer
+    if KaldiRecognizer is None:
+        from vosk import KaldiRecognizer
+
+    vosk_model = get_vosk_model(model_name)
+    rec = KaldiRecognizer(vosk_model, SAMPLE_RATE)
+    rec.SetWords(True)
+
+    at = _timeline(offset, speech_map)
+    results = []
+    audio_bytes = 0
+    started = time.monotonic()
+    with track_stage("inference", model_name):
+        for data in blocks:
+            audio_bytes += len(data)
+            if rec.AcceptWaveform(data):
+                results.append(_vosk_segment(json.loads(rec.Result()), at))
+                if reporter and results[-1]["text"]:
+                    reporter.segment(results[-1])
+                if checkpoint:
+                    # После Result() распознаватель сброшен — с этой позиции можно начать заново
+                    checkpoint.add(results[-1] if results[-1]["text"] else None, at(audio_bytes / (SAMPLE_RATE * 2)))
+            elif reporter:
+                partial = json.loads(rec.PartialResult()).get("partial", "")
+                if partial:
+                    reporter.partial(partial)
+        results.append(_vosk_segment(json.loads(rec.FinalResult()), at))
+    if reporter and results[-1]["text"]:
+        reporter.segment(results[-1])
+    observe_rtf(model_name, time.monotonic() - started, at(audio_bytes / (SAMPLE_RATE * 2)) - offset)
+
+    return [r for r in results if r["text"]]
+
+
+def _vosk_segment(result: Dict[str, Any], at: Callable[[float], float]) -> Dict[str, Any]:
+    """
+    Преобразует результат KaldiRecognizer в сегмент с таймкодами; at переводит время в абсолютное.
+    """
+    words = result.get("result") or []
+    return {
+        "start": at(words[0]["start"] if words else 0.0),
+        "end": at(words[-1]["end"] if words else 0.0),
+        "text": result.get("text", "").strip(),
+    }
@@ -0,0 +1,179 @@
+# app/services/transcript_cache.py
+
+import os
+import json
+import time
+import hashlib
+import threading
+from typing import Optional, List, Dict, Any
+
+from app.core.config import settings
+from app.core.logging_config import setup_logger
+from app.core.metrics import TRANSCRIPT_CACHE_REQUESTS
+
+logger = setup_logger(__name__)
+
+CACHE_VERSION = 1
+# Кэш делят несколько процессов: их записи в счётчик этого процесса не попадают,
+# поэтому каталог всё равно пересчитывается не реже чем раз в RESYNC_S
+RESYNC_S = 600.0
+# Вытеснение освобождает место с запасом — до этой доли лимита, — чтобы следующие записи
+# не требовали обхода каталога каждая
+EVICT_TARGET = 0.9
+
+
+def video_source_id(video_id: str) -> str:
+    return f"yt:{video_id}"
+
+
+def file_source_id(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Идентификатор источника по содержимому аудиофайла (sha256).
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return f"sha256:{digest.hexdigest()}"
+
+
+def make_cache_key(source_id: str, model_name: str, params: Optional[Dict[str, Any]] = None) -> str:
+    payload = json.dumps(
+        {"v": CACHE_VERSION, "source": source_id, "model": model_name, "params": params or {}},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class TranscriptCache:
+    """
+    Персистентный кэш транскриптов на диске.
+    Каждая запись — отдельный JSON-файл; время последнего обращения хранится в mtime,
+    при превышении лимита по размеру удаляются самые давно использованные записи.
+    Размер кэша ведётся счётчиком; каталог обходится, только когда счётчик превысил лимит
+    (или давно не сверялся с диском), а не при каждой записи.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int, enabled: bool = True):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._total_bytes: Optional[int] = None
+        self._synced_at = 0.0
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+
+        path = self._entry_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            os.utime(path, None)
+        except FileNotFoundError:
+            entry = None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Повреждённая запись кэша {path}: {e}")
+            self._remove(path)
+            entry = None
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        TRANSCRIPT_CACHE_REQUESTS.labels("hit" if entry else "miss").inc()
+
+        logger.info(f"Кэш транскриптов: {'попадание' if entry else 'промах'} ({key[:12]})")
+        return entry
+
+    def put(self, keys: List[str], text: str, segments: List[Dict[str, Any]], **meta) -> None:
+        if not self.enabled:
+            return
+
+        entry = {"text": text, "segments": segments, **meta}
+        data = json.dumps(entry, ensure_ascii=False).encode("utf-8")
+
+        written = 0
+        for key in keys:
+            path = self._entry_path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            try:
+                replaced = os.path.getsize(path) if os.path.exists(path) else 0
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+                written += len(data) - replaced
+            except OSError as e:
+                logger.warning(f"Не удалось записать кэш {path}: {e}")
+                self._remove(tmp_path)
+
+        with self._lock:
+            if self._total_bytes is not None:
+                self._total_bytes += written
+            stale = (self._total_bytes is None or self._total_bytes > self.max_bytes
+                     or time.monotonic() - self._synced_at > RESYNC_S)
+        if stale:
+            self.evict()
+
+    def evict(self) -> None:
+        """
+        Обходит каталог и, если кэш больше лимита, удаляет самые давно использованные записи,
+        пока он не уложится в EVICT_TARGET от лимита. Сверяет счётчик размера с диском.
+        """
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+
+        if total > self.max_bytes:
+            target = self.max_bytes * EVICT_TARGET
+            entries.sort()
+            for _, size, path in entries:
+                if total <= target:
+                    break
+                self._remove(path)
+                total -= size
+                with self._lock:
+                    self.evictions += 1
+                logger.info(f"Кэш транскриптов: вытеснена запись {os.path.basename(path)}")
+
+        with self._lock:
+            self._total_bytes = total
+            self._synced_at = time.monotonic()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+transcript_cache = TranscriptCache(
+    settings.transcript_cache_dir,
+    settings.transcript_cache_max_bytes,
+    enabled=settings.transcript_cache_enabled,
+)
@@ -0,0 +1,163 @@
+# app/services/vad.py
+
+import bisect
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.logging_config import setup_logger
+from app.services.audio import SAMPLE_RATE
+
+logger = setup_logger(__name__)
+
+FRAME_MS = 30
+
+_fallback_warned = False
+
+
+class SpeechMap:
+    """
+    Соответствие между склеенным из речевых участков буфером и исходным аудио.
+    regions — границы участков в сэмплах исходного аудио. При потоковом VAD карта
+    дополняется по мере чтения (add), и время переводится для уже прочитанной части.
+    """
+
+    def __init__(self, regions: Optional[List[Tuple[int, int]]] = None):
+        self.regions: List[Tuple[int, int]] = []
+        self._starts: List[int] = []
+        self.speech_samples = 0
+        # Сколько исходного аудио уже просмотрено потоковым VAD
+        self.total_samples = 0
+        for start, end in regions or []:
+            self.add(start, end)
+
+    def add(self, start: int, end: int) -> None:
+        if self.regions and self.regions[-1][1] == start:
+            # Участок продолжает предыдущий (речь на границе окон)
+            self.regions[-1] = (self.regions[-1][0], end)
+        else:
+            self._starts.append(self.speech_samples)
+            self.regions.append((start, end))
+        self.speech_samples += end - start
+
+    def to_original(self, t: float) -> float:
+        """
+        Переводит время (с) в склеенном буфере во время в исходном аудио.
+        """
+        if not self.regions:
+            return t
+        sample = t * SAMPLE_RATE
+        i = max(0, bisect.bisect_right(self._starts, sample) - 1)
+        return (self.regions[i][0] + sample - self._starts[i]) / SAMPLE_RATE
+
+
+def _silero_regions(audio: np.ndarray) -> List[Tuple[int, int]]:
+    from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+    options = VadOptions(
+        threshold=settings.vad_threshold,
+        min_silence_duration_ms=settings.vad_min_silence_ms,
+        speech_pad_ms=settings.vad_speech_pad_ms,
+    )
+    return [(ts["start"], ts["end"]) for ts in get_speech_timestamps(audio, options)]
+
+
+def _energy_regions(audio: np.ndarray) -> List[Tuple[int, int]]:
+    """
+    Запасной детектор по энергии кадров. Уровень шума — медиана кадров тише общей медианы;
+    порог — его кратное, но не ниже абсолютного минимума vad_energy_threshold и не выше
+    общей медианы, чтобы в записи, где речь почти везде, тихая речь не отсекалась.
+    Отсекает тишину, но, в отличие от silero, не отличает музыку от речи.
+    """
+    frame = SAMPLE_RATE * FRAME_MS // 1000
+    count = len(audio) // frame
+    if count == 0:
+        return []
+    frames = np.asarray(audio[:count * frame], dtype=np.float32).reshape(count, frame)
+    rms = np.sqrt(np.mean(frames ** 2, axis=1))
+    median = float(np.median(rms))
+    noise = float(np.median(rms[rms <= median]))
+    threshold = max(settings.vad_energy_threshold, min(noise * settings.vad_energy_ratio, median))
+
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], (rms > threshold).astype(np.int8), [0]])))
+    pad = SAMPLE_RATE * settings.vad_speech_pad_ms // 1000
+    gap = SAMPLE_RATE * settings.vad_min_silence_ms // 1000
+
+    regions: List[Tuple[int, int]] = []
+    for first, last in zip(edges[::2], edges[1::2]):
+        start, end = max(0, int(first) * frame - pad), min(len(audio), int(last) * frame + pad)
+        if regions and start - regions[-1][1] < gap:
+            regions[-1] = (regions[-1][0], end)
+        else:
+            regions.append((start, end))
+    return regions
+
+
+def speech_regions(audio: np.ndarray) -> List[Tuple[int, int]]:
+    """
+    Участки речи (в сэмплах). silero из faster-whisper, если он установлен, иначе детектор по энергии.
+    """
+    global _fallback_warned
+    if settings.vad_method == "silero":
+        try:
+            return _silero_regions(audio)
+        except ImportError:
+            if not _fallback_warned:
+                _fallback_warned = True
+                logger.warning("faster_whisper недоступен, VAD по энергии сигнала: музыка не отсекается, "
+                               "очень тихая речь может быть пропущена")
+    return _energy_regions(audio)
+
+
+def _speech_parts(audio: np.ndarray) -> Tuple[List[Tuple[int, int]], int]:
+    """
+    Участки речи буфера и число отброшенных сэмплов; если отбросить почти нечего, буфер целиком.
+    """
+    regions = speech_regions(audio)
+    skipped = len(audio) - sum(end - start for start, end in regions)
+    if skipped < settings.vad_min_skip_s * SAMPLE_RATE:
+        return [(0, len(audio))], 0
+    return regions, skipped
+
+
+def stream_vad(blocks: Iterable[bytes], speech_map: SpeechMap) -> Iterator[bytes]:
+    """
+    Потоковый VAD для PCM s16le: блоки копятся в окна по vad_window_s, из каждого окна
+    дальше уходят только участки речи, а speech_map дополняется их границами.
+    В памяти — одно окно, а не весь файл.
+    """
+    window = int(settings.vad_window_s * SAMPLE_RATE) * 2
+    buffer = bytearray()
+
+    def flush(data: bytes) -> Iterator[bytes]:
+        position = speech_map.total_samples
+        samples = np.frombuffer(data, dtype=np.int16)
+        regions, _ = _speech_parts(samples.astype(np.float32) / 32768.0)
+        speech_map.total_samples += len(samples)
+        for start, end in regions:
+            if end > start:
+                speech_map.add(position + start, position + end)
+                yield samples[start:end].tobytes()
+
+    for block in blocks:
+        buffer += block
+        if len(buffer) >= window:
+            data, buffer = bytes(buffer[:window]), buffer[window:]
+            yield from flush(data)
+    if len(buffer) >= 2:
+        yield from flush(bytes(buffer[:len(buffer) - len(buffer) % 2]))
+
+
+def apply_vad(audio: np.ndarray) -> Tuple[np.ndarray, Optional[SpeechMap]]:
+    """
+    Оставляет в буфере только речь. Возвращает склеенный буфер и карту времени;
+    если отбросить почти нечего (меньше vad_min_skip_s), буфер возвращается как есть без карты.
+    """
+    regions, skipped = _speech_parts(audio)
+    if not skipped:
+        return audio, None
+    speech_map = SpeechMap(regions)
+    if not regions:
+        return np.empty(0, dtype=np.float32), speech_map
+    return np.concatenate([audio[start:end] for start, end in regions]), speech_map
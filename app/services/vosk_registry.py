@@ -0,0 +1,206 @@
+# app/services/vosk_registry.py
+
+import os
+import shutil
+import hashlib
+import zipfile
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, Optional
+
+import requests
+
+from app.core.config import settings
+from app.core.logging_config import setup_logger
+from app.utils.http_files import parse_content_range
+
+try:
+    import fcntl
+except ImportError:  # Windows — межпроцессная блокировка недоступна
+    fcntl = None
+
+logger = setup_logger(__name__)
+
+# Варианты моделей Vosk: имя в ModelName -> архив на alphacephei.com/vosk/models.
+# sha256 задаётся в настройках (vosk_model_checksums): официальных контрольных сумм нет.
+VOSK_MODELS: Dict[str, Dict[str, Any]] = {
+    "vosk": {"archive": "vosk-model-small-en-us-0.15", "cost_mb": 100},
+    "vosk-en-us": {"archive": "vosk-model-en-us-0.22", "cost_mb": 3000},
+    "vosk-small-ru": {"archive": "vosk-model-small-ru-0.22", "cost_mb": 100},
+    "vosk-ru": {"archive": "vosk-model-ru-0.42", "cost_mb": 3500},
+    "vosk-small-de": {"archive": "vosk-model-small-de-0.15", "cost_mb": 100},
+}
+
+COMPLETE_MARKER = ".complete"
+
+
+class ModelFetchError(RuntimeError):
+    pass
+
+
+def _archive(model_name: str) -> str:
+    try:
+        return VOSK_MODELS[model_name]["archive"]
+    except KeyError:
+        raise ValueError(f"Неизвестная модель Vosk: {model_name}")
+
+
+@contextmanager
+def _file_lock(path: str) -> Iterator[None]:
+    """
+    Не даёт нескольким процессам воркера одновременно качать одну и ту же модель.
+    """
+    with open(path, "a") as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _verify(model_name: str, zip_path: str, sidecar: str) -> None:
+    """
+    Сверяет sha256 архива с настройками; если суммы нет, сверяет с записанной при первой загрузке.
+    """
+    actual = _sha256(zip_path)
+    expected = settings.vosk_model_checksums.get(model_name)
+    if expected is None and os.path.exists(sidecar):
+        with open(sidecar, "r", encoding="utf-8") as f:
+            expected = f.read().strip()
+
+    if expected and actual != expected.lower():
+        raise ModelFetchError(f"Контрольная сумма архива {os.path.basename(zip_path)} не совпадает: {actual}")
+    if not expected:
+        logger.warning(f"Для модели '{model_name}' нет контрольной суммы, записана текущая: {actual}")
+        with open(sidecar, "w", encoding="utf-8") as f:
+            f.write(actual)
+
+
+def _download(url: str, zip_path: str) -> None:
+    """
+    Потоковая загрузка архива в <zip>.part блоками с докачкой через Range.
+    Если ответ сервера не стыкуется с .part (размер или начало диапазона не совпали),
+    .part удаляется и загрузка начинается заново.
+    """
+    part_path = f"{zip_path}.part"
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+    with requests.get(url, headers=headers, stream=True, timeout=(10, 60)) as response:
+        content_range = parse_content_range(response.headers.get("Content-Range"))
+        if response.status_code == 416 and offset:
+            # .part уже содержит весь файл — если его размер совпадает с размером на сервере
+            if content_range and content_range[2] == offset:
+                os.replace(part_path, zip_path)
+                return
+            return _restart(response, url, zip_path, f"сервер не подтвердил размер {offset} байт ({content_range})")
+        response.raise_for_status()
+        if offset and response.status_code != 206:
+            logger.info(f"Сервер не поддерживает докачку, загрузка {url} начата заново")
+            offset = 0
+        elif offset and (not content_range or content_range[0] != offset):
+            return _restart(response, url, zip_path, f"ответ 206 начинается не с {offset} байт ({content_range})")
+
+        total = offset + int(response.headers.get("Content-Length", 0))
+        logger.info(f"Загрузка {url}: {offset / 1024 ** 2:.0f} из {total / 1024 ** 2:.0f} МБ уже на диске")
+        with open(part_path, "ab" if offset else "wb") as f:
+            for block in response.iter_content(chunk_size=settings.vosk_download_chunk_bytes):
+                f.write(block)
+
+    os.replace(part_path, zip_path)
+
+
+def _restart(response: requests.Response, url: str, zip_path: str, reason: str) -> None:
+    # Без .part запрос уходит без Range, поэтому повторный перезапуск невозможен
+    response.close()
+    logger.warning(f"Загрузка {url}: {reason}, .part удалён, загрузка начата заново")
+    os.remove(f"{zip_path}.part")
+    _download(url, zip_path)
+
+
+def _extract(zip_path: str, archive: str, target: str) -> None:
+    """
+    Распаковка во временный каталог и атомарное переименование: недораспакованная модель
+    никогда не оказывается по итоговому пути.
+    """
+    tmp_dir = f"{target}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    try:
+        with zipfile.ZipFile(zip_path) as zf:
+            zf.extractall(tmp_dir)
+        extracted = os.path.join(tmp_dir, archive)
+        if not os.path.isdir(extracted):
+            raise ModelFetchError(f"В архиве {os.path.basename(zip_path)} нет каталога {archive}")
+        open(os.path.join(extracted, COMPLETE_MARKER), "w").close()
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(extracted, target)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _mirror_source(archive: str) -> Optional[str]:
+    """
+    Локальное зеркало: готовый каталог модели или архив <archive>.zip.
+    """
+    mirror = settings.vosk_models_mirror
+    if not mirror or "://" in mirror:
+        return None
+    for candidate in (os.path.join(mirror, archive), os.path.join(mirror, f"{archive}.zip")):
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def ensure_model(model_name: str = "vosk") -> str:
+    """
+    Возвращает путь к распакованной модели, при необходимости скачивая её.
+    """
+    archive = _archive(model_name)
+    models_dir = settings.vosk_models_dir
+    target = os.path.join(models_dir, archive)
+    if os.path.exists(os.path.join(target, COMPLETE_MARKER)):
+        return target
+
+    mirrored = _mirror_source(archive)
+    if mirrored and os.path.isdir(mirrored):
+        logger.info(f"Модель Vosk '{model_name}' берётся из локального зеркала {mirrored}")
+        return mirrored
+
+    os.makedirs(models_dir, exist_ok=True)
+    with _file_lock(os.path.join(models_dir, f"{archive}.lock")):
+        # Пока ждали блокировку, модель мог подготовить другой процесс
+        if os.path.exists(os.path.join(target, COMPLETE_MARKER)):
+            return target
+        if os.path.isdir(target):
+            logger.warning(f"Каталог {target} распакован не полностью и будет заменён")
+
+        zip_path = mirrored or os.path.join(models_dir, f"{archive}.zip")
+        try:
+            if not os.path.exists(zip_path):
+                base_url = settings.vosk_models_mirror or settings.vosk_models_base_url
+                _download(f"{base_url.rstrip('/')}/{archive}.zip", zip_path)
+            _verify(model_name, zip_path, os.path.join(models_dir, f"{archive}.zip.sha256"))
+            _extract(zip_path, archive, target)
+        except (ModelFetchError, zipfile.BadZipFile) as e:
+            # Повреждённый архив удаляем, чтобы следующая попытка скачала его заново
+            if not mirrored and os.path.exists(zip_path):
+                os.remove(zip_path)
+            raise ModelFetchError(str(e)) from e
+        except (requests.RequestException, OSError) as e:
+            logger.exception(f"Ошибка при загрузке модели Vosk '{model_name}'")
+            raise ModelFetchError(f"Ошибка загрузки модели: {e}")
+
+        if not mirrored:
+            os.remove(zip_path)
+        logger.info(f"Модель Vosk '{model_name}' готова: {target}")
+    return target
+
@@ -1,11 +1,24 @@
 # app/startup.py
+import os
+import json
+import socket
+import threading
+
+import redis
+
 from app.core.config import settings
 from app.core.logging_config import setup_logger
-from app.services.models_loader import get_whisper_model, get_vosk_model
+from app.services.models_loader import get_whisper_model, get_vosk_model, model_pool
+from app.services.readiness import WARM_MODELS_PREFIX
+from app.services.vosk_registry import VOSK_MODELS
 
 logger = setup_logger(__name__)
 
-VALID_MODELS = {"whisper-small", "whisper-medium", "whisper-large-2", "vosk"}
+VALID_MODELS = {"whisper-small", "whisper-medium", "whisper-large-2", *VOSK_MODELS}
+
+_redis: redis.Redis = None
+_serves_models = True
+
 
 def preload_models():
     if not settings.models_preload:
@@ -23,10 +36,83 @@ def preload_models():
             if model_name.startswith("whisper"):
                 get_whisper_model(model_name.replace("whisper-", ""))
                 logger.info(f"Whisper-модель '{model_name}' успешно загружена")
-            elif model_name == "vosk":
-                get_vosk_model()
+            elif model_name.startswith("vosk"):
+                get_vosk_model(model_name)
                 logger.info("Vosk-модель успешно загружена")
         except Exception as e:
             logger.exception(f"Ошибка при загрузке модели '{model_name}': {e}")
 
     logger.info("Предзагрузка моделей завершена")
+
+
+def _serves_transcription(worker) -> bool:
+    # Воркер только очереди загрузок модели не нужны
+    queues = set(worker.app.amqp.queues.consume_from or {})
+    return queues != {settings.io_queue}
+
+
+def _is_prefork(worker) -> bool:
+    return getattr(worker.pool_cls, "__module__", "").endswith("prefork")
+
+
+def on_worker_init(worker) -> None:
+    """
+    worker_init: главный процесс воркера, до запуска пула.
+    В режиме "parent" модели грузятся здесь и достаются дочерним процессам через copy-on-write;
+    для пулов без fork (solo, threads) это единственная точка прогрева.
+    """
+    global _serves_models
+
+    if not _serves_transcription(worker):
+        logger.info("Воркер не обслуживает транскрипцию — прогрев моделей пропущен")
+        _serves_models = False
+        return
+
+    if not _is_prefork(worker):
+        preload_models()
+        start_warm_models_heartbeat()
+    elif settings.models_preload_stage == "parent":
+        preload_models()
+
+
+def on_worker_process_init() -> None:
+    """
+    worker_process_init: дочерний процесс prefork-пула после fork.
+    """
+    if not _serves_models:
+        return
+    if settings.models_preload_stage != "parent":
+        preload_models()
+    start_warm_models_heartbeat()
+
+
+def _warm_models_key() -> str:
+    return f"{WARM_MODELS_PREFIX}{socket.gethostname()}-{os.getpid()}"
+
+
+def publish_warm_models(*args) -> None:
+    """
+    Записывает в Redis список моделей, загруженных в этом процессе; ключ живёт три интервала heartbeat.
+    """
+    global _redis
+    try:
+        if _redis is None:
+            _redis = redis.Redis.from_url(settings.redis_broker_url)
+        _redis.set(
+            _warm_models_key(),
+            json.dumps(model_pool.loaded()),
+            ex=int(settings.models_heartbeat_s * 3),
+        )
+    except redis.RedisError as e:
+        logger.warning(f"Не удалось опубликовать список загруженных моделей: {e}")
+
+
+def start_warm_models_heartbeat() -> None:
+    def loop():
+        while not stop.wait(settings.models_heartbeat_s):
+            publish_warm_models()
+
+    stop = threading.Event()
+    model_pool.add_listener(publish_warm_models)
+    publish_warm_models()
+    threading.Thread(target=loop, name="warm-models-heartbeat", daemon=True).start()
@@ -1,7 +1,18 @@
 import os
+import json
 import shutil
+import hashlib
+import mimetypes
+from typing import List, Dict, Any, Optional
 from app.core.config import settings
 
+MANIFEST_NAME = "manifest.json"
+ACCESS_MARKER = ".last_access"
+
+mimetypes.add_type("application/x-subrip", ".srt")
+mimetypes.add_type("text/vtt", ".vtt")
+
+
 def get_task_dir(task_id: str) -> str:
     return os.path.join(settings.tasks_dir, task_id)
 
@@ -13,3 +24,61 @@ def delete_task_files(task_id: str):
     task_dir = get_task_dir(task_id)
     if os.path.exists(task_dir):
         shutil.rmtree(task_dir)
+
+
+def touch_task(task_id: str) -> None:
+    """
+    Отмечает обращение к файлам задачи (mtime маркера) — по нему janitor выбирает,
+    что вытеснять первым. atime не используется: на noatime-разделах он не обновляется.
+    """
+    path = os.path.join(get_task_dir(task_id), ACCESS_MARKER)
+    try:
+        with open(path, "a"):
+            pass
+        os.utime(path, None)
+    except OSError:
+        pass
+
+
+def describe_files(task_dir: str, names: List[str]) -> List[Dict[str, Any]]:
+    """
+    Размер, sha256 и MIME-тип файлов задачи — считается один раз при завершении задачи.
+    """
+    described = []
+    for name in names:
+        path = os.path.join(task_dir, name)
+        if not os.path.isfile(path):
+            continue
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        described.append({
+            "name": name,
+            "size": os.path.getsize(path),
+            "sha256": digest.hexdigest(),
+            "mime_type": mimetypes.guess_type(name)[0] or "application/octet-stream",
+        })
+    return described
+
+
+def write_manifest(task_id: str, manifest: Dict[str, Any]) -> str:
+    """
+    Атомарно записывает manifest.json задачи.
+    """
+    task_dir = get_task_dir(task_id)
+    path = os.path.join(task_dir, MANIFEST_NAME)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_manifest(task_id: str) -> Optional[Dict[str, Any]]:
+    path = os.path.join(get_task_dir(task_id), MANIFEST_NAME)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
@@ -0,0 +1,116 @@
+# app/utils/http_files.py
+
+import io
+import os
+import zipfile
+from typing import Iterator, List, Optional, Tuple
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Разбирает заголовок Range с одним диапазоном байт.
+    Возвращает (start, end) включительно, None — если заголовка нет или он не поддерживается
+    (несколько диапазонов отдаются целым файлом). Для невыполнимого диапазона бросает ValueError.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+
+    start_text, _, end_text = header[len("bytes="):].strip().partition("-")
+    try:
+        if not start_text:
+            suffix = int(end_text)
+        else:
+            start = int(start_text)
+            end = int(end_text) if end_text else size - 1
+    except ValueError:
+        return None
+
+    if not start_text:
+        if suffix < 0:
+            return None
+        # Суффикс нулевой длины синтаксически верен, но невыполним (416), а не игнорируется
+        if suffix == 0:
+            raise ValueError(f"unsatisfiable range {header!r}: empty suffix")
+        start, end = max(0, size - suffix), size - 1
+
+    end = min(end, size - 1)
+    if start > end or start >= size:
+        raise ValueError(f"unsatisfiable range {header!r} for size {size}")
+    return start, end
+
+
+def parse_content_range(header: Optional[str]) -> Optional[Tuple[Optional[int], Optional[int], Optional[int]]]:
+    """
+    Разбирает заголовок ответа Content-Range: "bytes 100-199/1000" или "bytes */1000" (для 416).
+    Возвращает (start, end, total), неизвестные части — None; None — если заголовок не разобран.
+    """
+    if not header or not header.startswith("bytes "):
+        return None
+    span, _, total_text = header[len("bytes "):].strip().partition("/")
+    try:
+        total = None if total_text == "*" else int(total_text)
+        if span == "*":
+            return None, None, total
+        start_text, _, end_text = span.partition("-")
+        return int(start_text), int(end_text), total
+    except ValueError:
+        return None
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    candidates = [c.strip() for c in header.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def iter_file_range(path: str, start: int, end: int) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            block = f.read(min(CHUNK_SIZE, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+
+
+class _ZipBuffer(io.RawIOBase):
+    """
+    Несикабельный приёмник для ZipFile: накапливает записанные байты до выдачи клиенту.
+    """
+
+    def __init__(self):
+        self._data = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._data += b
+        return len(b)
+
+    def pop(self) -> bytes:
+        data = bytes(self._data)
+        self._data.clear()
+        return data
+
+
+def iter_zip(base_dir: str, names: List[str]) -> Iterator[bytes]:
+    """
+    Потоково собирает zip-архив из файлов без сжатия (PDF и аудио уже сжаты)
+    и без промежуточного файла на диске.
+    """
+    buffer = _ZipBuffer()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for name in names:
+            path = os.path.join(base_dir, name)
+            with open(path, "rb") as src, archive.open(name, "w", force_zip64=True) as dst:
+                for block in iter(lambda: src.read(CHUNK_SIZE), b""):
+                    dst.write(block)
+                    yield buffer.pop()
+            yield buffer.pop()
+    yield buffer.pop()
@@ -1,40 +1,341 @@
 # app/utils/pdf_generator.py
 
 
+import os
+import re
+import struct
+import zlib
+from functools import lru_cache
 from pathlib import Path
-from fpdf import FPDF
+from typing import Dict, List
 
+from app.core.config import settings
 from app.core.logging_config import setup_logger
 
 logger = setup_logger(__name__)
 
 logger.info("Модуль инициализирован")
 
+# Страница A4 в пунктах, поля 15 мм
+PAGE_WIDTH, PAGE_HEIGHT = 595.28, 841.89
+MARGIN = 42.52
+FONT_SIZE = 12
+LEADING = 16
+LINE_WIDTH = PAGE_WIDTH - 2 * MARGIN
+PAGE_LINES = int((PAGE_HEIGHT - 2 * MARGIN) / LEADING)
+
+# Зарезервированные объекты: каталог, дерево страниц, шрифт Type0, CID-шрифт, дескриптор,
+# файл шрифта и ToUnicode; страницы нумеруются дальше
+_CATALOG, _PAGES, _FONT, _CID_FONT, _DESCRIPTOR, _FONT_FILE, _TO_UNICODE = range(1, 8)
+
+
+class _TrueTypeFont:
+    """
+    Метрики TrueType-шрифта, нужные для встраивания: глифы символов (cmap), ширины (hmtx)
+    и габариты. Базовые шрифты PDF знают только WinAnsi, поэтому кириллица требует встроенного шрифта.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self.data = f.read()
+        tables = self._tables()
+
+        head = tables["head"]
+        self.units_per_em = struct.unpack_from(">H", self.data, head + 18)[0]
+        self.bbox = [self._scale(v) for v in struct.unpack_from(">4h", self.data, head + 36)]
+
+        hhea = tables["hhea"]
+        ascent, descent = struct.unpack_from(">2h", self.data, hhea + 4)
+        self.ascent, self.descent = self._scale(ascent), self._scale(descent)
+        metrics_count = struct.unpack_from(">H", self.data, hhea + 34)[0]
+        glyph_count = struct.unpack_from(">H", self.data, tables["maxp"] + 4)[0]
+
+        hmtx = tables["hmtx"]
+        widths = [struct.unpack_from(">H", self.data, hmtx + 4 * i)[0] for i in range(metrics_count)]
+        # Глифы после numberOfHMetrics наследуют ширину последнего
+        widths += [widths[-1]] * (glyph_count - metrics_count)
+        self.widths = [self._scale(w) for w in widths]
+
+        self.cmap = self._read_cmap(tables["cmap"])
+        self.name = re.sub(r"[^A-Za-z0-9-]", "", Path(path).stem) or "Font"
+
+    def _tables(self) -> Dict[str, int]:
+        count = struct.unpack_from(">H", self.data, 4)[0]
+        tables = {}
+        for i in range(count):
+            tag, _, offset, _ = struct.unpack_from(">4sIII", self.data, 12 + 16 * i)
+            tables[tag.decode("latin-1")] = offset
+        missing = {"head", "hhea", "hmtx", "maxp", "cmap"} - tables.keys()
+        if missing:
+            raise ValueError(f"{self.path}: не TrueType-шрифт (нет таблиц {', '.join(sorted(missing))})")
+        return tables
+
+    def _scale(self, value: int) -> int:
+        # Единицы шрифта -> тысячные доли кегля, как принято в PDF
+        return round(value * 1000 / self.units_per_em)
+
+    def _read_cmap(self, cmap: int) -> Dict[int, int]:
+        count = struct.unpack_from(">H", self.data, cmap + 2)[0]
+        subtables = {}
+        for i in range(count):
+            platform, encoding, offset = struct.unpack_from(">HHI", self.data, cmap + 4 + 8 * i)
+            subtables[(platform, encoding)] = cmap + offset
+        # Предпочитаем полный Unicode (формат 12), затем BMP (формат 4)
+        for key in ((3, 10), (0, 6), (0, 4), (3, 1), (0, 3), (0, 2), (0, 1), (0, 0)):
+            if key not in subtables:
+                continue
+            offset = subtables[key]
+            fmt = struct.unpack_from(">H", self.data, offset)[0]
+            if fmt == 12:
+                return self._read_cmap12(offset)
+            if fmt == 4:
+                return self._read_cmap4(offset)
+        raise ValueError(f"{self.path}: нет Unicode-таблицы cmap формата 4 или 12")
+
+    def _read_cmap4(self, offset: int) -> Dict[int, int]:
+        seg_count = struct.unpack_from(">H", self.data, offset + 6)[0] // 2
+        ends = offset + 14
+        starts = ends + 2 * seg_count + 2
+        deltas = starts + 2 * seg_count
+        range_offsets = deltas + 2 * seg_count
+        mapping = {}
+        for i in range(seg_count):
+            end = struct.unpack_from(">H", self.data, ends + 2 * i)[0]
+            start = struct.unpack_from(">H", self.data, starts + 2 * i)[0]
+            delta = struct.unpack_from(">h", self.data, deltas + 2 * i)[0]
+            range_offset = struct.unpack_from(">H", self.data, range_offsets + 2 * i)[0]
+            for code in range(start, min(end, 0xFFFE) + 1):
+                if range_offset:
+                    at = range_offsets + 2 * i + range_offset + 2 * (code - start)
+                    glyph = struct.unpack_from(">H", self.data, at)[0]
+                    glyph = (glyph + delta) & 0xFFFF if glyph else 0
+                else:
+                    glyph = (code + delta) & 0xFFFF
+                if glyph:
+                    mapping[code] = glyph
+        return mapping
+
+    def _read_cmap12(self, offset: int) -> Dict[int, int]:
+        groups = struct.unpack_from(">I", self.data, offset + 12)[0]
+        mapping = {}
+        for i in range(groups):
+            start, end, glyph = struct.unpack_from(">III", self.data, offset + 16 + 12 * i)
+            for code in range(start, end + 1):
+                mapping[code] = glyph + code - start
+        return mapping
+
+    def glyph(self, char: str) -> int:
+        return self.cmap.get(ord(char), 0)
+
+    def text_width(self, text: str) -> float:
+        """Ширина строки в пунктах при кегле FONT_SIZE."""
+        return sum(self.widths[self.glyph(char)] for char in text) * FONT_SIZE / 1000
+
+
+@lru_cache(maxsize=4)
+def _load_font(path: str) -> _TrueTypeFont:
+    if not path or not os.path.exists(path):
+        raise FileNotFoundError(
+            f"Шрифт для PDF не найден: {path!r}. Укажите TrueType-шрифт с кириллицей в pdf_font_path "
+            f"(например, пакет fonts-dejavu-core)"
+        )
+    font = _TrueTypeFont(path)
+    logger.info(f"Шрифт PDF загружен: {path} (глифов: {len(font.widths)})")
+    return font
+
+
+@lru_cache(maxsize=4)
+def _compressed_font_file(path: str) -> bytes:
+    return zlib.compress(_load_font(path).data)
+
+
+def _to_unicode_cmap(glyphs: Dict[int, str]) -> bytes:
+    entries = sorted(glyphs.items())
+    lines = [
+        "/CIDInit /ProcSet findresource begin",
+        "12 dict begin",
+        "begincmap",
+        "/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) /Supplement 0 >> def",
+        "/CMapName /Adobe-Identity-UCS def",
+        "/CMapType 2 def",
+        "1 begincodespacerange",
+        "<0000> <FFFF>",
+        "endcodespacerange",
+    ]
+    # В одном блоке bfchar допускается не больше 100 записей
+    for start in range(0, len(entries), 100):
+        block = entries[start:start + 100]
+        lines.append(f"{len(block)} beginbfchar")
+        lines += [f"<{glyph:04X}> <{char.encode('utf-16-be').hex().upper()}>" for glyph, char in block]
+        lines.append("endbfchar")
+    lines += [
+        "endcmap",
+        "CMapName currentdict /CMap defineresource pop",
+        "end",
+        "end",
+    ]
+    return "\n".join(lines).encode("ascii")
+
+
+class PdfTranscriptWriter:
+    """
+    Потоковая запись PDF из потока сегментов.
+    Каждая заполненная страница сразу уходит в файл (<путь>.part), в памяти хранятся
+    только строки текущей страницы, смещения объектов для таблицы xref и набор использованных глифов.
+    Текст набирается встроенным TrueType-шрифтом (settings.pdf_font_path), кириллица не теряется.
+    """
+
+    def __init__(self, output_pdf_path: str | Path, font_path: str | None = None):
+        self.output_pdf_path = Path(output_pdf_path)
+        self.output_pdf_path.parent.mkdir(parents=True, exist_ok=True)
+        self.part_path = self.output_pdf_path.with_name(self.output_pdf_path.name + ".part")
+
+        font_path = font_path or settings.pdf_font_path
+        self._font = _load_font(font_path)
+        font_file = _compressed_font_file(font_path)
+
+        self._file = open(self.part_path, "wb")
+        self._offsets = {}
+        self._page_ids: List[int] = []
+        self._next_id = _TO_UNICODE + 1
+        self._lines: List[str] = []
+        self._current = ""
+        self._used: Dict[int, str] = {}
+
+        self._file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self._object(_FONT_FILE, b"<< /Length %d /Length1 %d /Filter /FlateDecode >>\nstream\n" % (
+            len(font_file), len(self._font.data)) + font_file + b"\nendstream")
+        self._object(_DESCRIPTOR, (
+            b"<< /Type /FontDescriptor /FontName /%s /Flags 32 /FontBBox [%d %d %d %d] /ItalicAngle 0 "
+            b"/Ascent %d /Descent %d /CapHeight %d /StemV 80 /FontFile2 %d 0 R >>"
+        ) % (self._font.name.encode("ascii"), *self._font.bbox,
+             self._font.ascent, self._font.descent, self._font.ascent, _FONT_FILE))
+
+    def _object(self, obj_id: int, body: bytes) -> None:
+        self._offsets[obj_id] = self._file.tell()
+        self._file.write(b"%d 0 obj\n" % obj_id + body + b"\nendobj\n")
+
+    def _new_id(self) -> int:
+        obj_id = self._next_id
+        self._next_id += 1
+        return obj_id
+
+    def write(self, text: str) -> None:
+        # Сегменты продолжают текущую строку, перенос — по словам с учётом ширин глифов
+        for word in text.split():
+            self._add_word(word)
+
+    def _add_word(self, word: str) -> None:
+        candidate = f"{self._current} {word}" if self._current else word
+        if self._font.text_width(candidate) <= LINE_WIDTH:
+            self._current = candidate
+            return
+        if self._current:
+            self._add_line(self._current)
+        # Слово шире строки режется по символам
+        while self._font.text_width(word) > LINE_WIDTH:
+            cut = 1
+            while cut < len(word) and self._font.text_width(word[:cut + 1]) <= LINE_WIDTH:
+                cut += 1
+            self._add_line(word[:cut])
+            word = word[cut:]
+        self._current = word
+
+    def _add_line(self, line: str) -> None:
+        self._lines.append(line)
+        if len(self._lines) >= PAGE_LINES:
+            self._write_page()
+
+    def _encode(self, line: str) -> bytes:
+        # Identity-H: строка — последовательность двухбайтовых номеров глифов
+        glyphs = []
+        for char in line:
+            glyph = self._font.glyph(char)
+            if glyph:
+                self._used.setdefault(glyph, char)
+            glyphs.append(glyph)
+        return b"".join(b"%04X" % glyph for glyph in glyphs)
+
+    def _write_page(self) -> None:
+        content = b"BT /F1 %d Tf %d TL %.2f %.2f Td\n" % (FONT_SIZE, LEADING, MARGIN, PAGE_HEIGHT - MARGIN - FONT_SIZE)
+        content += b"".join(b"<" + self._encode(line) + b"> Tj T*\n" for line in self._lines)
+        content += b"ET"
+        self._lines = []
+
+        content_id, page_id = self._new_id(), self._new_id()
+        self._object(content_id, b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        self._object(page_id, (
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %.2f %.2f] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>"
+        ) % (_PAGES, PAGE_WIDTH, PAGE_HEIGHT, _FONT, content_id))
+        self._page_ids.append(page_id)
+
+    def _write_font(self) -> None:
+        # Ширины и ToUnicode известны только после набора всего текста — пишутся в конце
+        name = self._font.name.encode("ascii")
+        widths = b" ".join(b"%d [%d]" % (glyph, self._font.widths[glyph]) for glyph in sorted(self._used))
+        self._object(_CID_FONT, (
+            b"<< /Type /Font /Subtype /CIDFontType2 /BaseFont /%s "
+            b"/CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) /Supplement 0 >> "
+            b"/FontDescriptor %d 0 R /DW %d /W [%s] /CIDToGIDMap /Identity >>"
+        ) % (name, _DESCRIPTOR, self._font.widths[0], widths))
+        to_unicode = _to_unicode_cmap(self._used)
+        self._object(_TO_UNICODE, b"<< /Length %d >>\nstream\n" % len(to_unicode) + to_unicode + b"\nendstream")
+        self._object(_FONT, (
+            b"<< /Type /Font /Subtype /Type0 /BaseFont /%s /Encoding /Identity-H "
+            b"/DescendantFonts [%d 0 R] /ToUnicode %d 0 R >>"
+        ) % (name, _CID_FONT, _TO_UNICODE))
+
+    def close(self) -> Path:
+        if self._current:
+            self._add_line(self._current)
+            self._current = ""
+        if self._lines or not self._page_ids:
+            self._write_page()
+        self._write_font()
+
+        kids = b" ".join(b"%d 0 R" % page_id for page_id in self._page_ids)
+        self._object(_PAGES, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self._page_ids)))
+        self._object(_CATALOG, b"<< /Type /Catalog /Pages %d 0 R >>" % _PAGES)
+
+        xref_offset = self._file.tell()
+        size = self._next_id
+        xref = [b"xref\n0 %d\n" % size, b"0000000000 65535 f \n"]
+        xref += [b"%010d 00000 n \n" % self._offsets[obj_id] for obj_id in range(1, size)]
+        self._file.write(b"".join(xref))
+        self._file.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, _CATALOG, xref_offset))
+        self._file.close()
+
+        os.replace(self.part_path, self.output_pdf_path)
+        logger.info(f"PDF создан: {self.output_pdf_path} (страниц: {len(self._page_ids)})")
+        return self.output_pdf_path
+
+    def abort(self) -> None:
+        self._file.close()
+        if self.part_path.exists():
+            os.remove(self.part_path)
+
+
 def generate_pdf_from_textfile(text_file_path: str | Path, output_pdf_path: str | Path) -> bool:
     """
     Создает PDF из указанного текстового файла и сохраняет его по указанному пути.
     """
+    writer = None
     try:
         text_file_path = Path(text_file_path)
-        output_pdf_path = Path(output_pdf_path)
-
-        # Убедимся, что директория существует
-        output_pdf_path.parent.mkdir(parents=True, exist_ok=True)
+        writer = PdfTranscriptWriter(output_pdf_path)
 
-        # Читаем содержимое текстового файла
+        # Читаем текстовый файл построчно, не загружая его целиком
         with open(text_file_path, "r", encoding="utf-8") as file:
-            text = file.read()
-
-        # Генерируем PDF
-        pdf = FPDF()
-        pdf.add_page()
-        pdf.set_font("Arial", size=12)
-        pdf.multi_cell(0, 10, txt=text)
-        pdf.output(str(output_pdf_path))
+            for line in file:
+                writer.write(line.strip())
 
-        logger.info(f"PDF создан: {output_pdf_path}")
+        writer.close()
         return True
 
     except Exception as e:
         logger.exception(f"Ошибка при создании PDF из {text_file_path}")
+        if writer is not None:
+            writer.abort()
         return False
@@ -0,0 +1,172 @@
+# app/utils/transcript_writer.py
+
+import os
+import json
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Iterable, List, Dict, Any, Optional
+
+from app.core.logging_config import setup_logger
+from app.utils.pdf_generator import PdfTranscriptWriter
+
+logger = setup_logger(__name__)
+
+SUPPORTED_FORMATS = ("pdf", "txt", "srt", "vtt", "json")
+
+
+def _timestamp(seconds: float, separator: str) -> str:
+    millis = int(round(max(seconds, 0.0) * 1000))
+    hours, millis = divmod(millis, 3_600_000)
+    minutes, millis = divmod(millis, 60_000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{millis:03d}"
+
+
+class _TextFileWriter(ABC):
+    def __init__(self, path: Path):
+        self.path = path
+        self.part_path = path.with_name(path.name + ".part")
+        self.file = open(self.part_path, "w", encoding="utf-8")
+        self.count = 0
+
+    @abstractmethod
+    def write(self, segment: Dict[str, Any]) -> None:
+        ...
+
+    def close(self) -> Path:
+        self.file.close()
+        os.replace(self.part_path, self.path)
+        return self.path
+
+    def abort(self) -> None:
+        self.file.close()
+        if self.part_path.exists():
+            os.remove(self.part_path)
+
+
+class _TxtWriter(_TextFileWriter):
+    def write(self, segment):
+        self.file.write((" " if self.count else "") + segment["text"])
+        self.count += 1
+
+
+class _SrtWriter(_TextFileWriter):
+    def write(self, segment):
+        self.count += 1
+        self.file.write(
+            f"{self.count}\n"
+            f"{_timestamp(segment['start'], ',')} --> {_timestamp(segment['end'], ',')}\n"
+            f"{segment['text']}\n\n"
+        )
+
+
+class _VttWriter(_TextFileWriter):
+    def __init__(self, path: Path):
+        super().__init__(path)
+        self.file.write("WEBVTT\n\n")
+
+    def write(self, segment):
+        self.count += 1
+        self.file.write(
+            f"{_timestamp(segment['start'], '.')} --> {_timestamp(segment['end'], '.')}\n"
+            f"{segment['text']}\n\n"
+        )
+
+
+class _JsonWriter(_TextFileWriter):
+    def __init__(self, path: Path, meta: Optional[Dict[str, Any]] = None):
+        super().__init__(path)
+        header = json.dumps(meta or {}, ensure_ascii=False)[:-1]
+        self.file.write(header + (", " if meta else "") + '"segments": [')
+
+    def write(self, segment):
+        self.file.write(("," if self.count else "") + "\n  " + json.dumps(segment, ensure_ascii=False))
+        self.count += 1
+
+    def close(self) -> Path:
+        self.file.write("\n]}\n")
+        return super().close()
+
+
+class _PdfWriter:
+    def __init__(self, path: Path):
+        self.path = path
+        self.pdf = PdfTranscriptWriter(path)
+
+    def write(self, segment):
+        self.pdf.write(segment["text"])
+
+    def close(self) -> Path:
+        return self.pdf.close()
+
+    def abort(self) -> None:
+        self.pdf.abort()
+
+
+class TranscriptWriter:
+    """
+    Записывает поток сегментов сразу во все запрошенные форматы за один проход.
+    Текстовые форматы пишутся во временные .part-файлы и переименовываются только при успехе.
+    """
+
+    def __init__(self, base_path: str | Path, formats: Iterable[str], meta: Optional[Dict[str, Any]] = None):
+        base_path = Path(base_path)
+        base_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.writers = []
+        try:
+            for fmt in dict.fromkeys(formats):
+                path = base_path.with_suffix(f".{fmt}")
+                if fmt == "pdf":
+                    self.writers.append(_PdfWriter(path))
+                elif fmt == "txt":
+                    self.writers.append(_TxtWriter(path))
+                elif fmt == "srt":
+                    self.writers.append(_SrtWriter(path))
+                elif fmt == "vtt":
+                    self.writers.append(_VttWriter(path))
+                elif fmt == "json":
+                    self.writers.append(_JsonWriter(path, meta))
+                else:
+                    raise ValueError(f"Неизвестный формат вывода: {fmt}")
+        except Exception:
+            self.abort()
+            raise
+
+    def write(self, segment: Dict[str, Any]) -> None:
+        if not segment.get("text"):
+            return
+        for writer in self.writers:
+            writer.write(segment)
+
+    def close(self) -> List[Path]:
+        return [writer.close() for writer in self.writers]
+
+    def abort(self) -> None:
+        for writer in self.writers:
+            writer.abort()
+
+    def __enter__(self) -> "TranscriptWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            self.abort()
+
+
+def write_transcript(
+    base_path: str | Path,
+    segments: Iterable[Dict[str, Any]],
+    formats: Iterable[str],
+    meta: Optional[Dict[str, Any]] = None,
+) -> List[Path]:
+    """
+    Записывает сегменты во все форматы и возвращает пути к созданным файлам.
+    """
+    with TranscriptWriter(base_path, formats, meta) as writer:
+        for segment in segments:
+            writer.write(segment)
+        paths = writer.close()
+
+    logger.info(f"Транскрипт записан: {', '.join(p.name for p in paths)}")
+    return paths
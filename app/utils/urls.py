@@ -0,0 +1,57 @@
+# app/utils/urls.py
+import re
+from typing import Optional
+from urllib.parse import urlparse, parse_qs, urlencode
+
+_VIDEO_ID_RE = re.compile(r"^[A-Za-z0-9_-]{11}$")
+_TRACKING_PARAMS = {"si", "feature", "pp", "t", "start", "index", "ab_channel"}
+
+
+def extract_video_id(url: str) -> Optional[str]:
+    """
+    Достаёт идентификатор видео YouTube из ссылки.
+    Для плейлистов и нераспознанных ссылок возвращает None.
+    """
+    try:
+        parsed = urlparse(url.strip())
+    except ValueError:
+        return None
+
+    host = (parsed.hostname or "").lower()
+    candidate = None
+
+    if host.endswith("youtu.be"):
+        candidate = parsed.path.lstrip("/").split("/")[0]
+    elif host.endswith("youtube.com"):
+        if parsed.path == "/watch":
+            candidate = parse_qs(parsed.query).get("v", [None])[0]
+        else:
+            parts = parsed.path.strip("/").split("/")
+            if len(parts) >= 2 and parts[0] in ("shorts", "embed", "live", "v"):
+                candidate = parts[1]
+
+    if candidate and _VIDEO_ID_RE.match(candidate):
+        return candidate
+    return None
+
+
+def normalize_url(url: str) -> str:
+    """
+    Каноническая форма ссылки для сравнения запросов:
+    yt:video:<id> для видео, yt:playlist:<id> для плейлистов,
+    иначе ссылка без трекинговых параметров и с отсортированным query.
+    """
+    parsed = urlparse(url.strip())
+    query = parse_qs(parsed.query)
+
+    playlist_id = query.get("list", [None])[0]
+    if playlist_id and "v" not in query:
+        return f"yt:playlist:{playlist_id}"
+
+    video_id = extract_video_id(url)
+    if video_id and not playlist_id:
+        return f"yt:video:{video_id}"
+
+    kept = sorted((k, v) for k, values in query.items() if k not in _TRACKING_PARAMS for v in values)
+    host = (parsed.hostname or "").lower().removeprefix("www.").removeprefix("m.")
+    return f"{host}{parsed.path.rstrip('/')}?{urlencode(kept)}"
@@ -0,0 +1,252 @@
+# benchmarks/run.py
+"""
+Бенчмарк конвейера транскрипции без сети, Redis и настоящих моделей.
+
+    python -m benchmarks.run --duration 300 --playlist-items 4 --cost-rtf 0.05
+    python -m benchmarks.run --compare benchmarks/results/<предыдущий>.json
+
+Синтетическое аудио генерируется ffmpeg, загрузчик и модели заменяются заглушками
+(benchmarks/stubs.py), Celery работает в eager-режиме с результатами в памяти.
+Для каждой стадии считаются время, RTF (секунд работы на секунду аудио),
+пиковый RSS за время стадии и файлов в час; отчёт сохраняется в JSON для сравнения между релизами.
+"""
+
+import os
+import json
+import uuid
+import glob
+import shutil
+import resource
+import argparse
+import threading
+import tempfile
+import subprocess
+import time
+from datetime import datetime
+from typing import Callable, Dict, Any, Optional
+
+
+def _configure_env(work_dir: str) -> None:
+    # Настройки читаются при импорте app.core.config, поэтому задаются до импорта приложения
+    os.environ.update({
+        "TASKS_DIR": os.path.join(work_dir, "tasks"),
+        "DOWNLOADS_DIR": os.path.join(work_dir, "downloads"),
+        # Индекс и логи прогонов не должны попадать в рабочее дерево и в индекс сервиса
+        "SEARCH_INDEX_PATH": os.path.join(work_dir, "search.db"),
+        "LOG_DIR": os.path.join(work_dir, "logs"),
+        "TRANSCRIPT_CACHE_ENABLED": "false",
+        "MODEL_AFFINITY_ROUTING": "false",
+        "PROGRESS_EVENTS_ENABLED": "false",
+        "MODELS_PRELOAD": "false",
+    })
+
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def _rss_bytes(pid: int) -> int:
+    """
+    RSS процесса вместе с его потомками (ffmpeg, пулы процессов) по /proc.
+    """
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            total = int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return 0
+    for children in glob.glob(f"/proc/{pid}/task/*/children"):
+        try:
+            with open(children) as f:
+                total += sum(_rss_bytes(int(child)) for child in f.read().split())
+        except OSError:
+            pass
+    return total
+
+
+class _RssSampler:
+    """
+    Пиковый RSS за время одной стадии: фоновый поток опрашивает /proc каждые interval_s.
+    ru_maxrss для этого не годится — это максимум за всю жизнь процесса, и после первой
+    тяжёлой стадии все следующие показывали бы то же значение.
+    """
+
+    def __init__(self, interval_s: float = 0.01):
+        self.interval_s = interval_s
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while True:
+            self.peak = max(self.peak, _rss_bytes(os.getpid()))
+            if self._stop.wait(self.interval_s):
+                return
+
+    def __enter__(self) -> "_RssSampler":
+        self.peak = _rss_bytes(os.getpid())
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    @property
+    def peak_mb(self) -> float:
+        if not self.peak:
+            # Без /proc (не Linux) остаётся только максимум за жизнь процесса, в килобайтах
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        return self.peak / 2 ** 20
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def measure(name: str, fn: Callable[[], Any], audio_s: float, files: int = 1) -> Dict[str, Any]:
+    with _RssSampler() as rss:
+        started = time.perf_counter()
+        fn()
+        wall = time.perf_counter() - started
+    result = {
+        "wall_s": round(wall, 3),
+        "audio_s": audio_s,
+        "rtf": round(wall / audio_s, 4) if audio_s else None,
+        "peak_rss_mb": round(rss.peak_mb, 1),
+        "files_per_hour": round(files * 3600 / wall, 1) if wall else None,
+    }
+    print(f"{name:<24} {result['wall_s']:>9.3f} с  RTF {result['rtf']:<8} "
+          f"RSS {result['peak_rss_mb']:>8.1f} МБ  {result['files_per_hour']:>10} файлов/ч")
+    return result
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    work_dir = tempfile.mkdtemp(prefix="bench_")
+    _configure_env(work_dir)
+
+    from benchmarks.stubs import StubDownloader, install_stubs
+    from benchmarks.synthetic_audio import generate_audio
+
+    from app.celery_app import celery
+    celery.conf.update(
+        task_always_eager=True,
+        task_eager_propagates=True,
+        task_store_eager_result=True,
+        result_backend="cache+memory://",
+    )
+
+    from app.services import transcriber
+    from app.services.audio import iter_pcm
+    from app.services.tasks import process_download_task
+    from app.utils.pdf_generator import generate_pdf_from_textfile
+    from app.utils.transcript_writer import write_transcript
+
+    StubDownloader.playlist_items = args.playlist_items
+    install_stubs(args.cost_rtf, args.audio_dir, args.duration)
+
+    source = generate_audio(os.path.join(args.audio_dir, f"speech_{int(args.duration)}s.mp3"), args.duration)
+
+    def fresh_copy() -> str:
+        target = os.path.join(work_dir, f"{uuid.uuid4().hex}.mp3")
+        shutil.copyfile(source, target)
+        return target
+
+    duration = args.duration
+    stages: Dict[str, Any] = {}
+    segments = transcriber.transcribe_with_whisper(source, "small")
+    text = transcriber.segments_to_text(segments)
+
+    stages["ffmpeg_decode"] = measure("ffmpeg_decode", lambda: sum(len(c) for c in iter_pcm(source)), duration)
+    stages["vosk_stub"] = measure("vosk_stub", lambda: transcriber.transcribe_with_vosk(source), duration)
+    stages["whisper_stub"] = measure(
+        "whisper_stub", lambda: transcriber.transcribe_with_whisper(source, "small"), duration
+    )
+
+    txt_path = os.path.join(work_dir, "legacy.txt")
+    with open(txt_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    stages["pdf_from_textfile"] = measure(
+        "pdf_from_textfile",
+        lambda: generate_pdf_from_textfile(txt_path, os.path.join(work_dir, "legacy.pdf")),
+        duration,
+    )
+    stages["write_all_formats"] = measure(
+        "write_all_formats",
+        lambda: write_transcript(os.path.join(work_dir, "formats"), segments, ["pdf", "txt", "srt", "vtt", "json"]),
+        duration,
+    )
+    stages["transcribe_file"] = measure(
+        "transcribe_file", lambda: transcriber.transcribe_file(fresh_copy(), "whisper-small"), duration
+    )
+
+    def run_task(url: str) -> None:
+        task_id = str(uuid.uuid4())
+        result = process_download_task.apply(args=[task_id, url, 128, 4, "whisper-small"], task_id=task_id).get()
+        if result.get("status") != "completed":
+            raise RuntimeError(f"Задача {task_id} завершилась со статусом {result.get('status')}: {result}")
+
+    stages["celery_video"] = measure(
+        "celery_video", lambda: run_task("https://www.youtube.com/watch?v=benchmark00"), duration
+    )
+    stages["celery_playlist"] = measure(
+        "celery_playlist",
+        lambda: run_task("https://www.youtube.com/playlist?list=PLbenchmark"),
+        duration * args.playlist_items,
+        files=args.playlist_items,
+    )
+
+    shutil.rmtree(work_dir, ignore_errors=True)
+    return {
+        "revision": _git_revision(),
+        "timestamp": datetime.now().isoformat(),
+        "params": {
+            "duration_s": args.duration,
+            "playlist_items": args.playlist_items,
+            "cost_rtf": args.cost_rtf,
+        },
+        "stages": stages,
+    }
+
+
+def compare(current: Dict[str, Any], previous_path: str) -> None:
+    with open(previous_path, "r", encoding="utf-8") as f:
+        previous = json.load(f)
+
+    print(f"\nСравнение с {previous.get('revision')} ({previous.get('timestamp')}):")
+    for name, stage in current["stages"].items():
+        before = previous.get("stages", {}).get(name)
+        if not before or not before.get("wall_s"):
+            print(f"{name:<24} нет данных")
+            continue
+        delta = (stage["wall_s"] - before["wall_s"]) / before["wall_s"] * 100
+        print(f"{name:<24} {before['wall_s']:>9.3f} → {stage['wall_s']:>9.3f} с  ({delta:+.1f}%)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Бенчмарк конвейера транскрипции")
+    parser.add_argument("--duration", type=float, default=120.0, help="Длительность синтетического аудио, с")
+    parser.add_argument("--playlist-items", type=int, default=4, help="Файлов в синтетическом плейлисте")
+    parser.add_argument("--cost-rtf", type=float, default=0.0, help="Имитация стоимости инференса заглушек")
+    parser.add_argument("--audio-dir", default="benchmarks/.audio", help="Кэш сгенерированного аудио")
+    parser.add_argument("--output", default="benchmarks/results", help="Каталог для JSON-отчётов")
+    parser.add_argument("--compare", help="JSON-отчёт предыдущего прогона для сравнения")
+    args = parser.parse_args()
+
+    report = run(args)
+
+    os.makedirs(args.output, exist_ok=True)
+    report_path = os.path.join(args.output, f"{datetime.now():%Y%m%d_%H%M%S}_{report['revision'] or 'local'}.json")
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nОтчёт сохранён: {report_path}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+# benchmarks/stubs.py
+
+import os
+import json
+import time
+import shutil
+from collections import namedtuple
+from typing import List, Optional
+
+from benchmarks.synthetic_audio import generate_audio
+
+CANNED_PHRASES = [
+    "the quick brown fox jumps over the lazy dog",
+    "this is a synthetic benchmark transcript segment",
+    "performance numbers should be compared between releases",
+    "speech recognition replay from canned segments",
+]
+SEGMENT_S = 5.0
+
+StubSegment = namedtuple("StubSegment", ["start", "end", "text"])
+StubInfo = namedtuple("StubInfo", ["language", "duration"])
+
+
+class StubWhisperModel:
+    """
+    Заменитель WhisperModel: отдаёт заготовленные сегменты каждые SEGMENT_S секунд аудио.
+    cost_rtf имитирует стоимость инференса (секунд счёта на секунду аудио).
+    """
+
+    def __init__(self, cost_rtf: float = 0.0):
+        self.cost_rtf = cost_rtf
+
+    def transcribe(self, audio, **kwargs):
+        duration = len(audio) / 16000
+
+        def segments():
+            position, i = 0.0, 0
+            while position < duration:
+                end = min(duration, position + SEGMENT_S)
+                if self.cost_rtf:
+                    time.sleep((end - position) * self.cost_rtf)
+                yield StubSegment(position, end, CANNED_PHRASES[i % len(CANNED_PHRASES)])
+                position, i = end, i + 1
+
+        return segments(), StubInfo("en", duration)
+
+
+class StubKaldiRecognizer:
+    """
+    Заменитель KaldiRecognizer: выдаёт заготовленный результат на каждые SEGMENT_S секунд PCM.
+    """
+
+    def __init__(self, model, sample_rate: int, cost_rtf: float = 0.0):
+        self.sample_rate = sample_rate
+        self.cost_rtf = cost_rtf
+        self.position = 0.0
+        self.segment_start = 0.0
+        self.count = 0
+
+    def SetWords(self, enabled: bool) -> None:
+        pass
+
+    def AcceptWaveform(self, data: bytes) -> bool:
+        seconds = len(data) / 2 / self.sample_rate
+        if self.cost_rtf:
+            time.sleep(seconds * self.cost_rtf)
+        self.position += seconds
+        return self.position - self.segment_start >= SEGMENT_S
+
+    def _result(self) -> str:
+        text = CANNED_PHRASES[self.count % len(CANNED_PHRASES)] if self.position > self.segment_start else ""
+        words = [{"word": text, "start": self.segment_start, "end": self.position}] if text else []
+        self.segment_start = self.position
+        self.count += 1
+        return json.dumps({"text": text, "result": words})
+
+    def Result(self) -> str:
+        return self._result()
+
+    def PartialResult(self) -> str:
+        return json.dumps({"partial": ""})
+
+    def FinalResult(self) -> str:
+        return self._result()
+
+
+class StubDownloader:
+    """
+    Заменитель YouTubeAudioDownloader: «скачивает» синтетические файлы из локального кэша.
+    Для ссылок на плейлист отдаёт playlist_items файлов.
+    """
+
+    audio_dir = "benchmarks/.audio"
+    duration_s = 60.0
+    playlist_items = 4
+
+    def __init__(self, task_dir: str):
+        self.task_dir = task_dir
+
+    def download_content(self, url: str, quality: int, max_workers: int, max_retries=3, on_item=None,
+                         keep_audio=False, skip_item=None):
+        count = self.playlist_items if ("list=" in url or "playlist" in url) else 1
+        source = generate_audio(
+            os.path.join(self.audio_dir, f"speech_{int(self.duration_s)}s.mp3"), self.duration_s
+        )
+
+        files: List[str] = []
+        for i in range(count):
+            entry = {"id": f"bench{i + 1}", "url": url, "index": i + 1}
+            if skip_item and skip_item(entry):
+                continue
+            target = os.path.join(self.task_dir, f"bench_pos{i + 1}.mp3")
+            shutil.copyfile(source, target)
+            files.append(target)
+            if on_item:
+                on_item(target, entry["id"])
+        return files if count > 1 else files[0] if files else None
+
+
+def install_stubs(cost_rtf: float = 0.0, audio_dir: Optional[str] = None, duration_s: Optional[float] = None) -> None:
+    """
+    Подменяет загрузчик и модели в модулях приложения заглушками.
+    """
+    from app.services import transcriber, downloader
+
+    stub_model = StubWhisperModel(cost_rtf)
+    transcriber.get_whisper_model = lambda model_size="small": stub_model
+    transcriber.get_vosk_model = lambda model_name="vosk": None
+    transcriber.KaldiRecognizer = lambda model, sample_rate: StubKaldiRecognizer(model, sample_rate, cost_rtf)
+
+    if audio_dir:
+        StubDownloader.audio_dir = audio_dir
+    if duration_s:
+        StubDownloader.duration_s = duration_s
+    downloader.YouTubeAudioDownloader = StubDownloader
@@ -0,0 +1,33 @@
+# benchmarks/synthetic_audio.py
+
+import os
+import subprocess
+
+# Гармонический сигнал с «плавающей» основной частотой и паузами —
+# грубо похож на речь по спектру и чередованию звука/тишины
+SPEECH_LIKE_EXPR = (
+    "(0.5*sin(2*PI*(140+40*sin(2*PI*0.7*t))*t)"
+    "+0.25*sin(4*PI*(140+40*sin(2*PI*0.7*t))*t)"
+    "+0.1*sin(6*PI*(140+40*sin(2*PI*0.7*t))*t))"
+    "*gt(sin(2*PI*0.25*t)+0.3*sin(2*PI*1.3*t),-0.2)"
+)
+
+
+def generate_audio(path: str, duration_s: float, bitrate_kbps: int = 128) -> str:
+    """
+    Генерирует синтетический mp3 заданной длительности через ffmpeg (без сети).
+    Готовый файл переиспользуется, если уже существует.
+    """
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    subprocess.run(
+        [
+            "ffmpeg", "-nostdin", "-loglevel", "error", "-y",
+            "-f", "lavfi", "-i", f"aevalsrc='{SPEECH_LIKE_EXPR}':s=16000:d={duration_s}",
+            "-ac", "1", "-b:a", f"{bitrate_kbps}k", path,
+        ],
+        check=True,
+    )
+    return path
@@ -0,0 +1,60 @@
+# tests/test_admission.py
+"""
+Оценка работы запроса, приоритет в брокере и идентификация клиента для контроля допуска.
+"""
+
+import pytest
+
+from app.core.config import settings
+from app.services import admission
+
+VIDEO = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+PLAYLIST = "https://www.youtube.com/playlist?list=PL123"
+
+
+@pytest.fixture(autouse=True)
+def estimates(monkeypatch):
+    monkeypatch.setattr(settings, "admission_video_estimate_s", 900.0)
+    monkeypatch.setattr(settings, "admission_playlist_estimate_items", 20)
+    monkeypatch.setattr(settings, "admission_drain_rate", 10.0)
+    monkeypatch.setattr(settings, "admission_max_retry_after_s", 600)
+    monkeypatch.setattr(settings, "admission_trust_forwarded", False)
+
+
+def test_work_scales_with_duration_and_model_cost():
+    assert admission.estimate_work(VIDEO, ["whisper-small"]) == 900.0
+    assert admission.estimate_work(VIDEO, ["whisper-large-2"]) == 4500.0
+    assert admission.estimate_work(PLAYLIST, ["whisper-small"]) == 900.0 * 20
+    assert admission.estimate_work(VIDEO, ["whisper-small", "vosk-small-ru"]) == pytest.approx(900.0 * 1.3)
+
+
+def test_short_requests_get_higher_priority():
+    video = admission.priority_for(admission.estimate_work(VIDEO, ["whisper-small"]))
+    large = admission.priority_for(admission.estimate_work(VIDEO, ["whisper-large-2"]))
+    playlist = admission.priority_for(admission.estimate_work(PLAYLIST, ["whisper-small"]))
+    huge = admission.priority_for(admission.estimate_work(PLAYLIST, ["whisper-large-2", "whisper-medium"]))
+
+    assert video == 0
+    assert video < large < playlist < huge
+    assert huge == 9
+
+
+def test_retry_after_is_bounded():
+    assert admission._retry_after(0) == 1
+    assert admission._retry_after(95) == 10
+    assert admission._retry_after(10 ** 9) == 600
+
+
+def test_client_identity():
+    key_id = admission.client_identity("secret", "1.2.3.4", "10.0.0.1")
+    assert key_id.startswith("key:") and "secret" not in key_id
+    assert key_id == admission.client_identity("secret", None, None)
+    # Без доверия к прокси X-Forwarded-For подделывается клиентом и не учитывается
+    assert admission.client_identity(None, "1.2.3.4", "10.0.0.1") == "ip:10.0.0.1"
+    assert admission.client_identity(None, None, None) == "ip:unknown"
+
+
+def test_forwarded_for_is_used_behind_trusted_proxy(monkeypatch):
+    monkeypatch.setattr(settings, "admission_trust_forwarded", True)
+
+    assert admission.client_identity(None, "1.2.3.4, 10.0.0.2", "10.0.0.1") == "ip:1.2.3.4"
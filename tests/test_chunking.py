@@ -0,0 +1,60 @@
+# tests/test_chunking.py
+"""
+Стыковка сегментов фрагментов: сегмент из зоны перекрытия берётся у фрагмента,
+которому принадлежит его середина, повторённые на стыке слова удаляются.
+"""
+
+from app.services.chunking import stitch_chunks
+
+WINDOWS = [
+    {"start": 0.0, "end": 12.0, "own_start": 0.0, "own_end": 10.0},
+    {"start": 8.0, "end": 22.0, "own_start": 10.0, "own_end": 20.0},
+    {"start": 18.0, "end": 30.0, "own_start": 20.0, "own_end": 30.0},
+]
+
+
+def _segment(start, end, text):
+    return {"start": start, "end": end, "text": text}
+
+
+def test_overlap_segments_are_taken_from_owning_chunk():
+    chunks = [
+        [_segment(0.0, 4.0, "первый"), _segment(9.0, 12.0, "граница справа")],
+        [_segment(8.0, 9.5, "хвост соседа"), _segment(10.5, 15.0, "второй"), _segment(19.0, 22.0, "чужой")],
+        [_segment(19.5, 21.0, "третий"), _segment(25.0, 29.0, "конец")],
+    ]
+
+    stitched = stitch_chunks(WINDOWS, chunks)
+
+    assert [s["text"] for s in stitched] == ["первый", "второй", "третий", "конец"]
+    assert [s["start"] for s in stitched] == sorted(s["start"] for s in stitched)
+
+
+def test_words_repeated_at_the_seam_are_removed():
+    chunks = [
+        [_segment(6.0, 9.9, "Мы говорим о погоде, и")],
+        [_segment(10.0, 13.0, "погоде и ветре"), _segment(14.0, 16.0, "погоде")],
+        [],
+    ]
+
+    stitched = stitch_chunks(WINDOWS, chunks)
+
+    assert [s["text"] for s in stitched] == ["Мы говорим о погоде, и", "ветре", "погоде"]
+
+
+def test_segment_that_is_only_a_repeat_is_dropped():
+    chunks = [
+        [_segment(6.0, 9.9, "до свидания")],
+        [_segment(10.0, 11.0, "До свидания!"), _segment(12.0, 14.0, "привет")],
+        [],
+    ]
+
+    stitched = stitch_chunks(WINDOWS, chunks)
+
+    assert [s["text"] for s in stitched] == ["до свидания", "привет"]
+
+
+def test_no_overlap_keeps_text_unchanged():
+    chunks = [[_segment(1.0, 2.0, "один два")], [_segment(11.0, 12.0, "три четыре")], []]
+
+    assert [s["text"] for s in stitch_chunks(WINDOWS, chunks)] == ["один два", "три четыре"]
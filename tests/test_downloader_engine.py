@@ -0,0 +1,298 @@
+# tests/test_downloader_engine.py
+"""
+Движок загрузки против локального HTTP-сервера с поддержкой Range и заглушки экстрактора:
+параллельные загрузки, докачка .part, повторы после временных ошибок.
+"""
+
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.core.config import settings
+from app.services.downloader_engine import YouTubeAudioDownloader
+
+STREAM_SIZE = 256 * 1024
+
+
+class StreamServer:
+    """
+    Отдаёт /<id> как поток из STREAM_SIZE байт. Сбои задаются по id:
+    fail_status — коды ответов первых запросов, truncate — сколько раз оборвать поток на середине,
+    ignore_range — отвечать 206 всегда с начала файла.
+    """
+
+    def __init__(self):
+        self.payloads = {}
+        self.fail_status = {}
+        self.truncate = {}
+        self.ignore_range = set()
+        self.delay_s = 0.0
+        self.requests = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server._handle(self)
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._httpd.server_port}"
+
+    def payload(self, item_id: str) -> bytes:
+        if item_id not in self.payloads:
+            self.payloads[item_id] = os.urandom(STREAM_SIZE)
+        return self.payloads[item_id]
+
+    def _handle(self, handler: BaseHTTPRequestHandler) -> None:
+        item_id = handler.path.lstrip("/")
+        range_header = handler.headers.get("Range")
+        with self._lock:
+            self.requests.append((item_id, range_header))
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            statuses = self.fail_status.get(item_id) or []
+            status = statuses.pop(0) if statuses else None
+            truncate = self.truncate.get(item_id, 0) > 0
+            if truncate:
+                self.truncate[item_id] -= 1
+        try:
+            time.sleep(self.delay_s)
+            data = self.payload(item_id)
+            if status:
+                handler.send_response(status)
+                handler.send_header("Content-Length", "0")
+                handler.end_headers()
+                return
+
+            start = int(range_header[len("bytes="):].split("-")[0]) if range_header else 0
+            if item_id in self.ignore_range:
+                start = 0
+            if start >= len(data):
+                handler.send_response(416)
+                handler.send_header("Content-Range", f"bytes */{len(data)}")
+                handler.send_header("Content-Length", "0")
+                handler.end_headers()
+                return
+
+            body = data[start:]
+            handler.send_response(206 if range_header else 200)
+            if range_header:
+                handler.send_header("Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}")
+            handler.send_header("Content-Length", str(len(body)))
+            handler.end_headers()
+            if truncate:
+                # Обрыв соединения посреди потока
+                handler.wfile.write(body[:len(body) // 2])
+                handler.close_connection = True
+                return
+            handler.wfile.write(body)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+    def __enter__(self) -> "StreamServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+class FakeExtractor:
+    def __init__(self, base_url: str, ids, ext: str = "webm"):
+        self.base_url = base_url
+        self.ids = list(ids)
+        self.ext = ext
+
+    def entries(self, url):
+        return [{"id": item_id, "url": f"{self.base_url}/{item_id}", "index": index}
+                for index, item_id in enumerate(self.ids, start=1)]
+
+    def resolve(self, entry):
+        return {"url": f"{self.base_url}/{entry['id']}", "ext": self.ext, "http_headers": {}, "upload_date": "20240131"}
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(settings, "download_retry_backoff_s", 0.0)
+    monkeypatch.setattr(settings, "download_retry_backoff_max_s", 0.0)
+    monkeypatch.setattr(settings, "download_chunk_bytes", 16 * 1024)
+    monkeypatch.setattr(settings, "max_download_workers", 4)
+
+
+@pytest.fixture
+def server():
+    with StreamServer() as server:
+        yield server
+
+
+def _download(tmp_path, server, ids, url="https://www.youtube.com/playlist?list=PLtest", ext="webm", **kwargs):
+    downloader = YouTubeAudioDownloader(str(tmp_path), extractor=FakeExtractor(server.base_url, ids, ext))
+    return downloader.download_content(url, 128, kwargs.pop("max_workers", 4), **kwargs)
+
+
+def _read(path) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_playlist_is_downloaded_in_parallel_and_in_order(tmp_path, server):
+    server.delay_s = 0.2
+    ids = [f"vid{i}" for i in range(4)]
+    done = []
+
+    files = _download(tmp_path, server, ids, max_workers=4, on_item=lambda path, item_id: done.append((path, item_id)))
+
+    assert [os.path.basename(p) for p in files] == [f"2024-01-31_pos{i}.webm" for i in range(1, 5)]
+    assert [_read(p) for p in files] == [server.payload(i) for i in ids]
+    assert sorted(done) == sorted(zip(files, ids))
+    assert server.max_active > 1
+    assert not list(tmp_path.glob("*.part"))
+
+
+def test_skipped_items_are_not_downloaded(tmp_path, server):
+    seen = []
+
+    def skip_item(entry):
+        seen.append(entry["id"])
+        return entry["id"] == "cached"
+
+    files = _download(tmp_path, server, ["cached", "fresh"], skip_item=skip_item)
+
+    assert sorted(seen) == ["cached", "fresh"]
+    assert [os.path.basename(p) for p in files] == ["2024-01-31_pos2.webm"]
+    assert [item_id for item_id, _ in server.requests] == ["fresh"]
+
+
+def test_fully_skipped_playlist_returns_empty_list(tmp_path, server):
+    assert _download(tmp_path, server, ["a", "b"], skip_item=lambda entry: True) == []
+    assert server.requests == []
+
+
+def test_workers_are_capped_by_max_workers(tmp_path, server):
+    server.delay_s = 0.1
+
+    _download(tmp_path, server, [f"vid{i}" for i in range(4)], max_workers=2)
+
+    assert server.max_active <= 2
+
+
+def test_single_video_returns_path(tmp_path, server):
+    path = _download(tmp_path, server, ["single"], url="https://www.youtube.com/watch?v=single00000")
+
+    assert _read(path) == server.payload("single")
+
+
+def test_existing_part_is_resumed_with_range(tmp_path, server):
+    data = server.payload("vid")
+    (tmp_path / "2024-01-31_pos1.webm.part").write_bytes(data[:1000])
+
+    [path] = _download(tmp_path, server, ["vid"])
+
+    assert _read(path) == data
+    assert server.requests == [("vid", "bytes=1000-")]
+
+
+def test_complete_part_is_accepted_on_416(tmp_path, server):
+    data = server.payload("vid")
+    (tmp_path / "2024-01-31_pos1.webm.part").write_bytes(data)
+
+    [path] = _download(tmp_path, server, ["vid"])
+
+    assert _read(path) == data
+    assert server.requests == [("vid", f"bytes={len(data)}-")]
+
+
+def test_oversized_part_is_restarted_on_416(tmp_path, server):
+    data = server.payload("vid")
+    (tmp_path / "2024-01-31_pos1.webm.part").write_bytes(data + b"garbage")
+
+    [path] = _download(tmp_path, server, ["vid"])
+
+    assert _read(path) == data
+    assert server.requests == [("vid", f"bytes={len(data) + 7}-"), ("vid", None)]
+
+
+def test_misaligned_206_restarts_from_scratch(tmp_path, server):
+    data = server.payload("vid")
+    server.ignore_range.add("vid")
+    (tmp_path / "2024-01-31_pos1.webm.part").write_bytes(data[:1000])
+
+    [path] = _download(tmp_path, server, ["vid"])
+
+    assert _read(path) == data
+    assert server.requests == [("vid", "bytes=1000-"), ("vid", None)]
+
+
+def test_interrupted_stream_is_resumed_on_retry(tmp_path, server):
+    data = server.payload("vid")
+    server.truncate["vid"] = 1
+
+    [path] = _download(tmp_path, server, ["vid"])
+
+    assert _read(path) == data
+    assert len(server.requests) == 2
+    first, second = server.requests
+    assert first == ("vid", None)
+    assert second[1] is not None and second[1] != "bytes=0-"
+
+
+def test_transient_status_is_retried(tmp_path, server):
+    server.fail_status["vid"] = [503, 403]
+
+    [path] = _download(tmp_path, server, ["vid"], max_retries=3)
+
+    assert _read(path) == server.payload("vid")
+    assert len(server.requests) == 3
+
+
+def test_item_is_skipped_after_retries_are_exhausted(tmp_path, server):
+    server.fail_status["bad"] = [503] * 10
+
+    files = _download(tmp_path, server, ["good", "bad"], max_retries=2)
+
+    assert [os.path.basename(p) for p in files] == ["2024-01-31_pos1.webm"]
+    assert sum(1 for item_id, _ in server.requests if item_id == "bad") == 3
+
+
+def test_permanent_http_error_is_not_retried(tmp_path, server):
+    server.fail_status["gone"] = [404] * 10
+
+    files = _download(tmp_path, server, ["gone"], max_retries=3)
+
+    assert files == []
+    assert len(server.requests) == 1
+
+
+def test_deadline_stops_retries(tmp_path, server):
+    server.fail_status["vid"] = [503] * 10
+    server.delay_s = 0.2
+
+    files = _download(tmp_path, server, ["vid"], max_retries=10, deadline_s=0.3)
+
+    assert files == []
+    assert len(server.requests) <= 2
+
+
+def test_kept_native_mp3_survives_transcription_input_removal(tmp_path, server):
+    [path] = _download(tmp_path, server, ["vid"], ext="mp3", keep_audio=True)
+
+    assert os.path.basename(path) == "2024-01-31_pos1.mpga"
+    os.remove(path)  # так вход удаляет save_transcript
+    assert _read(tmp_path / "2024-01-31_pos1.mp3") == server.payload("vid")
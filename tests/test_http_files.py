@@ -0,0 +1,36 @@
+# tests/test_http_files.py
+"""
+Разбор заголовков Range и Content-Range при отдаче файлов задачи.
+"""
+
+import pytest
+
+from app.utils.http_files import parse_content_range, parse_range
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+    ("bytes=900-5000", (900, 999)),
+])
+def test_satisfiable_ranges(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", [None, "", "items=0-1", "bytes=0-1,5-6", "bytes=abc-", "bytes=--5"])
+def test_unsupported_or_malformed_ranges_serve_the_whole_file(header):
+    assert parse_range(header, 1000) is None
+
+
+@pytest.mark.parametrize("header", ["bytes=-0", "bytes=1000-", "bytes=500-100"])
+def test_unsatisfiable_ranges_raise(header):
+    with pytest.raises(ValueError):
+        parse_range(header, 1000)
+
+
+def test_content_range():
+    assert parse_content_range("bytes 100-199/1000") == (100, 199, 1000)
+    assert parse_content_range("bytes */1000") == (None, None, 1000)
+    assert parse_content_range("garbage") is None
@@ -0,0 +1,107 @@
+# tests/test_pdf_generator.py
+"""
+Потоковый PDF со встроенным TrueType-шрифтом: кириллица набирается глифами шрифта
+и восстанавливается через ToUnicode, при ошибке не остаётся .part-файла.
+"""
+
+import os
+import re
+import zlib
+
+import pytest
+
+from app.core.config import settings
+from app.utils.pdf_generator import PdfTranscriptWriter, _load_font, generate_pdf_from_textfile
+
+pytestmark = pytest.mark.skipif(
+    not os.path.exists(settings.pdf_font_path), reason=f"нет шрифта {settings.pdf_font_path}"
+)
+
+TEXT = "Привет мир! Съешь же ещё этих мягких французских булок, да выпей чаю. Ёлка №1"
+
+
+def _objects(data: bytes) -> dict:
+    return {int(m.group(1)): m.group(2) for m in re.finditer(rb"(\d+) 0 obj\n(.*?)\nendobj\n", data, re.S)}
+
+
+def _to_unicode(objects: dict) -> dict:
+    [cmap] = [body for body in objects.values() if b"beginbfchar" in body]
+    entries = b"".join(re.findall(rb"beginbfchar\n(.*?)endbfchar", cmap, re.S))
+    return {
+        int(glyph, 16): bytes.fromhex(text.decode()).decode("utf-16-be")
+        for glyph, text in re.findall(rb"<([0-9A-F]{4})> <([0-9A-F]+)>", entries)
+    }
+
+
+def _page_text(data: bytes) -> list:
+    """Строки всех страниц, декодированные через ToUnicode документа."""
+    objects = _objects(data)
+    to_unicode = _to_unicode(objects)
+    lines = []
+    for body in objects.values():
+        if b"BT /F1" not in body:
+            continue
+        for hex_line in re.findall(rb"<([0-9A-F]*)> Tj", body):
+            glyphs = [int(hex_line[i:i + 4], 16) for i in range(0, len(hex_line), 4)]
+            assert 0 not in glyphs, "символ без глифа в шрифте"
+            lines.append("".join(to_unicode[glyph] for glyph in glyphs))
+    return lines
+
+
+def test_cyrillic_text_is_embedded_with_font_glyphs(tmp_path):
+    path = tmp_path / "out.pdf"
+    writer = PdfTranscriptWriter(path)
+    for _ in range(200):
+        writer.write(TEXT)
+    writer.close()
+
+    data = path.read_bytes()
+    assert data.startswith(b"%PDF-") and data.rstrip().endswith(b"%%EOF")
+    assert not (tmp_path / "out.pdf.part").exists()
+    assert b"/FontFile2" in data and b"/Identity-H" in data
+
+    lines = _page_text(data)
+    assert len(lines) > 1
+    assert " ".join(lines) == " ".join([TEXT] * 200)
+
+
+def test_embedded_font_file_is_the_configured_font(tmp_path):
+    path = tmp_path / "out.pdf"
+    writer = PdfTranscriptWriter(path)
+    writer.write("Привет")
+    writer.close()
+
+    match = re.search(rb"/Length (\d+) /Length1 (\d+) /Filter /FlateDecode >>\nstream\n", path.read_bytes())
+    assert match
+    start, length = match.end(), int(match.group(1))
+    font_file = zlib.decompress(path.read_bytes()[start:start + length])
+    assert font_file == _load_font(settings.pdf_font_path).data
+
+
+def test_lines_fit_the_page_width(tmp_path):
+    path = tmp_path / "out.pdf"
+    writer = PdfTranscriptWriter(path)
+    writer.write("Ш" * 300 + " " + "слово " * 100)
+    writer.close()
+
+    font = _load_font(settings.pdf_font_path)
+    lines = _page_text(path.read_bytes())
+    assert "".join(lines).startswith("Ш" * 300)
+    assert all(font.text_width(line) <= 595.28 - 2 * 42.52 for line in lines)
+
+
+def test_text_file_is_converted(tmp_path):
+    source = tmp_path / "transcript.txt"
+    source.write_text("Первая строка\nВторая строка\n", encoding="utf-8")
+
+    assert generate_pdf_from_textfile(source, tmp_path / "transcript.pdf")
+    assert _page_text((tmp_path / "transcript.pdf").read_bytes()) == ["Первая строка Вторая строка"]
+
+
+def test_failed_conversion_leaves_no_part_file(tmp_path):
+    source = tmp_path / "transcript.txt"
+    source.write_bytes("Привет\n".encode("utf-8") + b"\xff\xfe broken\n")
+
+    assert not generate_pdf_from_textfile(source, tmp_path / "transcript.pdf")
+    assert not (tmp_path / "transcript.pdf").exists()
+    assert not (tmp_path / "transcript.pdf.part").exists()
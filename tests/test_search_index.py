@@ -0,0 +1,77 @@
+# tests/test_search_index.py
+"""
+Полнотекстовый индекс: одновременная запись из нескольких соединений (как из разных воркеров),
+замена и удаление транскриптов, поиск по кириллице.
+"""
+
+import threading
+
+import pytest
+
+from app.core.config import settings
+from app.services import search_index
+
+
+@pytest.fixture(autouse=True)
+def index_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "search_index_path", str(tmp_path / "search.db"))
+    monkeypatch.setattr(search_index, "_local", threading.local())
+    monkeypatch.setattr(search_index, "_schema_ready", False)
+
+
+def _segments(word: str, count: int):
+    return [{"text": f"{word} сегмент {i}", "start": float(i), "end": i + 1.0} for i in range(count)]
+
+
+def _documents():
+    return search_index._connect().execute(
+        "SELECT task_id, first_rowid, last_rowid FROM documents ORDER BY first_rowid"
+    ).fetchall()
+
+
+def test_concurrent_writers_get_disjoint_rowid_ranges():
+    writers = 8
+    barrier = threading.Barrier(writers)
+    errors = []
+
+    def index(n):
+        try:
+            barrier.wait()
+            # Каждый поток открывает своё соединение, как отдельный процесс воркера
+            search_index.index_transcript(f"task{n}", "a.mp3", "whisper-small", _segments(f"слово{n}", 50))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=index, args=(n,)) for n in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    documents = _documents()
+    assert len(documents) == writers
+    for (_, _, last), (_, first, _) in zip(documents, documents[1:]):
+        assert first > last
+    for n in range(writers):
+        hits = search_index.search(f"слово{n}", limit=100)
+        assert len(hits) == 50
+        assert {hit["task_id"] for hit in hits} == {f"task{n}"}
+
+
+def test_reindexing_replaces_segments():
+    search_index.index_transcript("task", "a.mp3", "vosk", _segments("старый", 3), video_id="abc")
+    search_index.index_transcript("task", "a.mp3", "vosk", _segments("новый", 2), video_id="abc")
+
+    assert search_index.search("старый") == []
+    hits = search_index.search("Новый")
+    assert len(hits) == 2
+    assert hits[0]["url"].startswith("https://www.youtube.com/watch?v=abc&t=")
+
+
+def test_delete_task_removes_only_its_documents():
+    search_index.index_transcript("keep", "a.mp3", "vosk", _segments("общий", 2))
+    search_index.index_transcript("drop", "a.mp3", "vosk", _segments("общий", 2))
+
+    assert search_index.delete_task("drop") == 1
+    assert {hit["task_id"] for hit in search_index.search("общий")} == {"keep"}
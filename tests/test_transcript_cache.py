@@ -0,0 +1,85 @@
+# tests/test_transcript_cache.py
+"""
+Ключи кэша транскриптов и сам кэш: попадания, повреждённые записи, вытеснение давно не использованных.
+"""
+
+import json
+import os
+import time
+
+from app.services.transcript_cache import (
+    TranscriptCache, file_source_id, make_cache_key, video_source_id,
+)
+
+SEGMENTS = [{"start": 0.0, "end": 1.0, "text": "Привет"}]
+
+
+def test_cache_key_depends_on_source_model_and_params():
+    key = make_cache_key(video_source_id("abc"), "whisper-small", {"beam_size": 5, "vad": True})
+
+    assert key == make_cache_key("yt:abc", "whisper-small", {"vad": True, "beam_size": 5})
+    assert key != make_cache_key("yt:abd", "whisper-small", {"beam_size": 5, "vad": True})
+    assert key != make_cache_key("yt:abc", "vosk", {"beam_size": 5, "vad": True})
+    assert key != make_cache_key("yt:abc", "whisper-small", {"beam_size": 1, "vad": True})
+    assert make_cache_key("yt:abc", "vosk") == make_cache_key("yt:abc", "vosk", {})
+
+
+def test_file_source_id_is_content_hash(tmp_path):
+    (tmp_path / "a.mp3").write_bytes(b"same")
+    (tmp_path / "b.mp3").write_bytes(b"same")
+    (tmp_path / "c.mp3").write_bytes(b"other")
+
+    assert file_source_id(str(tmp_path / "a.mp3"), chunk_size=2) == file_source_id(str(tmp_path / "b.mp3"))
+    assert file_source_id(str(tmp_path / "a.mp3")) != file_source_id(str(tmp_path / "c.mp3"))
+    assert file_source_id(str(tmp_path / "a.mp3")).startswith("sha256:")
+
+
+def test_put_and_get_under_every_key(tmp_path):
+    cache = TranscriptCache(str(tmp_path), max_bytes=1024 * 1024)
+
+    cache.put(["k1" * 32, "k2" * 32], "Привет", SEGMENTS, model_name="vosk", name="2024-01-31_pos1")
+
+    for key in ("k1" * 32, "k2" * 32):
+        entry = cache.get(key)
+        assert entry == {"text": "Привет", "segments": SEGMENTS, "model_name": "vosk", "name": "2024-01-31_pos1"}
+    assert cache.get("missing" * 8) is None
+    assert cache.stats() == {"hits": 2, "misses": 1, "evictions": 0}
+
+
+def test_corrupt_entry_is_dropped(tmp_path):
+    cache = TranscriptCache(str(tmp_path), max_bytes=1024 * 1024)
+    key = "ab" * 32
+    cache.put([key], "текст", SEGMENTS)
+    path = tmp_path / key[:2] / f"{key}.json"
+    path.write_text("{broken", encoding="utf-8")
+
+    assert cache.get(key) is None
+    assert not path.exists()
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    size = len(json.dumps({"text": "x", "segments": SEGMENTS}, ensure_ascii=False).encode("utf-8"))
+    # Три записи помещаются, четвёртая вызывает вытеснение до EVICT_TARGET от лимита
+    cache = TranscriptCache(str(tmp_path), max_bytes=int(size * 3.5))
+
+    old, other, used, new = "11" * 32, "22" * 32, "33" * 32, "44" * 32
+    past = time.time() - 100
+    for age, key in enumerate((used, other, old)):
+        cache.put([key], "x", SEGMENTS)
+        os.utime(tmp_path / key[:2] / f"{key}.json", (past - age, past - age))
+    cache.get(used)  # обращение обновляет mtime
+
+    cache.put([new], "x", SEGMENTS)
+
+    assert cache.stats()["evictions"] == 1
+    assert cache.get(old) is None
+    for key in (other, used, new):
+        assert cache.get(key) is not None
+
+
+def test_disabled_cache_does_nothing(tmp_path):
+    cache = TranscriptCache(str(tmp_path), max_bytes=1024, enabled=False)
+    cache.put(["ab" * 32], "x", SEGMENTS)
+
+    assert cache.get("ab" * 32) is None
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,80 @@
+# tests/test_transcript_writer.py
+"""
+Запись транскрипта во все форматы за один проход: содержимое с кириллицей,
+таймкоды SRT/VTT, отсутствие .part-файлов после успеха и после ошибки.
+"""
+
+import json
+import os
+
+import pytest
+
+from app.core.config import settings
+from app.utils.transcript_writer import TranscriptWriter, write_transcript
+
+SEGMENTS = [
+    {"start": 0.0, "end": 2.5, "text": "Привет, мир!"},
+    {"start": 2.5, "end": 3.0, "text": ""},
+    {"start": 3661.25, "end": 3662.0, "text": "Ёжик «в тумане» — 日本語"},
+]
+
+
+def _parts(tmp_path):
+    return sorted(p.name for p in tmp_path.iterdir() if p.name.endswith(".part"))
+
+
+def test_text_formats(tmp_path):
+    paths = write_transcript(tmp_path / "audio", SEGMENTS, ["txt", "srt", "vtt", "json"], meta={"model_name": "vosk"})
+
+    assert [p.name for p in paths] == ["audio.txt", "audio.srt", "audio.vtt", "audio.json"]
+    assert _parts(tmp_path) == []
+
+    assert (tmp_path / "audio.txt").read_text(encoding="utf-8") == "Привет, мир! Ёжик «в тумане» — 日本語"
+    assert (tmp_path / "audio.srt").read_text(encoding="utf-8") == (
+        "1\n00:00:00,000 --> 00:00:02,500\nПривет, мир!\n\n"
+        "2\n01:01:01,250 --> 01:01:02,000\nЁжик «в тумане» — 日本語\n\n"
+    )
+    assert (tmp_path / "audio.vtt").read_text(encoding="utf-8") == (
+        "WEBVTT\n\n"
+        "00:00:00.000 --> 00:00:02.500\nПривет, мир!\n\n"
+        "01:01:01.250 --> 01:01:02.000\nЁжик «в тумане» — 日本語\n\n"
+    )
+
+    document = json.loads((tmp_path / "audio.json").read_text(encoding="utf-8"))
+    assert document["model_name"] == "vosk"
+    assert [s["text"] for s in document["segments"]] == ["Привет, мир!", "Ёжик «в тумане» — 日本語"]
+    # Кириллица пишется как есть, а не \u-последовательностями
+    assert "Привет" in (tmp_path / "audio.json").read_text(encoding="utf-8")
+
+
+def test_json_without_meta_is_valid(tmp_path):
+    write_transcript(tmp_path / "audio", SEGMENTS[:1], ["json"])
+
+    assert json.loads((tmp_path / "audio.json").read_text(encoding="utf-8")) == {"segments": [SEGMENTS[0]]}
+
+
+@pytest.mark.skipif(not os.path.exists(settings.pdf_font_path), reason=f"нет шрифта {settings.pdf_font_path}")
+def test_pdf_is_written_with_other_formats(tmp_path):
+    paths = write_transcript(tmp_path / "audio", SEGMENTS, ["pdf", "txt"])
+
+    assert [p.name for p in paths] == ["audio.pdf", "audio.txt"]
+    assert (tmp_path / "audio.pdf").read_bytes().startswith(b"%PDF-")
+    assert _parts(tmp_path) == []
+
+
+def test_unknown_format_is_rejected_without_leftovers(tmp_path):
+    with pytest.raises(ValueError):
+        TranscriptWriter(tmp_path / "audio", ["txt", "docx"])
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_failure_while_writing_leaves_no_files(tmp_path):
+    def segments():
+        yield SEGMENTS[0]
+        raise RuntimeError("модель упала")
+
+    with pytest.raises(RuntimeError):
+        write_transcript(tmp_path / "audio", segments(), ["txt", "srt", "json"])
+
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,58 @@
+# tests/test_urls.py
+"""
+Идентификатор видео и каноническая форма ссылки: по ним строятся ключи кэша и single-flight.
+"""
+
+import pytest
+
+from app.utils.urls import extract_video_id, normalize_url
+
+VIDEO_ID = "dQw4w9WgXcQ"
+
+
+@pytest.mark.parametrize("url", [
+    f"https://www.youtube.com/watch?v={VIDEO_ID}",
+    f"https://m.youtube.com/watch?v={VIDEO_ID}&t=42s&si=abc",
+    f"https://youtu.be/{VIDEO_ID}?si=tracking",
+    f"https://www.youtube.com/shorts/{VIDEO_ID}",
+    f"https://www.youtube.com/embed/{VIDEO_ID}",
+    f"https://www.youtube.com/live/{VIDEO_ID}",
+    f"  https://YOUTUBE.com/watch?feature=share&v={VIDEO_ID}  ",
+])
+def test_video_id_is_extracted(url):
+    assert extract_video_id(url) == VIDEO_ID
+
+
+@pytest.mark.parametrize("url", [
+    "https://www.youtube.com/playlist?list=PL123",
+    "https://www.youtube.com/watch?v=short",
+    "https://example.com/watch?v=dQw4w9WgXcQ",
+    "https://www.youtube.com/channel/UC123",
+    "not a url",
+])
+def test_non_video_urls_have_no_id(url):
+    assert extract_video_id(url) is None
+
+
+def test_video_variants_share_one_key():
+    keys = {
+        normalize_url(f"https://www.youtube.com/watch?v={VIDEO_ID}"),
+        normalize_url(f"https://youtu.be/{VIDEO_ID}?si=x"),
+        normalize_url(f"https://m.youtube.com/watch?v={VIDEO_ID}&t=10"),
+    }
+    assert keys == {f"yt:video:{VIDEO_ID}"}
+
+
+def test_playlist_key():
+    assert normalize_url("https://www.youtube.com/playlist?list=PL123&si=x") == "yt:playlist:PL123"
+
+
+def test_video_inside_playlist_is_not_the_bare_video():
+    key = normalize_url(f"https://www.youtube.com/watch?v={VIDEO_ID}&list=PL123&index=3")
+
+    assert key not in (f"yt:video:{VIDEO_ID}", "yt:playlist:PL123")
+    assert key == normalize_url(f"https://youtube.com/watch?list=PL123&v={VIDEO_ID}")
+
+
+def test_other_urls_drop_tracking_params_and_sort_query():
+    assert normalize_url("https://www.example.com/a/?b=2&a=1&si=x") == normalize_url("https://example.com/a?a=1&b=2")
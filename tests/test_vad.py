@@ -0,0 +1,92 @@
+# tests/test_vad.py
+"""
+VAD по энергии и карта времени SpeechMap: отброшенная тишина не сдвигает таймкоды,
+потоковый VAD даёт ту же карту, что и обработка буфера целиком.
+"""
+
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.services.audio import SAMPLE_RATE
+from app.services.vad import SpeechMap, apply_vad, stream_vad
+
+
+@pytest.fixture(autouse=True)
+def energy_vad(monkeypatch):
+    monkeypatch.setattr(settings, "vad_method", "energy")
+    monkeypatch.setattr(settings, "vad_speech_pad_ms", 0)
+    monkeypatch.setattr(settings, "vad_min_silence_ms", 500)
+    monkeypatch.setattr(settings, "vad_min_skip_s", 1.0)
+    monkeypatch.setattr(settings, "vad_window_s", 30.0)
+
+
+def _audio(layout):
+    """Тишина со слабым шумом и «речь» (синус) по списку (секунды, есть_речь)."""
+    rng = np.random.default_rng(0)
+    parts = []
+    for seconds, speech in layout:
+        n = int(seconds * SAMPLE_RATE)
+        part = rng.normal(0, 0.0005, n)
+        if speech:
+            part += 0.3 * np.sin(2 * np.pi * 220 * np.arange(n) / SAMPLE_RATE)
+        parts.append(part)
+    return np.concatenate(parts).astype(np.float32)
+
+
+def test_speech_map_translates_time_back_to_original():
+    speech_map = SpeechMap([(SAMPLE_RATE * 2, SAMPLE_RATE * 3), (SAMPLE_RATE * 10, SAMPLE_RATE * 12)])
+
+    assert speech_map.to_original(0.0) == 2.0
+    assert speech_map.to_original(0.5) == 2.5
+    assert speech_map.to_original(1.0) == 10.0
+    assert speech_map.to_original(2.5) == 11.5
+    assert speech_map.speech_samples == SAMPLE_RATE * 3
+
+
+def test_adjacent_regions_are_merged():
+    speech_map = SpeechMap()
+    speech_map.add(0, 100)
+    speech_map.add(100, 300)
+    speech_map.add(500, 600)
+
+    assert speech_map.regions == [(0, 300), (500, 600)]
+    assert speech_map.to_original(350 / SAMPLE_RATE) == pytest.approx(550 / SAMPLE_RATE)
+
+
+def test_empty_map_is_identity():
+    assert SpeechMap().to_original(12.5) == 12.5
+
+
+def test_silence_is_cut_and_timestamps_are_restored():
+    audio = _audio([(3, False), (2, True), (4, False), (1, True), (2, False)])
+
+    speech, speech_map = apply_vad(audio)
+
+    assert speech_map is not None
+    assert len(speech) / SAMPLE_RATE == pytest.approx(3.0, abs=0.1)
+    assert speech_map.to_original(0.0) == pytest.approx(3.0, abs=0.05)
+    assert speech_map.to_original(2.5) == pytest.approx(9.5, abs=0.1)
+
+
+def test_little_silence_keeps_audio_untouched():
+    audio = _audio([(0.5, False), (4, True), (0.3, False)])
+
+    speech, speech_map = apply_vad(audio)
+
+    assert speech_map is None
+    assert speech is audio
+
+
+def test_stream_vad_matches_whole_buffer():
+    audio = _audio([(3, False), (2, True), (4, False), (1, True), (2, False)])
+    pcm = (audio * 32767).astype(np.int16).tobytes()
+    blocks = [pcm[i:i + 64000] for i in range(0, len(pcm), 64000)]
+
+    speech_map = SpeechMap()
+    streamed = b"".join(stream_vad(blocks, speech_map))
+    _, whole_map = apply_vad(audio)
+
+    assert speech_map.total_samples == len(audio)
+    assert speech_map.regions == whole_map.regions
+    assert len(streamed) // 2 == speech_map.speech_samples